@@ -1,37 +1,57 @@
-from fastapi import FastAPI, UploadFile, Form, HTTPException
+from fastapi import FastAPI, UploadFile, Form, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import pandas as pd
 import numpy as np
 from io import StringIO
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 import json
+import asyncio
+import functools
+import os
+import shutil
+import tempfile
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from supabase_client import supabase
 from pathlib import Path
-from ml_sklearn_service import SklearnModelTrainer
-from ml_pytorch_service import PyTorchModelTrainer
-from visualization_service import VisualizationService
+from dataset_registry import dataset_registry
+from dataset_cache import dataset_cache, dataset_cache_key
+from dataset_query import query_rows, DEFAULT_PAGE_SIZE
+from profiling import profile_store
+from cleaning_service import apply_operation, deduplicate_csv
+from cleaning_pipeline import run_pipeline
+from incremental_cleaning import incremental_cleaner
+from supabase_sync import (
+    SYNC_MODES,
+    compute_diff,
+    diff_summary,
+    apply_diff,
+    swap_table,
+    replace_table,
+    save_model_results,
+)
+from supabase_writer import supabase_writer
+from write_queue import write_queue
+from supabase_reader import supabase_reader
+from training_jobs import training_jobs
+from csv_ingest import parse_csv, compact_dtypes, shutdown_parse_pool, DEFAULT_CHUNK_ROWS, SCAN_BLOCK_BYTES, SPOOL_DIR
+from wire_format import (
+    BINARY_FORMATS,
+    negotiate_format,
+    format_from_content_type,
+    decode_frame,
+    columnar_to_frame,
+    binary_response,
+    columnar_response,
+    predictions_frame,
+)
 
 app = FastAPI()
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-# Catch-all route para React Router
-# Esto debe ir al FINAL para que no interfiera con tus API routes
-@app.get("/{full_path:path}")
-async def serve_react_app(full_path: str):
-    # Si es un archivo estático específico, intentar servirlo
-    static_file = Path(f"static/{full_path}")
-    if static_file.is_file():
-        return FileResponse(static_file)
-
-    # Para cualquier otra ruta, servir index.html (React Router se encarga)
-    return FileResponse("static/index.html")
-
-
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +62,10 @@ app.add_middleware(
 )
 
 
+# Dataset payloads: row dicts (default) or columnar JSON ({column: [values]})
+DatasetPayload = Union[List[dict], Dict[str, list]]
+
+
 class CSVResponse(BaseModel):
     success: bool
     data: list
@@ -50,29 +74,78 @@ class CSVResponse(BaseModel):
     message: Optional[str] = None
     error: Optional[str] = None
     table_name: Optional[str] = None
+    dataset_id: Optional[str] = None
+    version: Optional[int] = None
+    dtypes: Optional[Dict[str, str]] = None
+    memory_report: Optional[Dict[str, Any]] = None
+    ingest_stats: Optional[Dict[str, Any]] = None
+    pipeline: Optional[List[Dict[str, Any]]] = None
+    sync: Optional[Dict[str, Any]] = None
+
+
+class CleaningStep(BaseModel):
+    operation: str  # "missing", "normalize", "transform" or "near_duplicates"
+    params: dict = {}
 
 
 class CleanDataRequest(BaseModel):
-    operation: str
-    data: List[dict]
-    columns: List[str]
-    params: dict
+    operation: Optional[str] = None
+    # Pipeline: ordered cleaning steps run in one request (replaces operation/params)
+    steps: Optional[List[CleaningStep]] = None
+    data: Optional[DatasetPayload] = None
+    columns: Optional[List[str]] = None
+    params: dict = {}
     table_name: Optional[str] = None
     source: Optional[str] = None  # "csv" or "database"
+    # Server-side dataset (replaces data/columns when provided)
+    dataset_id: Optional[str] = None
+    version: Optional[int] = None
+    preview_rows: int = 100
+    # "records" (default), "columnar", "arrow" or "parquet"
+    output_format: Optional[str] = None
+    # Only process rows appended or edited since the last run of the same
+    # operation on this dataset (dataset_id and a single operation)
+    incremental: bool = False
+    # Supabase write-back for source == "database": "replace" or "diff"
+    sync_mode: str = "replace"
+    primary_key: str = "id"
+    # Report what would be written to Supabase without writing (any mode)
+    dry_run: bool = False
+    # Queue the Supabase write and respond without waiting for it
+    write_behind: bool = False
+
+
+class AppendRowsRequest(BaseModel):
+    data: DatasetPayload
+    columns: Optional[List[str]] = None
+
+
+class RowUpdate(BaseModel):
+    row: int  # row id, as returned in row_ids by GET /datasets/{dataset_id}/rows
+    values: Dict[str, Any]
+
+
+class UpdateRowsRequest(BaseModel):
+    updates: List[RowUpdate]
 
 
 class TrainModelRequest(BaseModel):
     framework: str  # "sklearn" or "pytorch"
-    data: List[dict]
-    columns: List[str]
+    data: Optional[DatasetPayload] = None
+    columns: Optional[List[str]] = None
+    dataset_id: Optional[str] = None
+    version: Optional[int] = None
     target_column: str
     model_type: str
     task_type: str = "classification"  # "classification" or "regression"
     test_size: float = 0.2
     # Sklearn specific
     cv_folds: Optional[int] = 5
-    optimize_hyperparams: Optional[str] = None
+    optimize_hyperparams: Optional[str] = None  # "grid", "random", "halving", "hyperband" or "bayesian"
+    optimize_time_budget: Optional[float] = None  # seconds (default: HYPERPARAM_TIME_BUDGET)
     metric: Optional[str] = "accuracy"
+    # model_type "leaderboard": these model types (default: all) ranked by metric
+    model_types: Optional[List[str]] = None
     # PyTorch specific
     architecture: Optional[str] = "mlp"
     hidden_layers: Optional[int] = 3
@@ -87,145 +160,108 @@ class TrainModelRequest(BaseModel):
 
 class PredictRequest(BaseModel):
     framework: str
-    data: List[dict]
-    columns: List[str]
+    data: Optional[DatasetPayload] = None
+    columns: Optional[List[str]] = None
+    dataset_id: Optional[str] = None
+    version: Optional[int] = None
     model_name: str
-
-
-def clean_missing_values(df: pd.DataFrame, params: dict) -> tuple[pd.DataFrame, str]:
-    method = params.get("method", "mean")
-    remove_nulls = params.get("removeNulls", False)
-
-    initial_rows = len(df)
-    initial_nulls = df.isnull().sum().sum()
-
-    if remove_nulls:
-        df = df.dropna()
-
-    numeric_columns = df.select_dtypes(include=[np.number]).columns
-    categorical_columns = df.select_dtypes(exclude=[np.number]).columns
-
-    if method == "mean":
-        df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].mean())
-    elif method == "median":
-        df[numeric_columns] = df[numeric_columns].fillna(df[numeric_columns].median())
-    elif method == "mode":
-        for col in df.columns:
-            df[col] = df[col].fillna(
-                df[col].mode()[0] if not df[col].mode().empty else ""
-            )
-    elif method == "forward":
-        df = df.fillna(method="ffill")
-    elif method == "backward":
-        df = df.fillna(method="bfill")
-
-    final_nulls = df.isnull().sum().sum()
-    rows_removed = initial_rows - len(df) if remove_nulls else 0
-
-    message = f"Valores nulos procesados: {initial_nulls - final_nulls} reemplazados"
-    if remove_nulls:
-        message += f", {rows_removed} filas eliminadas"
-
-    return df, message
-
-
-def clean_duplicates(df: pd.DataFrame, params: dict) -> tuple[pd.DataFrame, str]:
-    """Eliminar filas duplicadas del DataFrame"""
-    remove_duplicates = params.get("removeDuplicates", False)
-    
-    initial_rows = len(df)
-    
-    # Identificar columnas que probablemente son IDs (para ignorarlas en la detección)
-    id_columns = []
-    for col in df.columns:
-        col_lower = col.lower()
-        # Detectar columnas de ID comunes
-        if col_lower in ['id', '_id', 'index', 'row_id', 'pk'] or col_lower.endswith('_id'):
-            # Verificar si es única (característica de un ID)
-            if df[col].nunique() == len(df):
-                id_columns.append(col)
-    
-    # Columnas a considerar para duplicados (todas excepto IDs)
-    columns_to_check = [col for col in df.columns if col not in id_columns]
-    
-    # Si no hay columnas para verificar (solo IDs), usar todas
-    if not columns_to_check:
-        columns_to_check = df.columns.tolist()
-    
-    # Detectar duplicados basándose en las columnas relevantes
-    if columns_to_check:
-        initial_duplicates = df.duplicated(subset=columns_to_check, keep=False).sum()
-        duplicates_to_remove = df.duplicated(subset=columns_to_check, keep='first').sum()
-    else:
-        initial_duplicates = df.duplicated(keep=False).sum()
-        duplicates_to_remove = df.duplicated(keep='first').sum()
-    
-    if remove_duplicates:
-        # Eliminar duplicados basándose en columnas relevantes, manteniendo la primera ocurrencia
-        if columns_to_check:
-            df = df.drop_duplicates(subset=columns_to_check, keep='first')
-        else:
-            df = df.drop_duplicates(keep='first')
-    
-    final_rows = len(df)
-    rows_removed = initial_rows - final_rows
-    
-    # Mensaje informativo
-    message = f"Duplicados encontrados: {duplicates_to_remove}"
-    if id_columns:
-        message += f" (ignorando columnas ID: {', '.join(id_columns)})"
-    
-    if remove_duplicates:
-        message += f". {rows_removed} filas duplicadas eliminadas, manteniendo solo la primera ocurrencia de cada grupo"
-    else:
-        message += ". Activa 'Eliminar filas duplicadas' para limpiarlos"
-    
-    return df, message
-
-
-def clean_inconsistencies(df: pd.DataFrame, params: dict) -> tuple[pd.DataFrame, str]:
-    """Limpiar inconsistencias en los datos (espacios, mayúsculas, etc.)"""
-    normalize_text = params.get("normalizeText", True)
-    remove_spaces = params.get("removeSpaces", True)
-    lowercase = params.get("lowercase", False)
-    
-    initial_rows = len(df)
-    changes_made = 0
-    
-    # Obtener columnas de texto
-    text_columns = df.select_dtypes(include=['object']).columns
-    
-    for col in text_columns:
-        if remove_spaces:
-            # Eliminar espacios extra al inicio y final
-            df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
-            changes_made += 1
-        
-        if lowercase:
-            # Convertir a minúsculas
-            df[col] = df[col].apply(lambda x: x.lower() if isinstance(x, str) else x)
-            changes_made += 1
-        
-        if normalize_text:
-            # Normalizar espacios múltiples a uno solo
-            df[col] = df[col].apply(lambda x: ' '.join(x.split()) if isinstance(x, str) else x)
-            changes_made += 1
-    
-    message = f"Inconsistencias procesadas en {len(text_columns)} columnas de texto"
-    if changes_made > 0:
-        message += f". Se aplicaron {changes_made} transformaciones"
-    
-    return df, message
+    output_format: Optional[str] = None
+
+
+def resolve_dataframe(
+    data: Optional[DatasetPayload],
+    columns: Optional[List[str]],
+    dataset_id: Optional[str],
+    version: Optional[int] = None,
+) -> pd.DataFrame:
+    """Build the request DataFrame from a stored dataset or from inline rows/columns"""
+    if dataset_id:
+        try:
+            return dataset_registry.get(dataset_id, version)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    if data is None:
+        raise HTTPException(
+            status_code=400, detail="Se requiere 'dataset_id' o 'data' en la petición"
+        )
+    if isinstance(data, dict):
+        return columnar_to_frame(data, columns)
+    return pd.DataFrame(data, columns=columns)
 
 
 @app.post("/load-csv")
 async def load_csv(
     file: UploadFile,
+    http_request: Request,
     delimiter: str = Form(","),
     encoding: str = Form("utf-8"),
     preview_rows: int = Form(10),
+    stream: bool = Form(False),
+    chunk_rows: int = Form(DEFAULT_CHUNK_ROWS),
+    output_format: Optional[str] = Form(None),
+    compact: bool = Form(False),
+    engine: str = Form("c"),
 ):
     try:
+        response_format = negotiate_format(http_request.headers.get("accept"), output_format)
+        upload_format = format_from_content_type(file.content_type)
+        server_side = stream or compact or engine != "c" or upload_format or response_format != "records"
+
+        if server_side:
+            stats = None
+            if upload_format:
+                # Archivo Arrow/Parquet: se decodifica directamente a columnas
+                df = decode_frame(await file.read(), upload_format)
+                message = f"Archivo {upload_format} cargado: {len(df)} filas guardadas en el servidor"
+            else:
+                # Parsear directamente desde los bytes subidos (por bloques o en paralelo)
+                # En un hilo aparte: el servidor sigue atendiendo mientras se parsea
+                df, stats = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(parse_csv, file.file, delimiter, encoding, engine, chunk_rows),
+                )
+                message = (
+                    f"Archivo CSV procesado en {stats['chunks']} bloques con el motor '{engine}' "
+                    f"({stats['rows_per_s']:,.0f} filas/s): {len(df)} filas guardadas en el servidor"
+                )
+
+            memory_report = None
+            if compact:
+                # Tipos numéricos mínimos y texto repetido como categoría
+                df, memory_report = compact_dtypes(df)
+                message += f" ({memory_report['bytes_saved'] / 1024 / 1024:.1f} MB ahorrados con tipos compactos)"
+
+            dataset_id = dataset_registry.register(df, name=file.filename)
+            version = dataset_registry.latest_version(dataset_id)
+            profile_store.compute(dataset_id, version, df)
+
+            # Formatos columnares: devolver el dataset completo
+            metadata = {"message": message, "dataset_id": dataset_id, "version": version}
+            if stats:
+                metadata["rows_per_s"] = round(stats["rows_per_s"], 1)
+                if stats["mb_per_s"] is not None:
+                    metadata["mb_per_s"] = round(stats["mb_per_s"], 2)
+            if response_format in BINARY_FORMATS:
+                return binary_response(df, response_format, {**metadata, "total_rows": len(df)})
+            if response_format == "columnar":
+                return columnar_response(df, metadata)
+
+            # Row dicts: devolver solo el id del dataset, el esquema y una previsualización
+            preview_data = df.head(preview_rows).to_dict("records")
+            return CSVResponse(
+                success=True,
+                data=preview_data,
+                columns=df.columns.tolist(),
+                totalRows=len(df),
+                dataset_id=dataset_id,
+                version=version,
+                dtypes={col: str(dtype) for col, dtype in df.dtypes.items()},
+                memory_report=memory_report,
+                ingest_stats=stats,
+                message=message,
+            )
+
         # Read file content
         content = await file.read()
         text_content = content.decode(encoding)
@@ -265,61 +301,418 @@ async def load_csv(
         )
 
 
+@app.post("/deduplicate-csv")
+async def deduplicate_csv_file(
+    file: UploadFile,
+    delimiter: str = Form(","),
+    encoding: str = Form("utf-8"),
+    chunk_rows: int = Form(DEFAULT_CHUNK_ROWS),
+    columns: Optional[str] = Form(None),
+    remove_duplicates: bool = Form(False),
+    hash_bits: int = Form(64),
+):
+    """
+    Find duplicate rows of a CSV too large to load: the upload is copied to
+    disk and read in chunks, with hash partitions spilled to disk. With
+    ``remove_duplicates`` the response is the CSV without the repeated rows
+    (counts in ``X-*`` headers); otherwise only the counts.
+    """
+    spool = tempfile.mkdtemp(prefix="dedup_csv_", dir=SPOOL_DIR)
+    cleanup = functools.partial(shutil.rmtree, spool, ignore_errors=True)
+    try:
+        path = os.path.join(spool, "upload.csv")
+        out_path = os.path.join(spool, "deduplicated.csv") if remove_duplicates else None
+
+        def run() -> Dict[str, Any]:
+            with open(path, "wb") as f:
+                shutil.copyfileobj(file.file, f, SCAN_BLOCK_BYTES)
+            return deduplicate_csv(
+                path,
+                out_path,
+                delimiter=delimiter,
+                encoding=encoding,
+                chunk_rows=chunk_rows,
+                columns=columns.split(",") if columns else None,
+                bits=128 if hash_bits == 128 else 64,
+            )
+
+        # En un hilo aparte: el servidor sigue atendiendo mientras se lee el archivo
+        result = await asyncio.get_running_loop().run_in_executor(None, run)
+    except (ValueError, UnicodeDecodeError) as e:
+        cleanup()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        cleanup()
+        raise
+
+    message = f"Duplicados encontrados: {result['duplicates_to_remove']} de {result['rows']} filas"
+    if out_path is None:
+        cleanup()
+        return JSONResponse(content={"success": True, "message": message, **result})
+
+    headers = {
+        "X-Rows": str(result["rows"]),
+        "X-Duplicates-Removed": str(result["duplicates_to_remove"]),
+    }
+    return FileResponse(
+        out_path,
+        media_type="text/csv",
+        filename=f"sin_duplicados_{file.filename or 'datos.csv'}",
+        headers=headers,
+        background=BackgroundTask(cleanup),
+    )
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/datasets/{dataset_id}")
+async def get_dataset_info(dataset_id: str, version: Optional[int] = None):
+    """Return schema, row counts and version history of a stored dataset"""
+    try:
+        return JSONResponse(content=dataset_registry.info(dataset_id, version))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/datasets/{dataset_id}/profile")
+async def get_dataset_profile(dataset_id: str, version: Optional[int] = None):
+    """Return per-column statistics (nulls, distinct, moments, quantiles, type guess)"""
+    try:
+        df = dataset_registry.get(dataset_id, version)
+        if version is None:
+            version = dataset_registry.latest_version(dataset_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    profile = profile_store.get(dataset_id, version)
+    if profile is None:
+        profile = profile_store.compute(dataset_id, version, df)
+
+    return JSONResponse(content={"dataset_id": dataset_id, "version": version, **profile.to_dict()})
+
+
+@app.get("/datasets/{dataset_id}/rows")
+async def get_dataset_rows(
+    dataset_id: str,
+    version: Optional[int] = None,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    columns: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None),
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+):
+    """
+    Return a window of rows from a stored dataset, with column projection
+    (``columns=a,b``), filters (``filter=col:op:value``, repeatable),
+    free-text search, sorting and offset or cursor pagination
+    """
+    try:
+        df = dataset_registry.get(dataset_id, version)
+        if version is None:
+            version = dataset_registry.latest_version(dataset_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        page = query_rows(
+            df,
+            dataset_id,
+            version,
+            offset=offset,
+            limit=limit,
+            cursor=cursor,
+            columns=columns.split(",") if columns else None,
+            filters=filter,
+            search=search,
+            sort_by=sort_by,
+            descending=descending,
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(content=page)
+
+
+@app.post("/datasets")
+async def upload_dataset(http_request: Request, name: Optional[str] = None):
+    """
+    Store a dataset sent as an Arrow IPC stream, a Parquet file or columnar
+    JSON (``{"columns": [...], "data": {column: [values]}}``)
+    """
+    try:
+        body = await http_request.body()
+        upload_format = format_from_content_type(http_request.headers.get("content-type"))
+        if upload_format:
+            df = decode_frame(body, upload_format)
+        else:
+            payload = json.loads(body)
+            df = columnar_to_frame(payload["data"], payload.get("columns"))
+
+        dataset_id = dataset_registry.register(df, name=name)
+        profile_store.compute(dataset_id, dataset_registry.latest_version(dataset_id), df)
+        return JSONResponse(content=dataset_registry.info(dataset_id))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/datasets/{dataset_id}/download")
+async def download_dataset(
+    dataset_id: str,
+    http_request: Request,
+    version: Optional[int] = None,
+    output_format: Optional[str] = None,
+):
+    """Return a stored dataset in the negotiated format (Arrow, Parquet or JSON)"""
+    try:
+        df = dataset_registry.get(dataset_id, version)
+        response_format = negotiate_format(http_request.headers.get("accept"), output_format)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    metadata = {"dataset_id": dataset_id, "version": version}
+    if response_format in BINARY_FORMATS:
+        return binary_response(df, response_format, {**metadata, "total_rows": len(df)})
+    return columnar_response(df, metadata)
+
+
+@app.delete("/datasets/{dataset_id}")
+async def delete_dataset(dataset_id: str):
+    """Remove a stored dataset, all its versions and their cached files"""
+    try:
+        for meta in dataset_registry.list_versions(dataset_id):
+            dataset_cache.invalidate(dataset_cache_key(dataset_id, meta["version"]))
+    except KeyError:
+        pass
+    profile_store.remove(dataset_id)
+    incremental_cleaner.remove(dataset_id)
+    dataset_registry.remove(dataset_id)
+    return {"success": True}
+
+
+@app.post("/datasets/{dataset_id}/undo")
+async def undo_dataset_step(dataset_id: str):
+    """Move the dataset head back to the parent of the current version"""
+    try:
+        version = dataset_registry.undo(dataset_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=dataset_registry.info(dataset_id, version))
+
+
+@app.post("/datasets/{dataset_id}/checkout")
+async def checkout_dataset_version(dataset_id: str, version: int):
+    """
+    Make ``version`` the dataset head; cleaning steps applied afterwards
+    branch from it
+    """
+    try:
+        dataset_registry.checkout(dataset_id, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return JSONResponse(content=dataset_registry.info(dataset_id, version))
+
+
+@app.get("/datasets/{dataset_id}/compare")
+async def compare_dataset_versions(dataset_id: str, base: int, target: Optional[int] = None):
+    """Columns and rows that differ between two versions (target defaults to the head)"""
+    try:
+        if target is None:
+            target = dataset_registry.latest_version(dataset_id)
+        return JSONResponse(content=dataset_registry.compare(dataset_id, base, target))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/datasets/{dataset_id}/rows")
+async def append_dataset_rows(dataset_id: str, request: AppendRowsRequest):
+    """Append rows to a stored dataset as a new version that records the change set"""
+    try:
+        if isinstance(request.data, dict):
+            rows = columnar_to_frame(request.data, request.columns)
+        else:
+            rows = pd.DataFrame(request.data, columns=request.columns)
+        parent_version = dataset_registry.latest_version(dataset_id)
+        parent_df = dataset_registry.get(dataset_id, parent_version)
+        version = dataset_registry.append_rows(dataset_id, rows)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    profile_store.derive(
+        dataset_id,
+        parent_version,
+        version,
+        parent_df,
+        dataset_registry.get(dataset_id, version),
+        dataset_registry.changes_since(dataset_id, parent_version, version),
+    )
+    return JSONResponse(
+        content={"dataset_id": dataset_id, "version": version, "appended": len(rows)}
+    )
+
+
+@app.patch("/datasets/{dataset_id}/rows")
+async def update_dataset_rows(dataset_id: str, request: UpdateRowsRequest):
+    """Edit cells of a stored dataset as a new version that records the change set"""
+    try:
+        updates: Dict[Any, Dict[str, Any]] = {}
+        for update in request.updates:
+            updates.setdefault(update.row, {}).update(update.values)
+        parent_version = dataset_registry.latest_version(dataset_id)
+        parent_df = dataset_registry.get(dataset_id, parent_version)
+        version = dataset_registry.update_rows(dataset_id, updates)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    profile_store.derive(
+        dataset_id,
+        parent_version,
+        version,
+        parent_df,
+        dataset_registry.get(dataset_id, version),
+        dataset_registry.changes_since(dataset_id, parent_version, version),
+    )
+    return JSONResponse(
+        content={"dataset_id": dataset_id, "version": version, "updated": len(updates)}
+    )
+
+
 @app.post("/clean-data")
-async def clean_data(request: CleanDataRequest):
+async def clean_data(request: CleanDataRequest, http_request: Request):
     try:
-        # Convert input data to DataFrame
-        df = pd.DataFrame(request.data, columns=request.columns)
+        response_format = negotiate_format(
+            http_request.headers.get("accept"), request.output_format
+        )
+        if request.sync_mode not in SYNC_MODES:
+            raise ValueError(f"sync_mode debe ser uno de: {', '.join(SYNC_MODES)}")
+
+        # Convert input data to DataFrame. The operations work on a shallow
+        # copy and replace the columns they change (or copy them before editing
+        # cells), so the stored frame and the original rows for the Supabase
+        # diff stay intact and the new version shares the untouched columns
+        source_df = resolve_dataframe(
+            request.data, request.columns, request.dataset_id, request.version
+        )
+        df = source_df.copy(deep=False)
         table_name = request.table_name
         source = request.source
 
-        # Ejecutar la operación correspondiente
-        if request.operation == "missing":
-            df, message = clean_missing_values(df, request.params)
-        elif request.operation == "normalize":
-            # Operación para limpiar duplicados
-            df, message = clean_duplicates(df, request.params)
-        elif request.operation == "transform":
-            # Operación para limpiar inconsistencias
-            df, message = clean_inconsistencies(df, request.params)
+        # Ejecutar la operación correspondiente, o el pipeline completo en una sola petición
+        pipeline_report = None
+        cleaning_run = None
+        if request.dataset_id:
+            parent_version = request.version or dataset_registry.latest_version(request.dataset_id)
+        if request.steps:
+            df, message, pipeline_report = run_pipeline(
+                df, [step.model_dump() for step in request.steps]
+            )
+            operation = "pipeline:" + "+".join(step.operation for step in request.steps)
+        elif request.dataset_id:
+            # Dataset en el servidor: se guarda el estado de la operación para
+            # poder limpiar después solo las filas nuevas o modificadas
+            df, message, cleaning_run = incremental_cleaner.clean(
+                request.dataset_id,
+                parent_version,
+                df,
+                request.operation,
+                request.params,
+                incremental=request.incremental,
+            )
+            operation = request.operation
         else:
-            raise ValueError(f"Operación no soportada: {request.operation}")
+            df, message = apply_operation(df, request.operation, request.params)
+            operation = request.operation
 
         # Si los datos vienen de Supabase, actualizar la tabla
-        if source == "database" and table_name:
+        sync_report = None
+        if source == "database" and table_name and request.dry_run:
+            # Sin escribir nada, en ningún modo: solo el resumen de lo que se aplicaría
+            try:
+                if request.sync_mode == "diff":
+                    diff = compute_diff(source_df, df, request.primary_key)
+                    sync_report = {"mode": "diff", **diff_summary(diff), "dry_run": True}
+                    message += (
+                        f"\nℹ️ Cambios para Supabase (sin aplicar): {sync_report['updates']} "
+                        f"actualizaciones, {sync_report['inserts']} inserciones, "
+                        f"{sync_report['deletes']} eliminaciones"
+                    )
+                else:
+                    sync_report = {"mode": request.sync_mode, "rows": len(df), "dry_run": True}
+                    message += (
+                        f"\nℹ️ Reemplazo de la tabla '{table_name}' sin aplicar: "
+                        f"{len(df)} filas"
+                    )
+            except Exception as e:
+                error_msg = f"No se pudo calcular los cambios para Supabase: {str(e)}"
+                print(f"❌ {error_msg}")
+                message += f"\n⚠️ {error_msg}"
+        elif source == "database" and table_name and request.write_behind:
+            # La escritura queda en el journal y la hace el worker en segundo plano
+            try:
+                if request.sync_mode == "diff":
+                    payload = {"diff": compute_diff(source_df, df, request.primary_key)}
+                else:
+                    payload = {"frame": df}
+                job = write_queue.enqueue(request.sync_mode, table_name, payload)
+                sync_report = {"mode": request.sync_mode, "job_id": job["job_id"], "status": job["status"]}
+                if "insert_job_id" in job:
+                    sync_report["insert_job_id"] = job["insert_job_id"]
+                message += f"\n⏳ Escritura en Supabase en cola: tabla '{table_name}' (job {job['job_id']})"
+            except Exception as e:
+                error_msg = f"No se pudo encolar la escritura en Supabase: {str(e)}"
+                print(f"❌ {error_msg}")
+                message += f"\n⚠️ {error_msg}"
+        elif source == "database" and table_name and request.sync_mode == "diff":
+            # Solo se escriben las filas eliminadas, modificadas o nuevas
+            try:
+                diff = compute_diff(source_df, df, request.primary_key)
+                sync_report = await apply_diff(supabase_writer, table_name, diff)
+                message += (
+                    f"\n✅ Tabla '{table_name}' sincronizada: {sync_report['updates']} "
+                    f"actualizaciones, {sync_report['inserts']} inserciones, "
+                    f"{sync_report['deletes']} eliminaciones"
+                )
+            except Exception as e:
+                error_msg = f"No se pudo sincronizar Supabase: {str(e)}"
+                print(f"❌ {error_msg}")
+                message += f"\n⚠️ {error_msg}"
+        elif source == "database" and table_name and request.sync_mode == "swap":
+            # Carga en una tabla staging y reemplazo en una sola transacción:
+            # la tabla nunca queda vacía ni a medias
+            try:
+                sync_report = await swap_table(supabase_writer, table_name, df)
+                message += (
+                    f"\n✅ Datos actualizados en Supabase: tabla '{table_name}' "
+                    f"({sync_report['rows']} filas, reemplazo atómico)"
+                )
+            except Exception as e:
+                error_msg = f"No se pudo actualizar Supabase: {str(e)}"
+                print(f"❌ {error_msg}")
+                message += f"\n⚠️ {error_msg}"
+        elif source == "database" and table_name:
             try:
                 print(f"🔄 Actualizando tabla '{table_name}' en Supabase...")
-                data = df.to_dict("records")
-
-                # Eliminar todos los registros existentes
-                try:
-                    delete_response = supabase.table(table_name).delete().neq('id', 0).execute()
-                    print(f"✅ Registros antiguos eliminados")
-                except Exception as e:
-                    print(f"⚠️ No se pudieron eliminar registros antiguos: {e}")
-
-                # Insertar datos limpios
-                if len(data) > 0:
-                    # Supabase tiene un límite de ~1000 registros por request
-                    batch_size = 1000
-                    for i in range(0, len(data), batch_size):
-                        batch = data[i:i + batch_size]
-                        insert_response = supabase.table(table_name).insert(batch).execute()
-                        print(f"✅ Insertados {len(batch)} registros (batch {i//batch_size + 1})")
-
-                    if hasattr(insert_response, "error") and insert_response.error:
-                        raise HTTPException(
-                            status_code=400,
-                            detail=f"Error al guardar en Supabase: {insert_response.error}",
-                        )
-
-                    message += f"\n✅ Datos actualizados en Supabase: tabla '{table_name}' ({len(data)} filas)"
-                    print(f"✅ Tabla '{table_name}' actualizada exitosamente con {len(data)} filas")
+                # Borrar todo e insertar en lotes por tamaño enviados en paralelo
+                if len(df) > 0:
+                    sync_report = await replace_table(supabase_writer, table_name, df)
+                    message += f"\n✅ Datos actualizados en Supabase: tabla '{table_name}' ({len(df)} filas)"
+                    print(
+                        f"✅ Tabla '{table_name}' actualizada exitosamente con {len(df)} filas "
+                        f"({sync_report['requests']} requests, {sync_report['retries']} reintentos)"
+                    )
                 else:
                     message += f"\n⚠️ No hay datos para actualizar en Supabase"
 
@@ -332,6 +725,59 @@ async def clean_data(request: CleanDataRequest):
         else:
             print(f"ℹ️ Sin información de origen, no se actualiza Supabase")
 
+        version = None
+        if request.dataset_id:
+            # Guardar el resultado como nueva versión
+            version = dataset_registry.add_version(
+                request.dataset_id,
+                df,
+                operation=operation,
+                parent=parent_version,
+                changes=cleaning_run["changes"] if cleaning_run else None,
+            )
+            if cleaning_run:
+                incremental_cleaner.commit(request.dataset_id, version, cleaning_run)
+            # Persistir la versión limpia para que el entrenamiento pueda mapearla
+            dataset_cache.save_frame(dataset_cache_key(request.dataset_id, version), df)
+            # Actualizar el perfil: solo se recalculan las columnas modificadas
+            profile_store.derive(
+                request.dataset_id,
+                parent_version,
+                version,
+                source_df,
+                df,
+                dataset_registry.changes_since(request.dataset_id, parent_version, version),
+            )
+
+        # Formatos columnares: devolver el dataset limpio completo
+        metadata = {
+            "message": message,
+            "table_name": table_name,
+            "dataset_id": request.dataset_id,
+            "version": version,
+        }
+        if response_format in BINARY_FORMATS:
+            return binary_response(df, response_format, {**metadata, "total_rows": len(df)})
+        if response_format == "columnar":
+            return columnar_response(
+                df, {**metadata, "pipeline": pipeline_report, "sync": sync_report}
+            )
+
+        if request.dataset_id:
+            # Dataset en el servidor: devolver solo una previsualización
+            return CSVResponse(
+                success=True,
+                data=df.head(request.preview_rows).to_dict("records"),
+                columns=df.columns.tolist(),
+                totalRows=len(df),
+                message=message,
+                table_name=table_name,
+                dataset_id=request.dataset_id,
+                version=version,
+                pipeline=pipeline_report,
+                sync=sync_report,
+            )
+
         # Convert back to list of dicts for response
         cleaned_data = df.to_dict("records")
 
@@ -342,6 +788,8 @@ async def clean_data(request: CleanDataRequest):
             totalRows=len(df),
             message=message,
             table_name=table_name,
+            pipeline=pipeline_report,
+            sync=sync_report,
         )
 
     except Exception as e:
@@ -353,108 +801,83 @@ async def clean_data(request: CleanDataRequest):
 # Global instances for ML services
 sklearn_trainer = None
 pytorch_trainer = None
-viz_service = VisualizationService()
+
+
+def resolve_training_data(request: TrainModelRequest):
+    """Validate a train request and return its DataFrame and feature cache key"""
+    # Convert data to DataFrame
+    df = resolve_dataframe(
+        request.data, request.columns, request.dataset_id, request.version
+    )
+    
+    print(f"DEBUG: DataFrame shape: {df.shape}")
+    print(f"DEBUG: Columns: {df.columns.tolist()}")
+    print(f"DEBUG: Target column: {request.target_column}")
+    print(f"DEBUG: Task type: {request.task_type}")
+    
+    if request.framework not in ("sklearn", "pytorch"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Framework '{request.framework}' no soportado"
+        )
+    
+    # Validate target column
+    if request.target_column not in df.columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Target column '{request.target_column}' not found in data"
+        )
+    
+    # Validate that there are numeric columns for features
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    if request.target_column in numeric_cols:
+        numeric_cols.remove(request.target_column)
+    
+    if len(numeric_cols) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="No se encontraron columnas numéricas para usar como características. El dataset debe tener al menos una columna numérica además de la columna objetivo."
+        )
+    
+    # Prepared feature matrices are cached per stored dataset version
+    cache_key = None
+    if request.dataset_id:
+        version = request.version or dataset_registry.latest_version(request.dataset_id)
+        cache_key = dataset_cache_key(request.dataset_id, version)
+    
+    return df, cache_key
+
+
+def training_spec(request: TrainModelRequest) -> Dict[str, Any]:
+    """Train request fields the worker needs (the data travels separately)"""
+    return request.model_dump(exclude={"data", "columns", "dataset_id", "version", "priority"})
+
+
+def store_trainer(framework: str, trainer) -> None:
+    """Keep the last trained model of each framework for /predictions and /predict"""
+    global sklearn_trainer, pytorch_trainer
+    if framework == "sklearn":
+        sklearn_trainer = trainer
+    else:
+        pytorch_trainer = trainer
+
+
+training_jobs.on_complete = store_trainer
 
 
 @app.post("/train-model")
 async def train_model(request: TrainModelRequest):
     """Train a machine learning model with sklearn or PyTorch"""
-    global sklearn_trainer, pytorch_trainer
-    
     try:
-        # Convert data to DataFrame
-        df = pd.DataFrame(request.data, columns=request.columns)
-        
-        print(f"DEBUG: DataFrame shape: {df.shape}")
-        print(f"DEBUG: Columns: {df.columns.tolist()}")
-        print(f"DEBUG: Target column: {request.target_column}")
-        print(f"DEBUG: Task type: {request.task_type}")
+        df, cache_key = resolve_training_data(request)
         
-        # Validate target column
-        if request.target_column not in df.columns:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Target column '{request.target_column}' not found in data"
-            )
+        # El entrenamiento corre en el pool de procesos: el servidor sigue respondiendo
+        job = training_jobs.submit(training_spec(request), df, cache_key)
+        job = await training_jobs.wait(job["job_id"])
+        if job["status"] != "completed":
+            raise RuntimeError(job["error"] or f"Entrenamiento {job['status']}")
         
-        # Validate that there are numeric columns for features
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-        if request.target_column in numeric_cols:
-            numeric_cols.remove(request.target_column)
-        
-        if len(numeric_cols) == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="No se encontraron columnas numéricas para usar como características. El dataset debe tener al menos una columna numérica además de la columna objetivo."
-            )
-        
-        results = {}
-        
-        if request.framework == "sklearn":
-            # Train with scikit-learn
-            sklearn_trainer = SklearnModelTrainer()
-            
-            metrics = sklearn_trainer.train(
-                df=df,
-                target_column=request.target_column,
-                model_type=request.model_type,
-                task_type=request.task_type,
-                test_size=request.test_size,
-                cv_folds=request.cv_folds,
-                optimize_hyperparams=request.optimize_hyperparams
-            )
-            
-            results = {
-                "success": True,
-                "framework": "sklearn",
-                "metrics": metrics,
-                "message": f"Modelo {request.model_type} entrenado exitosamente"
-            }
-            
-            # Generate visualizations
-            plots = viz_service.generate_all_plots(metrics, framework="sklearn")
-            results["plots"] = plots
-            
-        elif request.framework == "pytorch":
-            # Train with PyTorch
-            pytorch_trainer = PyTorchModelTrainer()
-            
-            training_results = pytorch_trainer.train(
-                df=df,
-                target_column=request.target_column,
-                architecture=request.architecture,
-                hidden_layers=request.hidden_layers,
-                neurons_per_layer=request.neurons_per_layer,
-                activation=request.activation,
-                optimizer_name=request.optimizer,
-                learning_rate=request.learning_rate,
-                epochs=request.epochs,
-                batch_size=request.batch_size,
-                loss_function=request.loss_function,
-                test_size=request.test_size
-            )
-            
-            results = {
-                "success": True,
-                "framework": "pytorch",
-                "metrics": training_results["test_metrics"],
-                "training_history": training_results["training_history"],
-                "training_time": training_results["training_time"],
-                "model_parameters": training_results["model_parameters"],
-                "message": f"Red neuronal {request.architecture} entrenada exitosamente"
-            }
-            
-            # Generate visualizations
-            plots = viz_service.generate_all_plots(training_results, framework="pytorch")
-            results["plots"] = plots
-            
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Framework '{request.framework}' no soportado"
-            )
-        
-        return JSONResponse(content=results)
+        return JSONResponse(content=job["result"])
         
     except Exception as e:
         import traceback
@@ -462,6 +885,41 @@ async def train_model(request: TrainModelRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class TrainJobRequest(TrainModelRequest):
+    # Higher runs first among queued jobs
+    priority: int = 0
+
+
+@app.post("/jobs/train")
+async def submit_training_job(request: TrainJobRequest):
+    """Queue a training job and return its id right away"""
+    df, cache_key = resolve_training_data(request)
+    job = training_jobs.submit(training_spec(request), df, cache_key, priority=request.priority)
+    return JSONResponse(content=job)
+
+
+@app.get("/jobs")
+async def list_training_jobs():
+    return {"jobs": training_jobs.list_jobs()}
+
+
+@app.get("/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Status and progress of a training job; includes the training result once completed"""
+    job = training_jobs.get(job_id, include_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+    return JSONResponse(content=job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_training_job(job_id: str):
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo '{job_id}' no encontrado")
+    return JSONResponse(content=job)
+
+
 @app.get("/predictions")
 async def get_predictions(n_samples: int = 10):
     """Get sample predictions from the last trained model"""
@@ -509,13 +967,15 @@ async def get_predictions(n_samples: int = 10):
 
 
 @app.post("/predict")
-async def predict(request: PredictRequest):
+async def predict(request: PredictRequest, http_request: Request):
     """Make predictions with a trained model"""
     global sklearn_trainer, pytorch_trainer
     
     try:
         # Convert data to DataFrame
-        df = pd.DataFrame(request.data, columns=request.columns)
+        df = resolve_dataframe(
+            request.data, request.columns, request.dataset_id, request.version
+        )
         
         if request.framework == "sklearn":
             if sklearn_trainer is None:
@@ -541,6 +1001,16 @@ async def predict(request: PredictRequest):
                 detail=f"Framework '{request.framework}' no soportado"
             )
         
+        response_format = negotiate_format(
+            http_request.headers.get("accept"), request.output_format
+        )
+        if response_format in BINARY_FORMATS:
+            return binary_response(
+                predictions_frame(predictions), response_format, {"total_rows": len(predictions)}
+            )
+        if response_format == "columnar":
+            return columnar_response(predictions_frame(predictions), {})
+
         return JSONResponse(content={
             "success": True,
             "predictions": predictions.tolist()
@@ -589,6 +1059,11 @@ class SaveToSupabaseRequest(BaseModel):
     training_results: Dict[str, Any]
     predictions: Optional[List[Dict[str, Any]]] = None
     model_metadata: Optional[Dict[str, Any]] = None
+    # Store every test-set prediction of the last trained model instead of
+    # the ``predictions`` sent by the client
+    from_trainer: bool = False
+    # Queue the write and respond with a job id
+    write_behind: bool = False
 
 
 @app.post("/save-to-supabase")
@@ -606,37 +1081,120 @@ async def save_to_supabase(request: SaveToSupabaseRequest):
             "created_at": "now()",
         }
         
-        # Guardar en tabla de resultados de modelos
-        result = supabase.table("model_results").insert(data_to_insert).execute()
-        
-        # Si hay predicciones, guardarlas también
-        if request.predictions and len(request.predictions) > 0:
-            model_id = result.data[0]["id"] if result.data else None
-            
-            if model_id:
-                predictions_data = [
-                    {
-                        "model_result_id": model_id,
-                        "sample_id": pred.get("sample_id"),
-                        "true_value": pred.get("true_value"),
-                        "predicted_value": pred.get("predicted_value"),
-                        "confidence": pred.get("confidence"),
-                    }
-                    for pred in request.predictions[:100]  # Limitar a 100 predicciones
-                ]
-                
-                supabase.table("model_predictions").insert(predictions_data).execute()
+        predictions = request.predictions
+        if request.from_trainer:
+            framework = request.training_results.get("framework")
+            trainer = pytorch_trainer if framework == "pytorch" else sklearn_trainer
+            if trainer is None:
+                raise ValueError("No hay un modelo entrenado del que tomar las predicciones")
+            predictions = trainer.test_predictions()
+
+        if request.write_behind:
+            job = write_queue.enqueue(
+                "model_results",
+                "model_results",
+                {"record": data_to_insert, "predictions": predictions},
+            )
+            return JSONResponse(content={
+                "success": True,
+                "message": "Resultados en cola para guardarse en Supabase",
+                "job_id": job["job_id"],
+                "status": job["status"],
+            })
+
+        # Guardar en tabla de resultados de modelos (y sus predicciones)
+        model_id = await save_model_results(supabase_writer, data_to_insert, predictions)
         
         return JSONResponse(content={
             "success": True,
             "message": "Resultados guardados exitosamente en Supabase",
-            "record_id": result.data[0]["id"] if result.data else None
+            "record_id": model_id
         })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al guardar en Supabase: {str(e)}")
 
 
+class SupabaseLoadRequest(BaseModel):
+    primary_key: str = "id"
+    # Column used to pull only the rows modified since the last sync
+    updated_column: str = "updated_at"
+    full_refresh: bool = False
+    # Also fetch the list of keys to drop rows deleted in Supabase
+    detect_deletes: bool = True
+
+
+@app.post("/supabase/tables/{table_name}/load")
+async def load_supabase_table(table_name: str, request: SupabaseLoadRequest = SupabaseLoadRequest()):
+    """
+    Download a Supabase table into the dataset store (only the rows changed
+    since the previous load when the table has ``updated_column``)
+    """
+    try:
+        dataset_id, version, report = await supabase_reader.sync(
+            table_name,
+            primary_key=request.primary_key,
+            updated_column=request.updated_column,
+            full_refresh=request.full_refresh,
+            detect_deletes=request.detect_deletes,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"No se pudo leer la tabla de Supabase: {str(e)}")
+
+    df = dataset_registry.get(dataset_id, version)
+    profile_store.compute(dataset_id, version, df)
+    return JSONResponse(content={**dataset_registry.info(dataset_id, version), "sync": report})
+
+
+@app.get("/supabase/writer-stats")
+async def get_supabase_writer_stats():
+    """Throughput counters of the Supabase bulk writer since startup"""
+    return supabase_writer.stats()
+
+
+@app.get("/supabase/jobs")
+async def list_supabase_jobs(status: Optional[str] = None):
+    """Queued Supabase writes (optionally filtered by status)"""
+    return {"jobs": write_queue.list_jobs(status)}
+
+
+@app.get("/supabase/jobs/{job_id}")
+async def get_supabase_job(job_id: str):
+    job = write_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Escritura '{job_id}' no encontrada")
+    return job
+
+
+@app.on_event("startup")
+async def start_write_queue():
+    # Retoma las escrituras pendientes del journal
+    write_queue.start()
+
+
+@app.on_event("shutdown")
+async def close_supabase_writer():
+    await write_queue.stop()
+    await supabase_writer.close()
+    training_jobs.shutdown()
+    shutdown_parse_pool()
+
+
+# Catch-all route para React Router
+# Esto debe ir al FINAL para que no interfiera con tus API routes
+@app.get("/{full_path:path}")
+async def serve_react_app(full_path: str):
+    # Si es un archivo estático específico, intentar servirlo
+    static_file = Path(f"static/{full_path}")
+    if static_file.is_file():
+        return FileResponse(static_file)
+
+    # Para cualquier otra ruta, servir index.html (React Router se encarga)
+    return FileResponse("static/index.html")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,107 @@
+"""
+Cleaning Pipeline Service
+Plans and runs several cleaning operations over one in-memory DataFrame
+"""
+
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from cleaning_service import apply_operation, clean_duplicates, clean_inconsistencies
+
+OPERATIONS = ("missing", "normalize", "transform", "near_duplicates")
+
+# clean_inconsistencies flags and their defaults, used to merge transform steps
+TRANSFORM_FLAGS = {"normalizeText": True, "removeSpaces": True, "lowercase": False}
+
+
+def build_plan(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Turn an ordered list of ``{"operation", "params"}`` steps into an
+    execution plan.
+
+    Fusion rules (order is always preserved):
+      - consecutive "transform" steps merge into one step; their transforms
+        are idempotent and commute, so the merged step enables the union of
+        their flags
+      - a "transform" immediately followed by "normalize" (duplicates) hands
+        the normalized value codes to the duplicate detection, so text is
+        hashed once and the duplicate pass sees normalized values
+    """
+    plan: List[Dict[str, Any]] = []
+    for index, step in enumerate(steps):
+        operation = step.get("operation")
+        params = dict(step.get("params") or {})
+        if operation not in OPERATIONS:
+            raise ValueError(f"Operación no soportada en el paso {index + 1}: {operation}")
+
+        previous = plan[-1] if plan else None
+        if operation == "transform" and previous and previous["operation"] == "transform":
+            for flag, default in TRANSFORM_FLAGS.items():
+                previous["params"][flag] = bool(
+                    previous["params"].get(flag, default) or params.get(flag, default)
+                )
+            previous["steps"].append(index)
+            continue
+
+        plan.append(
+            {"operation": operation, "params": params, "steps": [index], "fused_codes": False}
+        )
+
+    for current, following in zip(plan, plan[1:]):
+        if current["operation"] == "transform" and following["operation"] == "normalize":
+            following["fused_codes"] = True
+
+    return plan
+
+
+def run_pipeline(
+    df: pd.DataFrame, steps: List[Dict[str, Any]]
+) -> Tuple[pd.DataFrame, str, List[Dict[str, Any]]]:
+    """
+    Execute a cleaning pipeline on ``df`` (modified in place where possible).
+
+    The plan saves steps and shares work between them, but each of its
+    steps is still its own pass over the frame: a merged plan, not a
+    single pass over the data.
+
+    Returns:
+        Tuple of (cleaned DataFrame, combined message, per-step report with
+        timings and row deltas)
+    """
+    plan = build_plan(steps)
+    report = []
+    messages = []
+    codes: Dict[str, np.ndarray] = {}
+
+    for position, step in enumerate(plan):
+        rows_before = len(df)
+        start_time = time.time()
+        emit_codes = position + 1 < len(plan) and plan[position + 1]["fused_codes"]
+
+        if step["operation"] == "transform" and emit_codes:
+            codes = {}
+            df, message = clean_inconsistencies(df, step["params"], codes_out=codes)
+        elif step["operation"] == "normalize" and step["fused_codes"]:
+            df, message = clean_duplicates(df, step["params"], key_codes=codes)
+            codes = {}
+        else:
+            df, message = apply_operation(df, step["operation"], step["params"])
+
+        messages.append(message)
+        report.append(
+            {
+                "operation": step["operation"],
+                "params": step["params"],
+                "steps": [index + 1 for index in step["steps"]],
+                "fused_codes": step["fused_codes"],
+                "rows_before": rows_before,
+                "rows_after": len(df),
+                "rows_delta": len(df) - rows_before,
+                "time": time.time() - start_time,
+                "message": message,
+            }
+        )
+
+    return df, "\n".join(messages), report
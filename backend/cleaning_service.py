@@ -0,0 +1,327 @@
+"""
+Data Cleaning Service
+Cleaning operations applied by /clean-data (missing values, duplicates, text)
+"""
+
+import shutil
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from csv_ingest import DEFAULT_CHUNK_ROWS, csv_chunk_source
+from duplicate_engine import (
+    chunk_keep_mask,
+    detect_id_columns,
+    find_duplicates,
+    find_duplicates_in_chunks,
+    row_fingerprints,
+)
+from imputation import DEFAULT_BLOCK_ROWS as IMPUTATION_BLOCK_ROWS
+from imputation import (
+    DEFAULT_MAX_ITER,
+    DEFAULT_NEIGHBORS,
+    column_modes,
+    fill_columns,
+    group_fill,
+    iterative_impute,
+    knn_impute,
+)
+from near_duplicates import (
+    DEFAULT_NUM_PERM,
+    DEFAULT_SHINGLE_SIZE,
+    DEFAULT_THRESHOLD,
+    find_near_duplicates,
+    text_columns,
+)
+from text_normalization import normalize_text_columns
+
+
+# Imputation methods that fill with one value per column (reusable on new rows)
+FILL_METHODS = ("mean", "median", "mode")
+
+
+def missing_fill_values(df: pd.DataFrame, method: str) -> Dict[str, Any]:
+    """Fill value per column for ``method`` ("mean", "median" or "mode")"""
+    if method in ("mean", "median"):
+        numeric_columns = df.select_dtypes(include=[np.number]).columns
+        stats = df[numeric_columns].mean() if method == "mean" else df[numeric_columns].median()
+        return stats.to_dict()
+    return column_modes(df, df.columns.tolist())
+
+
+def clean_missing_values(
+    df: pd.DataFrame,
+    params: dict,
+    fill_values: Optional[Dict[str, Any]] = None,
+    stats_out: Optional[Dict[str, Any]] = None,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Tratar valores nulos (imputación o eliminación de filas).
+
+    Besides the per-column methods, ``group_mean``/``group_median`` fill by
+    the group of the ``groupBy`` column, ``knn`` with the mean of the
+    ``neighbors`` nearest complete rows and ``iterative`` by modelling each
+    column from the others (numeric columns only).
+
+    ``fill_values`` replaces the statistics computed from ``df`` (used to
+    fill new rows with the values of a previous run); ``stats_out`` receives
+    the fill values that were used.
+    """
+    method = params.get("method", "mean")
+    remove_nulls = params.get("removeNulls", False)
+
+    initial_rows = len(df)
+    initial_nulls = df.isnull().sum().sum()
+
+    if remove_nulls:
+        df = df.dropna()
+
+    numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    if method in FILL_METHODS:
+        if fill_values is None:
+            fill_values = missing_fill_values(df, method)
+        if stats_out is not None:
+            stats_out.update(fill_values)
+        df = fill_columns(df, fill_values)
+    elif method in ("group_mean", "group_median"):
+        group_by = params.get("groupBy")
+        if not group_by:
+            raise ValueError("El método por grupos requiere 'groupBy'")
+        df = group_fill(df, numeric_columns, group_by, statistic=method.split("_")[1])
+    elif method == "knn":
+        df = knn_impute(
+            df,
+            numeric_columns,
+            n_neighbors=int(params.get("neighbors", DEFAULT_NEIGHBORS)),
+            block_rows=int(params.get("blockRows", IMPUTATION_BLOCK_ROWS)),
+        )
+    elif method == "iterative":
+        df = iterative_impute(
+            df, numeric_columns, max_iter=int(params.get("maxIter", DEFAULT_MAX_ITER))
+        )
+    elif method == "forward":
+        df = df.fillna(method="ffill")
+    elif method == "backward":
+        df = df.fillna(method="bfill")
+
+    final_nulls = df.isnull().sum().sum()
+    rows_removed = initial_rows - len(df) if remove_nulls else 0
+
+    message = f"Valores nulos procesados: {initial_nulls - final_nulls} reemplazados"
+    if remove_nulls:
+        message += f", {rows_removed} filas eliminadas"
+
+    return df, message
+
+
+def clean_duplicates(
+    df: pd.DataFrame,
+    params: dict,
+    key_codes: Optional[Dict[str, np.ndarray]] = None,
+    index_out: Optional[Dict[str, Any]] = None,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Eliminar filas duplicadas del DataFrame.
+
+    ``key_codes`` maps columns to integer codes of their values (as produced
+    by a preceding text normalization); those columns are compared by code
+    instead of rehashing their strings.
+
+    When ``index_out`` is given it receives the compared ``columns`` and the
+    64-bit ``fingerprints`` and ``labels`` of the rows in the result, so new
+    rows can later be probed against them (see ``incremental_cleaning``).
+    """
+    remove_duplicates = params.get("removeDuplicates", False)
+    
+    initial_rows = len(df)
+    
+    # Identificar columnas ID (por nombre, o también por forma de clave si se pide) para ignorarlas
+    id_columns = detect_id_columns(df, detect_keys=params.get("detectKeyColumns", False))
+    
+    # Columnas a considerar para duplicados (todas excepto IDs)
+    columns_to_check = [col for col in df.columns if col not in id_columns]
+    
+    # Si no hay columnas para verificar (solo IDs), usar todas
+    if not columns_to_check:
+        columns_to_check = df.columns.tolist()
+    
+    # Cada fila se reduce una sola vez a una huella hash; conteos y máscara
+    # salen de esa misma pasada (las columnas de key_codes se hashean por código)
+    bits = 128 if int(params.get("hashBits", 64)) == 128 else 64
+    result = find_duplicates(df, columns_to_check, key_codes=key_codes, bits=bits)
+    initial_duplicates = result["duplicate_rows"]
+    duplicates_to_remove = result["duplicates_to_remove"]
+    
+    if index_out is not None:
+        fingerprints = result.get("fingerprints")
+        if fingerprints is None or fingerprints.ndim != 1 or key_codes:
+            # The index holds fingerprints of the values themselves
+            fingerprints = row_fingerprints(df, columns_to_check)
+        keep = result["keep_mask"] if remove_duplicates else slice(None)
+        index_out.update(
+            {
+                "columns": columns_to_check,
+                "fingerprints": fingerprints[keep],
+                "labels": df.index.to_numpy()[keep],
+            }
+        )
+    
+    if remove_duplicates and duplicates_to_remove:
+        # Eliminar duplicados manteniendo la primera ocurrencia
+        df = df[result["keep_mask"]]
+    
+    final_rows = len(df)
+    rows_removed = initial_rows - final_rows
+    
+    # Mensaje informativo
+    message = f"Duplicados encontrados: {duplicates_to_remove}"
+    if id_columns:
+        message += f" (ignorando columnas ID: {', '.join(id_columns)})"
+    
+    if remove_duplicates:
+        message += f". {rows_removed} filas duplicadas eliminadas, manteniendo solo la primera ocurrencia de cada grupo"
+    else:
+        message += ". Activa 'Eliminar filas duplicadas' para limpiarlos"
+    
+    return df, message
+
+
+def deduplicate_csv(
+    path: str,
+    out_path: Optional[str] = None,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    columns: Optional[List[str]] = None,
+    bits: int = 64,
+) -> Dict[str, Any]:
+    """
+    Buscar filas duplicadas en un CSV en disco sin cargarlo entero en memoria.
+
+    The file is read in chunks of ``chunk_rows`` rows with every value as
+    text, so rows match when their values are written the same way. By
+    default ID columns are ignored, as in ``clean_duplicates`` (their
+    uniqueness is checked on the first chunk). With ``out_path`` the rows
+    to keep are written there as CSV, chunk by chunk.
+    """
+    chunks = csv_chunk_source(path, delimiter, encoding, chunk_rows)
+    first = next(iter(chunks()), None)
+    if first is None:
+        # Only a header: nothing to compare
+        if out_path is not None:
+            shutil.copyfile(path, out_path)
+        return {"rows": 0, "columns": [], "duplicate_rows": 0, "duplicates_to_remove": 0, "groups": 0}
+
+    if columns:
+        missing = [col for col in columns if col not in first.columns]
+        if missing:
+            raise ValueError(f"Columnas no encontradas: {', '.join(missing)}")
+    else:
+        id_columns = detect_id_columns(first)
+        columns = [col for col in first.columns if col not in id_columns] or first.columns.tolist()
+    del first
+
+    result = find_duplicates_in_chunks(chunks, columns, bits=bits)
+    drop_rows = result.pop("drop_rows")
+    if out_path is not None:
+        start = 0
+        with open(out_path, "w", encoding=encoding, newline="") as out:
+            for chunk in chunks():
+                keep = chunk_keep_mask(drop_rows, start, len(chunk))
+                chunk[keep].to_csv(out, sep=delimiter, index=False, header=start == 0)
+                start += len(chunk)
+    return {**result, "columns": columns}
+
+
+def clean_inconsistencies(
+    df: pd.DataFrame, params: dict, codes_out: Optional[Dict[str, np.ndarray]] = None
+) -> tuple[pd.DataFrame, str]:
+    """
+    Limpiar inconsistencias en los datos (espacios, mayúsculas, etc.).
+
+    If ``codes_out`` is given it receives the integer codes of the normalized
+    text columns, for a fused duplicate detection right after.
+    """
+    normalize_text = params.get("normalizeText", True)
+    remove_spaces = params.get("removeSpaces", True)
+    lowercase = params.get("lowercase", False)
+    
+    # Obtener columnas de texto (las categóricas vienen del modo de carga compacto)
+    text_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    
+    # Todas las transformaciones en una sola pasada por columna, sobre los valores distintos
+    df, changes = normalize_text_columns(
+        df,
+        text_columns,
+        strip=remove_spaces,
+        lowercase=lowercase,
+        collapse_spaces=normalize_text,
+        codes_out=codes_out,
+    )
+    
+    changed_cells = sum(changes.values())
+    changed_columns = [col for col, n_changed in changes.items() if n_changed]
+    
+    message = f"Inconsistencias procesadas en {len(text_columns)} columnas de texto"
+    message += f". {changed_cells} celdas modificadas"
+    if changed_columns:
+        message += f" en {len(changed_columns)} columnas ({', '.join(changed_columns)})"
+    
+    return df, message
+
+
+def clean_near_duplicates(df: pd.DataFrame, params: dict) -> tuple[pd.DataFrame, str]:
+    """
+    Detectar filas casi duplicadas (p. ej. que difieren por un error de tipeo)
+    con firmas MinHash y bandas LSH sobre las columnas de texto.
+
+    Sin ``removeDuplicates`` se agrega la columna ``clusterColumn`` con el id
+    de grupo de cada fila (-1 si no tiene casi duplicados).
+    """
+    remove_duplicates = params.get("removeDuplicates", False)
+    threshold = float(params.get("threshold", DEFAULT_THRESHOLD))
+    cluster_column = params.get("clusterColumn", "near_duplicate_cluster")
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold debe estar entre 0 y 1")
+    
+    columns = text_columns(df, params.get("columns"))
+    if not columns:
+        return df, "No se encontraron columnas de texto para buscar casi duplicados"
+    
+    result = find_near_duplicates(
+        df,
+        columns,
+        threshold=threshold,
+        num_perm=int(params.get("numPerm", DEFAULT_NUM_PERM)),
+        shingle_size=int(params.get("shingleSize", DEFAULT_SHINGLE_SIZE)),
+    )
+    
+    message = (
+        f"Casi duplicados encontrados: {result['clustered_rows']} filas en "
+        f"{result['clusters']} grupos (similitud >= {threshold:.2f} en {', '.join(columns)})"
+    )
+    if remove_duplicates:
+        rows_removed = int((~result["keep_mask"]).sum())
+        df = df[result["keep_mask"]]
+        message += f". {rows_removed} filas eliminadas, manteniendo la primera de cada grupo"
+    else:
+        df[cluster_column] = result["cluster_ids"]
+        message += f". Grupos asignados en la columna '{cluster_column}'"
+    
+    return df, message
+
+
+def apply_operation(df: pd.DataFrame, operation: str, params: dict) -> tuple[pd.DataFrame, str]:
+    """Run one cleaning operation by name"""
+    if operation == "missing":
+        return clean_missing_values(df, params)
+    elif operation == "normalize":
+        # Operación para limpiar duplicados
+        return clean_duplicates(df, params)
+    elif operation == "transform":
+        # Operación para limpiar inconsistencias
+        return clean_inconsistencies(df, params)
+    elif operation == "near_duplicates":
+        return clean_near_duplicates(df, params)
+    raise ValueError(f"Operación no soportada: {operation}")
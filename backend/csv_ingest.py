@@ -0,0 +1,494 @@
+"""
+CSV Ingestion Service
+Parses uploaded CSV files chunk by chunk or in parallel, straight from bytes
+"""
+
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+# Rows parsed per chunk in streaming mode. Bounds the parser's working memory.
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Parser backends selectable from /load-csv
+PARSER_ENGINES = ("c", "pyarrow", "process")
+
+# Workers used by the "process" engine (one byte range per worker)
+DEFAULT_PARSE_WORKERS = int(os.getenv("CSV_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Quote counting over a memory-mapped file reads this many bytes at a time
+SCAN_BLOCK_BYTES = 16 * 1024 * 1024
+
+# Byte ranges smaller than this aren't worth shipping to another process
+MIN_RANGE_BYTES = 4 * 1024 * 1024
+
+# Parsed chunks are spooled here as Arrow files until the frame is assembled
+SPOOL_DIR = os.getenv("CSV_SPOOL_DIR") or None
+
+# Text columns with at most this ratio of distinct values become ``category``
+DEFAULT_CATEGORY_RATIO = 0.5
+
+
+def iter_csv_chunks(
+    source: BinaryIO,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    dtype: Any = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of at most ``chunk_rows`` rows read from a binary stream"""
+    reader = pd.read_csv(
+        source,
+        delimiter=delimiter,
+        encoding=encoding,
+        chunksize=max(1, chunk_rows),
+        dtype=dtype,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def csv_chunk_source(
+    path: str,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Callable[[], Iterator[pd.DataFrame]]:
+    """
+    Re-readable chunks of a CSV file on disk. Every column is read as text,
+    so all chunks hash alike whatever each one would infer on its own.
+    """
+    def chunks() -> Iterator[pd.DataFrame]:
+        with open(path, "rb") as source:
+            yield from iter_csv_chunks(source, delimiter, encoding, chunk_rows, dtype=str)
+
+    return chunks
+
+
+def _write_chunk(chunk: pd.DataFrame, path: Path) -> None:
+    """Spool a parsed chunk to an Arrow IPC file"""
+    try:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        # Text columns holding some numbers (mixed types) are stored as text
+        mixed = {
+            col: chunk[col].where(chunk[col].isna(), chunk[col].astype(str))
+            for col in chunk.columns
+            if chunk[col].dtype == object
+        }
+        table = pa.Table.from_pandas(chunk.assign(**mixed), preserve_index=False)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _common_type(types: List[pa.DataType]) -> pa.DataType:
+    """Type one column takes when its chunks were inferred separately"""
+    # All-null chunks carry no type information
+    known = [t for t in types if not pa.types.is_null(t)] or types
+    if all(t == known[0] for t in known):
+        return known[0]
+    if all(pa.types.is_integer(t) for t in known):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in known):
+        return pa.float64()
+    # Text anywhere makes the whole column text, as a single parse would
+    return pa.string()
+
+
+def _assemble(paths: List[Path]) -> pd.DataFrame:
+    """
+    Build one DataFrame from spooled chunk files, giving each column a single
+    type across chunks. The files are memory-mapped, so only the final frame
+    is held in memory.
+    """
+    if not paths:
+        return pd.DataFrame()
+
+    tables = []
+    for path in paths:
+        with pa.memory_map(str(path), "r") as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+
+    names = tables[0].column_names
+    columns = []
+    for i, _ in enumerate(names):
+        target = _common_type([table.column(i).type for table in tables])
+        columns.append(
+            pa.chunked_array(
+                [chunk for table in tables for chunk in table.column(i).cast(target).chunks],
+                type=target,
+            )
+        )
+    df = pa.Table.from_arrays(columns, names=names).to_pandas()
+
+    # Missing text comes back as None: use NaN, as the pandas parser does
+    text = [col for col in df.columns if df[col].dtype == object and df[col].hasnans]
+    if text:
+        df[text] = df[text].where(df[text].notna(), np.nan)
+    return df
+
+
+def stream_csv(
+    source: BinaryIO,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Parse a CSV stream in chunks and assemble the full DataFrame.
+
+    The upload is read straight from its (spooled) file object, and every
+    parsed chunk is written to a temporary Arrow file before the next one is
+    read, so parsing holds one chunk at a time and the frame is built once
+    from the memory-mapped files.
+
+    Returns:
+        Tuple of (DataFrame, ingest stats)
+    """
+    start_time = time.time()
+
+    with tempfile.TemporaryDirectory(prefix="csv_", dir=SPOOL_DIR) as spool:
+        paths: List[Path] = []
+        for chunk in iter_csv_chunks(source, delimiter, encoding, chunk_rows):
+            path = Path(spool) / f"{len(paths):06d}.arrow"
+            _write_chunk(chunk, path)
+            paths.append(path)
+            del chunk
+        df = _assemble(paths)
+
+    stats = {
+        "chunks": len(paths),
+        "chunk_rows": chunk_rows,
+        "parse_time": time.time() - start_time,
+    }
+    return df, stats
+
+
+def read_csv_pyarrow(
+    source: BinaryIO, delimiter: str = ",", encoding: str = "utf-8"
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Parse a CSV stream with Arrow's multi-threaded reader"""
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(encoding=encoding, use_threads=True),
+        # Quoted fields may contain line breaks, as with the pandas parser
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+        # Empty text fields are nulls, as with the pandas parser
+        convert_options=pa_csv.ConvertOptions(strings_can_be_null=True),
+    )
+    n_chunks = table.column(0).num_chunks if table.num_columns else 0
+    return table.to_pandas(), {"chunks": n_chunks}
+
+
+def _count_quotes(data, start: int, end: int) -> int:
+    """Number of ``"`` bytes in ``data[start:end]`` (bytes or a memory map)"""
+    if isinstance(data, bytes):
+        return data.count(b'"', start, end)
+    return sum(
+        data[offset : min(offset + SCAN_BLOCK_BYTES, end)].count(b'"')
+        for offset in range(start, end, SCAN_BLOCK_BYTES)
+    )
+
+
+def _record_end(data: bytes, start: int, in_quotes: bool = False) -> int:
+    """
+    Return the offset just past the first record terminator at or after
+    ``start``. A newline ends a record only when it lies outside quotes,
+    which is tracked by quote parity ("" escapes count twice, keeping it).
+    """
+    quotes = 1 if in_quotes else 0
+    position = start
+    while True:
+        newline = data.find(b"\n", position)
+        if newline == -1:
+            return len(data)
+        quotes += _count_quotes(data, position, newline)
+        if quotes % 2 == 0:
+            return newline + 1
+        position = newline + 1
+
+
+def split_byte_ranges(data, n_ranges: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split ``data[start:]`` (bytes or a memory map) into up to ``n_ranges``
+    byte ranges of whole records.
+
+    ``start`` must be a record boundary. Each cut point is moved to the end of
+    the record containing it; whether it falls inside a quoted field is known
+    from the quote parity since the previous boundary, so quoted multi-line
+    fields are never split.
+    """
+    total = len(data) - start
+    if total <= 0:
+        return []
+    n_ranges = max(1, min(n_ranges, total // MIN_RANGE_BYTES))
+    target_size = total // n_ranges
+
+    ranges = []
+    range_start = start
+    while range_start < len(data):
+        target = range_start + target_size
+        if len(ranges) == n_ranges - 1 or target >= len(data):
+            ranges.append((range_start, len(data)))
+            break
+        in_quotes = _count_quotes(data, range_start, target) % 2 == 1
+        end = _record_end(data, target, in_quotes)
+        ranges.append((range_start, end))
+        range_start = end
+    return ranges
+
+
+def _parse_byte_range(
+    path: str,
+    header: bytes,
+    start: int,
+    end: int,
+    delimiter: str,
+    encoding: str,
+    dtypes: Optional[Dict[str, str]],
+    out_path: str,
+) -> int:
+    """
+    Worker: parse one byte range of the spooled file (prefixed with the
+    header line) with the dtypes inferred from the first range, and spool
+    the result as an Arrow file. Returns the number of rows.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = header + f.read(end - start)
+    try:
+        chunk = pd.read_csv(BytesIO(data), delimiter=delimiter, encoding=encoding, dtype=dtypes)
+    except (ValueError, TypeError, OverflowError):
+        # Values the first range didn't have (e.g. missing in an integer
+        # column): infer this range on its own, types are unified afterwards
+        chunk = pd.read_csv(BytesIO(data), delimiter=delimiter, encoding=encoding)
+    _write_chunk(chunk, Path(out_path))
+    return len(chunk)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _parse_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every request using the "process" engine"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=DEFAULT_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_parse_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def read_csv_parallel(
+    source: BinaryIO,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    workers: int = DEFAULT_PARSE_WORKERS,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Parse a CSV stream by fanning byte ranges out to the shared process pool.
+
+    The upload is copied to a temporary file that is memory-mapped to find
+    the range boundaries and read by each worker, so the raw bytes are never
+    held in memory. Ranges are cut on record boundaries, so quoted multi-line
+    fields stay intact. The first range is parsed here and its dtypes are
+    passed to the others, so every range reads a column the same way.
+    """
+    with tempfile.TemporaryDirectory(prefix="csv_", dir=SPOOL_DIR) as spool:
+        path = os.path.join(spool, "upload.csv")
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f, SCAN_BLOCK_BYTES)
+        if os.path.getsize(path) == 0:
+            return pd.read_csv(path, delimiter=delimiter, encoding=encoding), {"chunks": 0, "workers": 0}
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = _record_end(data, 0)
+            header = data[:header_end]
+            ranges = split_byte_ranges(data, workers, start=header_end)
+
+        if len(ranges) <= 1:
+            df = pd.read_csv(path, delimiter=delimiter, encoding=encoding)
+            return df, {"chunks": 1, "workers": 1}
+
+        start, end = ranges[0]
+        with open(path, "rb") as f:
+            f.seek(start)
+            first = pd.read_csv(
+                BytesIO(header + f.read(end - start)), delimiter=delimiter, encoding=encoding
+            )
+        dtypes = {str(col): str(dtype) for col, dtype in first.dtypes.items()}
+        paths = [Path(spool) / f"{i:06d}.arrow" for i in range(len(ranges))]
+        _write_chunk(first, paths[0])
+        del first
+
+        futures = [
+            _parse_pool().submit(
+                _parse_byte_range, path, header, start, end, delimiter, encoding, dtypes, str(out)
+            )
+            for (start, end), out in zip(ranges[1:], paths[1:])
+        ]
+        for future in futures:
+            future.result()
+        df = _assemble(paths)
+
+    return df, {"chunks": len(ranges), "workers": min(len(ranges), workers)}
+
+
+def _stream_size(source: BinaryIO) -> Optional[int]:
+    """Size in bytes of a seekable stream (None if it can't be determined)"""
+    try:
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        source.seek(position)
+        return size - position
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def parse_csv(
+    source: BinaryIO,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+    engine: str = "c",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Parse a CSV stream with the selected engine and report throughput.
+
+    Engines:
+        c: pandas C parser, chunk by chunk (bounded memory, single core)
+        pyarrow: Arrow multi-threaded reader
+        process: byte-range fan-out across a process pool
+
+    Returns:
+        Tuple of (DataFrame, ingest stats with MB/s and rows/s)
+    """
+    if engine not in PARSER_ENGINES:
+        raise ValueError(
+            f"Motor de parseo no soportado: {engine}. Opciones: {', '.join(PARSER_ENGINES)}"
+        )
+
+    n_bytes = _stream_size(source)
+    start_time = time.time()
+
+    if engine == "pyarrow":
+        df, stats = read_csv_pyarrow(source, delimiter, encoding)
+    elif engine == "process":
+        df, stats = read_csv_parallel(source, delimiter, encoding)
+    else:
+        df, stats = stream_csv(source, delimiter, encoding, chunk_rows)
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    stats.update(
+        {
+            "engine": engine,
+            "parse_time": elapsed,
+            "bytes": n_bytes,
+            "rows": len(df),
+            "mb_per_s": (n_bytes / 1024 / 1024 / elapsed) if n_bytes is not None else None,
+            "rows_per_s": len(df) / elapsed,
+        }
+    )
+    return df, stats
+
+
+def _downcast_numeric(series: pd.Series) -> pd.Series:
+    """Return ``series`` with the smallest numeric dtype that holds it losslessly"""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+
+    if pd.api.types.is_integer_dtype(series):
+        # Signed types only, so later arithmetic (diffs, centering) can't wrap
+        return pd.to_numeric(series, downcast="integer")
+
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy()
+        # Float columns that only hold finite whole numbers within int64 are integers
+        bounds = np.iinfo(np.int64)
+        if (
+            not series.hasnans
+            and np.isfinite(values).all()
+            and np.array_equal(values, np.round(values))
+            and values.min(initial=0) >= bounds.min
+            and values.max(initial=0) < bounds.max
+        ):
+            return _downcast_numeric(series.astype(np.int64))
+
+        downcast = series.astype(np.float32)
+        if np.array_equal(downcast.to_numpy().astype(values.dtype), values, equal_nan=True):
+            return downcast
+
+    return series
+
+
+def compact_dtypes(
+    df: pd.DataFrame, category_ratio: float = DEFAULT_CATEGORY_RATIO
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Return a copy of ``df`` with compact dtypes.
+
+    Numeric columns are downcast to the smallest lossless dtype and
+    low-cardinality text columns are converted to ``category``.
+
+    Returns:
+        Tuple of (compacted DataFrame, memory report per column)
+    """
+    columns_report = {}
+    compacted = {}
+
+    for col in df.columns:
+        series = df[col]
+        before = int(series.memory_usage(deep=True, index=False))
+
+        if pd.api.types.is_numeric_dtype(series):
+            series = _downcast_numeric(series)
+        elif series.dtype == object and len(series) > 0:
+            n_unique = series.nunique(dropna=True)
+            if n_unique / len(series) <= category_ratio:
+                series = series.astype("category")
+
+        after = int(series.memory_usage(deep=True, index=False))
+        compacted[col] = series
+        columns_report[col] = {
+            "original_dtype": str(df[col].dtype),
+            "dtype": str(series.dtype),
+            "bytes_before": before,
+            "bytes_after": after,
+            "bytes_saved": before - after,
+        }
+
+    total_before = sum(col["bytes_before"] for col in columns_report.values())
+    total_after = sum(col["bytes_after"] for col in columns_report.values())
+    report = {
+        "bytes_before": total_before,
+        "bytes_after": total_after,
+        "bytes_saved": total_before - total_after,
+        "columns": columns_report,
+    }
+    return pd.DataFrame(compacted, index=df.index), report
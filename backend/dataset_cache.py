@@ -0,0 +1,129 @@
+"""
+Dataset Cache Service
+Persists cleaned frames and prepared feature matrices as memory-mapped files
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+def dataset_cache_key(dataset_id: str, version: int) -> str:
+    """Cache key identifying one version of a stored dataset"""
+    return f"{dataset_id}_v{version}"
+
+
+class DatasetCache:
+    """
+    On-disk cache keyed by dataset version.
+
+    Cleaned frames are written as uncompressed Arrow IPC files and feature
+    matrices as ``.npy`` arrays, so repeated training runs (and other worker
+    processes) can memory-map them instead of re-parsing and re-scaling.
+    """
+
+    def __init__(self, cache_dir: str = "cache"):
+        self.cache_dir = Path(cache_dir)
+        self.frames_dir = self.cache_dir / "frames"
+        self.features_dir = self.cache_dir / "features"
+        self.frames_dir.mkdir(parents=True, exist_ok=True)
+        self.features_dir.mkdir(parents=True, exist_ok=True)
+
+    def frame_path(self, key: str) -> Path:
+        return self.frames_dir / f"{key}.arrow"
+
+    def save_frame(self, key: str, df: pd.DataFrame) -> bool:
+        """Write a frame as an Arrow IPC file. Returns False if Arrow can't encode it."""
+        path = self.frame_path(key)
+        if path.exists():
+            return True
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # Mixed-type object columns can't be represented in Arrow
+            print(f"Warning: frame '{key}' not cached: {e}")
+            return False
+
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return True
+
+    def load_frame(self, key: str) -> Optional[pd.DataFrame]:
+        """Memory-map a cached frame (None if it isn't cached)"""
+        path = self.frame_path(key)
+        if not path.exists():
+            return None
+
+        with pa.memory_map(str(path), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+
+    def features_key(self, key: str, params: Dict[str, Any]) -> str:
+        """Derive the feature-matrix key from a dataset key and the preparation params"""
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        return f"{key}_{digest}"
+
+    def save_features(
+        self, key: str, arrays: Dict[str, np.ndarray], state: Dict[str, Any]
+    ) -> None:
+        """
+        Store prepared arrays (one ``.npy`` per name) and the fitted
+        preprocessing state (scaler, encoders, feature names).
+        """
+        path = self.features_dir / key
+        if path.exists():
+            return
+
+        # Write into a private directory and rename it, so concurrent readers
+        # never see a half-written entry
+        tmp_path = self.features_dir / f"{key}.{uuid.uuid4().hex}.tmp"
+        tmp_path.mkdir()
+        for name, array in arrays.items():
+            np.save(tmp_path / f"{name}.npy", np.asarray(array), allow_pickle=False)
+        joblib.dump(state, tmp_path / "state.joblib")
+
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def load_features(
+        self, key: str
+    ) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+        """Memory-map cached arrays and load their state (None if not cached)"""
+        path = self.features_dir / key
+        if not path.is_dir():
+            return None
+
+        arrays = {
+            array_path.stem: np.load(array_path, mmap_mode="r", allow_pickle=False)
+            for array_path in path.glob("*.npy")
+        }
+        state = joblib.load(path / "state.joblib")
+        return arrays, state
+
+    def invalidate(self, key: str) -> None:
+        """Remove the cached frame and every feature matrix derived from it"""
+        self.frame_path(key).unlink(missing_ok=True)
+        for path in self.features_dir.glob(f"{key}_*"):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Shared cache instance used by the API and the trainers
+dataset_cache = DatasetCache()
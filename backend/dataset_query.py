@@ -0,0 +1,235 @@
+"""
+Dataset Query Service
+Serves filtered, sorted and paginated row windows of stored datasets
+"""
+
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+# Number of (dataset version, filters, sort) row orders kept between requests,
+# so paging through a filtered view doesn't re-filter and re-sort every time
+ROW_ORDER_CACHE_SIZE = 32
+
+FILTER_OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "contains", "isnull", "notnull")
+
+
+def parse_filter(expression: str) -> Dict[str, Any]:
+    """
+    Parse a ``column:operator[:value]`` filter expression.
+
+    Example: ``year:gte:2000``, ``genre:contains:drama``, ``budget:isnull``
+    """
+    parts = expression.split(":", 2)
+    if len(parts) < 2 or parts[1] not in FILTER_OPERATORS:
+        raise ValueError(
+            f"Filtro inválido '{expression}'. Formato: columna:operador[:valor] "
+            f"con operador en {', '.join(FILTER_OPERATORS)}"
+        )
+    if parts[1] not in ("isnull", "notnull") and len(parts) < 3:
+        raise ValueError(f"El filtro '{expression}' requiere un valor")
+    return {"column": parts[0], "op": parts[1], "value": parts[2] if len(parts) == 3 else None}
+
+
+def _coerce_value(series: pd.Series, value: str) -> Any:
+    """Convert a filter value from the query string to the column's type"""
+    if pd.api.types.is_bool_dtype(series):
+        return value.lower() in ("1", "true", "yes")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    return value
+
+
+def _filter_mask(df: pd.DataFrame, filters: List[Dict[str, Any]], search: Optional[str]) -> np.ndarray:
+    """Vectorized boolean mask for all filters and the free-text search"""
+    mask = np.ones(len(df), dtype=bool)
+
+    for f in filters:
+        if f["column"] not in df.columns:
+            raise ValueError(f"Columna '{f['column']}' no encontrada")
+        series = df[f["column"]]
+        op = f["op"]
+
+        if op == "isnull":
+            condition = series.isna()
+        elif op == "notnull":
+            condition = series.notna()
+        elif op == "contains":
+            condition = series.astype(str).str.contains(f["value"], case=False, regex=False)
+        else:
+            value = _coerce_value(series, f["value"])
+            if op == "eq":
+                condition = series == value
+            elif op == "ne":
+                condition = series != value
+            elif op == "gt":
+                condition = series > value
+            elif op == "gte":
+                condition = series >= value
+            elif op == "lt":
+                condition = series < value
+            else:
+                condition = series <= value
+
+        mask &= condition.fillna(False).to_numpy(dtype=bool)
+
+    if search:
+        # Free-text search across text columns, as the table viewer does
+        matches = np.zeros(len(df), dtype=bool)
+        for col in df.select_dtypes(include=["object", "category"]).columns:
+            matches |= (
+                df[col].astype(str).str.contains(search, case=False, regex=False).to_numpy()
+            )
+        mask &= matches
+
+    return mask
+
+
+class RowQueryEngine:
+    """Computes row orders for dataset views and caches them per query"""
+
+    def __init__(self, cache_size: int = ROW_ORDER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._orders: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def query_key(
+        dataset_id: str,
+        version: int,
+        filters: List[Dict[str, Any]],
+        search: Optional[str],
+        sort_by: Optional[str],
+        descending: bool,
+    ) -> str:
+        payload = json.dumps(
+            [dataset_id, version, filters, search, sort_by, descending], sort_keys=True
+        )
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    def row_order(
+        self,
+        df: pd.DataFrame,
+        key: str,
+        filters: List[Dict[str, Any]],
+        search: Optional[str],
+        sort_by: Optional[str],
+        descending: bool,
+    ) -> np.ndarray:
+        """Return the positions of matching rows in display order"""
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+
+        positions = np.flatnonzero(_filter_mask(df, filters, search))
+
+        if sort_by:
+            if sort_by not in df.columns:
+                raise ValueError(f"Columna '{sort_by}' no encontrada")
+            subset = df[sort_by].iloc[positions].reset_index(drop=True)
+            ordered = subset.sort_values(
+                ascending=not descending, kind="stable", na_position="last"
+            ).index.to_numpy()
+            positions = positions[ordered]
+
+        with self._lock:
+            self._orders[key] = positions
+            while len(self._orders) > self.cache_size:
+                self._orders.popitem(last=False)
+        return positions
+
+
+def encode_cursor(version: int, position: int, key: str) -> str:
+    """Opaque cursor pointing at a position of one query over one dataset version"""
+    payload = json.dumps({"v": version, "p": position, "q": key}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, json.JSONDecodeError):
+        raise ValueError("Cursor inválido")
+
+
+def rows_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a (small) row window to JSON-safe records, with nulls as None"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def query_rows(
+    df: pd.DataFrame,
+    dataset_id: str,
+    version: int,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[str]] = None,
+    search: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+) -> Dict[str, Any]:
+    """
+    Return one window of a dataset view.
+
+    Pages are addressed either by ``offset`` or by the opaque ``cursor``
+    returned with the previous page; a cursor stays valid for the dataset
+    version and query it was issued for.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    parsed_filters = [parse_filter(expression) for expression in (filters or [])]
+    key = row_query_engine.query_key(
+        dataset_id, version, parsed_filters, search, sort_by, descending
+    )
+
+    if cursor:
+        state = decode_cursor(cursor)
+        if state.get("v") != version or state.get("q") != key:
+            raise ValueError("El cursor no corresponde a esta consulta o versión del dataset")
+        offset = int(state["p"])
+    if offset < 0:
+        raise ValueError("offset no puede ser negativo")
+
+    if columns:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columnas no encontradas: {', '.join(missing)}")
+    else:
+        columns = df.columns.tolist()
+
+    positions = row_query_engine.row_order(
+        df, key, parsed_filters, search, sort_by, descending
+    )
+    window = positions[offset:offset + limit]
+    # Take the window's rows first: projecting with df[columns] would copy every row
+    page = df.iloc[window].iloc[:, df.columns.get_indexer(columns)]
+
+    next_offset = offset + len(window)
+    return {
+        "dataset_id": dataset_id,
+        "version": version,
+        "columns": columns,
+        "rows": rows_to_records(page),
+        # Stable row ids (index labels), used to edit rows of the dataset
+        "row_ids": page.index.tolist(),
+        "offset": offset,
+        "limit": limit,
+        "total_rows": len(df),
+        "matched_rows": len(positions),
+        "next_cursor": encode_cursor(version, next_offset, key) if next_offset < len(positions) else None,
+    }
+
+
+# Shared engine instance used by the API
+row_query_engine = RowQueryEngine()
@@ -0,0 +1,444 @@
+"""
+Dataset Registry
+Keeps versioned datasets on the server so clients can reference them by id
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+# Memory budget for in-memory frames. Least recently used versions beyond it
+# are spilled to disk and transparently reloaded on access.
+DEFAULT_MEMORY_BUDGET_MB = int(os.getenv("DATASET_MEMORY_BUDGET_MB", "1024"))
+
+
+def buffer_key(series: pd.Series) -> Tuple[Any, ...]:
+    """
+    Identity of the memory holding a column's values: address, shape and
+    strides of its array (category codes for categoricals). Two versions
+    whose column has the same key share that column's data.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.cat.codes.to_numpy()
+    else:
+        values = series.array
+        values = getattr(values, "_ndarray", None)
+        if values is None:
+            # Extension arrays without a single backing ndarray: never shared
+            return ("array", id(series.array))
+    interface = values.__array_interface__
+    return (interface["data"][0], values.shape, values.strides, str(values.dtype))
+
+
+def column_buffers(
+    df: pd.DataFrame, known: Optional[Dict[Tuple[Any, ...], int]] = None
+) -> Dict[str, Tuple[Tuple[Any, ...], int]]:
+    """
+    Buffer key and size in bytes of every column of a frame. Sizes of
+    buffers in ``known`` (e.g. the parent's columns) aren't measured again.
+    """
+    known = known or {}
+    keys = {col: buffer_key(df[col]) for col in df.columns}
+    new_columns = [col for col, key in keys.items() if key not in known]
+    sizes = df[new_columns].memory_usage(deep=True, index=False) if new_columns else {}
+    return {
+        col: (key, known[key] if key in known else int(sizes[col]))
+        for col, key in keys.items()
+    }
+
+
+class DatasetRegistry:
+    """
+    Holds DataFrames by dataset id, with one version per cleaning step.
+
+    Versions derived from a shallow copy of their parent share the columns
+    a step didn't replace, and memory is accounted per distinct
+    column buffer, so a step costs only the columns it rewrote. Each
+    dataset has a head version (the one new steps derive from by default);
+    moving it gives undo and branching without copying data.
+
+    Frames are kept in an LRU cache bounded by ``memory_budget_bytes``;
+    evicted versions are pickled under ``datasets_dir`` and reloaded on demand.
+    """
+
+    def __init__(
+        self,
+        memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB,
+        datasets_dir: str = "datasets",
+    ):
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self.datasets_dir = Path(datasets_dir)
+        self.datasets_dir.mkdir(exist_ok=True)
+        self._datasets: Dict[str, Dict[str, Any]] = {}
+        # (dataset_id, version) -> DataFrame, ordered from least to most recently used
+        self._frames: "OrderedDict[Tuple[str, int], pd.DataFrame]" = OrderedDict()
+        self._memory_used = 0
+        # Column buffer key -> [in-memory frames using it, size in bytes]
+        self._buffers: Dict[Tuple[Any, ...], List[int]] = {}
+        self._lock = threading.RLock()
+
+    def register(self, df: pd.DataFrame, name: Optional[str] = None) -> str:
+        """Store a DataFrame as version 1 of a new dataset and return its id"""
+        dataset_id = uuid.uuid4().hex
+        with self._lock:
+            self._datasets[dataset_id] = {
+                "name": name,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "versions": [],
+                "head": None,
+            }
+            self._add_version(dataset_id, df, operation="load", parent=None)
+        return dataset_id
+
+    def add_version(
+        self,
+        dataset_id: str,
+        df: pd.DataFrame,
+        operation: str,
+        parent: Optional[int] = None,
+        changes: Optional[Dict[str, List[Any]]] = None,
+    ) -> int:
+        """
+        Store ``df`` as a new version of an existing dataset and return its number.
+
+        ``changes`` is the row-level change set relative to the parent, as
+        lists of index labels under ``"appended"``, ``"updated"`` and
+        ``"removed"``; None means unknown (every row may have changed).
+        """
+        with self._lock:
+            entry = self._entry(dataset_id)
+            if parent is None:
+                parent = entry["head"]
+            return self._add_version(dataset_id, df, operation, parent, changes)
+
+    def append_rows(self, dataset_id: str, rows: pd.DataFrame) -> int:
+        """Append rows to the latest version as a new version; new rows get fresh labels"""
+        with self._lock:
+            parent = self.latest_version(dataset_id)
+            df = self.get(dataset_id, parent)
+            start = int(df.index.max()) + 1 if len(df) else 0
+            rows = rows.reindex(columns=df.columns)
+            rows.index = pd.RangeIndex(start, start + len(rows))
+            combined = pd.concat([df, rows])
+            return self._add_version(
+                dataset_id,
+                combined,
+                "append",
+                parent,
+                {"appended": rows.index.tolist(), "updated": [], "removed": []},
+            )
+
+    def update_rows(self, dataset_id: str, updates: Dict[Any, Dict[str, Any]]) -> int:
+        """Edit cells of the latest version (``{row label: {column: value}}``) as a new version"""
+        with self._lock:
+            parent = self.latest_version(dataset_id)
+            df = self.get(dataset_id, parent)
+            missing = [label for label in updates if label not in df.index]
+            if missing:
+                raise KeyError(f"Filas no encontradas: {', '.join(map(str, missing))}")
+            unknown = {col for values in updates.values() for col in values} - set(df.columns)
+            if unknown:
+                raise ValueError(f"Columnas no encontradas: {', '.join(sorted(map(str, unknown)))}")
+
+            # Shallow copy: only the edited columns are copied, the rest stay
+            # shared with the parent version
+            df = df.copy(deep=False)
+            for col in {col for values in updates.values() for col in values}:
+                df[col] = df[col].copy()
+            for label, values in updates.items():
+                for col, value in values.items():
+                    series = df[col]
+                    if (
+                        isinstance(series.dtype, pd.CategoricalDtype)
+                        and value is not None
+                        and value not in series.cat.categories
+                    ):
+                        df[col] = series.cat.add_categories([value])
+                    df.at[label, col] = value
+            return self._add_version(
+                dataset_id,
+                df,
+                "update",
+                parent,
+                {"appended": [], "updated": list(updates), "removed": []},
+            )
+
+    def changes_since(
+        self, dataset_id: str, base_version: int, version: int
+    ) -> Optional[Dict[str, pd.Index]]:
+        """
+        Rows that changed between ``base_version`` and its descendant ``version``.
+
+        Returns:
+            Dict with ``dirty`` (appended or updated labels still present),
+            ``updated`` and ``removed`` labels, or None when the change set is unknown
+            (a version without one, or ``version`` doesn't descend from
+            ``base_version``)
+        """
+        with self._lock:
+            dirty: List[Any] = []
+            updated: List[Any] = []
+            removed: List[Any] = []
+            current = version
+            while current != base_version:
+                meta = self._version_meta(dataset_id, current)
+                if meta.get("changes") is None or meta["parent"] is None:
+                    return None
+                dirty.extend(meta["changes"]["appended"])
+                dirty.extend(meta["changes"]["updated"])
+                updated.extend(meta["changes"]["updated"])
+                removed.extend(meta["changes"]["removed"])
+                current = meta["parent"]
+
+            removed_index = pd.Index(removed).unique()
+            dirty_index = pd.Index(dirty).unique().difference(removed_index, sort=False)
+            return {
+                "dirty": dirty_index,
+                "updated": pd.Index(updated).unique(),
+                "removed": removed_index,
+            }
+
+    def get(self, dataset_id: str, version: Optional[int] = None) -> pd.DataFrame:
+        """
+        Return a stored DataFrame (latest version when ``version`` is None).
+
+        The frame is shared with the registry; callers must copy it before
+        modifying it in place.
+        """
+        with self._lock:
+            meta = self._version_meta(dataset_id, version)
+            key = (dataset_id, meta["version"])
+
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+
+            # Version was spilled to disk: load it back into the cache
+            df = pd.read_pickle(meta["path"])
+            self._cache(key, df, meta)
+            return df
+
+    def latest_version(self, dataset_id: str) -> int:
+        """Return the head version of a dataset (the newest unless moved by checkout/undo)"""
+        with self._lock:
+            return self._entry(dataset_id)["head"]
+
+    def checkout(self, dataset_id: str, version: int) -> int:
+        """
+        Move the head to ``version``. New steps derive from it, so checking
+        out an older version and cleaning again starts a branch.
+        """
+        with self._lock:
+            self._entry(dataset_id)["head"] = self._version_meta(dataset_id, version)["version"]
+            return version
+
+    def undo(self, dataset_id: str) -> int:
+        """Move the head back to its parent version and return the new head"""
+        with self._lock:
+            meta = self._version_meta(dataset_id, None)
+            if meta["parent"] is None:
+                raise ValueError("No hay pasos para deshacer")
+            return self.checkout(dataset_id, meta["parent"])
+
+    def compare(self, dataset_id: str, base: int, target: int) -> Dict[str, Any]:
+        """
+        Differences between two versions: columns added, removed and changed
+        (with the number of differing cells over the rows both share) and
+        rows added or removed. Columns sharing their buffer are reported as
+        unchanged without reading their values.
+        """
+        with self._lock:
+            base_df = self.get(dataset_id, base)
+            target_df = self.get(dataset_id, target)
+
+        common_rows = base_df.index.intersection(target_df.index, sort=False)
+        same_index = base_df.index.equals(target_df.index)
+        shared, changed = [], {}
+        for col in target_df.columns:
+            if col not in base_df.columns:
+                continue
+            if same_index and buffer_key(base_df[col]) == buffer_key(target_df[col]):
+                shared.append(col)
+                continue
+            before = base_df[col] if same_index else base_df[col].loc[common_rows]
+            after = target_df[col] if same_index else target_df[col].loc[common_rows]
+            differs = (before.astype(object) != after.astype(object)) & ~(before.isna() & after.isna())
+            n_differs = int(differs.sum())
+            if n_differs or before.dtype != after.dtype:
+                changed[col] = {
+                    "cells": n_differs,
+                    "dtype_before": str(before.dtype),
+                    "dtype_after": str(after.dtype),
+                }
+
+        return {
+            "dataset_id": dataset_id,
+            "base": base,
+            "target": target,
+            "rows_base": len(base_df),
+            "rows_target": len(target_df),
+            "rows_added": len(target_df.index.difference(base_df.index)),
+            "rows_removed": len(base_df.index.difference(target_df.index)),
+            "columns_added": [col for col in target_df.columns if col not in base_df.columns],
+            "columns_removed": [col for col in base_df.columns if col not in target_df.columns],
+            "columns_changed": changed,
+            "columns_shared": shared,
+        }
+
+    def info(self, dataset_id: str, version: Optional[int] = None) -> Dict[str, Any]:
+        """Return metadata (name, shape, dtypes, versions) for a stored dataset"""
+        with self._lock:
+            df = self.get(dataset_id, version)
+            entry = self._entry(dataset_id)
+            meta = self._version_meta(dataset_id, version)
+            return {
+                "dataset_id": dataset_id,
+                "name": entry["name"],
+                "created_at": entry["created_at"],
+                "version": meta["version"],
+                "head": entry["head"],
+                "rows": len(df),
+                "columns": df.columns.tolist(),
+                "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+                "memory_bytes": meta["nbytes"],
+                "versions": self.list_versions(dataset_id),
+            }
+
+    def list_versions(self, dataset_id: str) -> List[Dict[str, Any]]:
+        """Return the version history of a dataset"""
+        with self._lock:
+            return [
+                {
+                    "version": meta["version"],
+                    "parent": meta["parent"],
+                    "operation": meta["operation"],
+                    "created_at": meta["created_at"],
+                    "rows": meta["rows"],
+                    # Bytes of columns not shared with the parent version
+                    "own_bytes": meta["own_bytes"],
+                    "changes": None
+                    if meta.get("changes") is None
+                    else {kind: len(labels) for kind, labels in meta["changes"].items()},
+                    "in_memory": (dataset_id, meta["version"]) in self._frames,
+                }
+                for meta in self._entry(dataset_id)["versions"]
+            ]
+
+    def remove(self, dataset_id: str) -> None:
+        """Drop a dataset, its cached frames and its spill files"""
+        with self._lock:
+            entry = self._datasets.pop(dataset_id, None)
+            if entry is None:
+                return
+            for meta in entry["versions"]:
+                key = (dataset_id, meta["version"])
+                if key in self._frames:
+                    self._release(meta)
+                    del self._frames[key]
+                if meta["path"] is not None:
+                    Path(meta["path"]).unlink(missing_ok=True)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Return current memory usage of the in-memory cache"""
+        with self._lock:
+            return {
+                "memory_used_bytes": self._memory_used,
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "frames_in_memory": len(self._frames),
+                "datasets": len(self._datasets),
+            }
+
+    def _entry(self, dataset_id: str) -> Dict[str, Any]:
+        if dataset_id not in self._datasets:
+            raise KeyError(f"Dataset '{dataset_id}' no encontrado")
+        return self._datasets[dataset_id]
+
+    def _version_meta(self, dataset_id: str, version: Optional[int]) -> Dict[str, Any]:
+        entry = self._entry(dataset_id)
+        versions = entry["versions"]
+        if version is None:
+            version = entry["head"]
+        for meta in versions:
+            if meta["version"] == version:
+                return meta
+        raise KeyError(f"Versión {version} del dataset '{dataset_id}' no encontrada")
+
+    def _add_version(
+        self,
+        dataset_id: str,
+        df: pd.DataFrame,
+        operation: str,
+        parent: Optional[int],
+        changes: Optional[Dict[str, List[Any]]] = None,
+    ) -> int:
+        entry = self._datasets[dataset_id]
+        versions = entry["versions"]
+        version = versions[-1]["version"] + 1 if versions else 1
+        parent_buffers = (
+            dict(self._version_meta(dataset_id, parent)["buffers"].values())
+            if parent is not None
+            else {}
+        )
+        buffers = column_buffers(df, known=parent_buffers)
+        meta = {
+            "version": version,
+            "parent": parent,
+            "operation": operation,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "rows": len(df),
+            "nbytes": sum(size for _, size in buffers.values())
+            + int(df.index.memory_usage(deep=True)),
+            "own_bytes": sum(size for key, size in buffers.values() if key not in parent_buffers),
+            "buffers": buffers,
+            "changes": changes,
+            "path": None,
+        }
+        versions.append(meta)
+        entry["head"] = version
+        self._cache((dataset_id, version), df, meta)
+        return version
+
+    def _cache(self, key: Tuple[str, int], df: pd.DataFrame, meta: Dict[str, Any]) -> None:
+        if meta["path"] is not None:
+            # Reloaded from disk: the columns are new buffers
+            meta["buffers"] = column_buffers(df)
+        self._frames[key] = df
+        for buffer, size in meta["buffers"].values():
+            users = self._buffers.setdefault(buffer, [0, size])
+            if users[0] == 0:
+                self._memory_used += size
+            users[0] += 1
+        self._evict(keep=key)
+
+    def _release(self, meta: Dict[str, Any]) -> None:
+        """Account for a frame leaving memory; shared buffers stay counted while in use"""
+        for buffer, size in meta["buffers"].values():
+            users = self._buffers[buffer]
+            users[0] -= 1
+            if users[0] == 0:
+                del self._buffers[buffer]
+                self._memory_used -= size
+
+    def _evict(self, keep: Tuple[str, int]) -> None:
+        """Spill least recently used frames to disk until under the memory budget"""
+        while self._memory_used > self.memory_budget_bytes and len(self._frames) > 1:
+            key = next(iter(self._frames))
+            if key == keep:
+                break
+            df = self._frames.pop(key)
+            meta = self._version_meta(*key)
+            if meta["path"] is None:
+                path = self.datasets_dir / f"{key[0]}_v{key[1]}.pkl"
+                df.to_pickle(path)
+                meta["path"] = str(path)
+            self._release(meta)
+
+
+# Shared registry instance used by the API
+dataset_registry = DatasetRegistry()
@@ -0,0 +1,407 @@
+"""
+Duplicate Detection Engine
+Row fingerprints hashed once, with an out-of-core partitioned mode
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from profiling import HyperLogLog, hash_values
+
+# Second hash key for 128-bit fingerprints (pandas' default key is the first)
+SECOND_HASH_KEY = "9f2c1e8a7b6d5c4e"
+
+# Partitions used by the out-of-core mode; each is deduplicated on its own
+DEFAULT_PARTITIONS = 64
+
+# Column names that mark an ID by convention (besides the ``_id`` suffix)
+ID_NAMES = ("id", "_id", "index", "row_id", "pk")
+
+# Leading rows checked for repeats before any full-column work
+UNIQUENESS_SAMPLE_ROWS = 10_000
+
+# Values sampled to decide whether an unnamed text column looks like a key
+KEY_SAMPLE_ROWS = 1_000
+
+PARTITION_RECORD = np.dtype([("hash", "<u8"), ("hash2", "<u8"), ("row", "<i8")])
+
+
+def _integers_unique(values: np.ndarray) -> bool:
+    """Exact uniqueness of an integer array without a hash table"""
+    if np.all(values[1:] > values[:-1]) or np.all(values[1:] < values[:-1]):
+        return True
+    low, high = int(values.min()), int(values.max())
+    span = high - low + 1
+    if span < len(values):
+        # More rows than possible distinct values
+        return False
+    if span <= 8 * len(values):
+        return int(np.bincount(values - low).max()) <= 1
+    ordered = np.sort(values)
+    return not np.any(ordered[1:] == ordered[:-1])
+
+
+def is_unique_column(series: pd.Series) -> bool:
+    """
+    Whether every value of ``series`` is distinct and non-null, with cheap
+    checks first: nulls, categories, a sample of the leading rows, monotonic
+    or range checks for integers, and a HyperLogLog estimate before the exact
+    check for everything else.
+    """
+    n_rows = len(series)
+    if n_rows <= 1:
+        return bool(series.notna().all())
+    if series.hasnans:
+        return False
+    if isinstance(series.dtype, pd.CategoricalDtype) and len(series.cat.categories) < n_rows:
+        return False
+    if series.iloc[:UNIQUENESS_SAMPLE_ROWS].duplicated().any():
+        return False
+    if pd.api.types.is_integer_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        return _integers_unique(series.to_numpy())
+
+    hashes = hash_values(series)
+    sketch = HyperLogLog()
+    sketch.update(hashes)
+    # Clearly fewer distinct values than rows (beyond 4 standard errors)
+    error = 1.04 / np.sqrt(len(sketch.registers))
+    if sketch.estimate() < n_rows * (1 - 4 * error):
+        return False
+    ordered = np.sort(hashes)
+    if not np.any(ordered[1:] == ordered[:-1]):
+        return True
+    # Equal hashes: a real repeat or a (rare) collision
+    return series.is_unique
+
+
+def _looks_like_key(series: pd.Series) -> bool:
+    """
+    Whether a column without an ID-like name has the shape of a key:
+    integers in strictly monotonic order or forming a dense range, or text
+    codes without spaces and of a single length (UUIDs, hashes, codes).
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return False
+    if pd.api.types.is_integer_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.to_numpy()
+        if len(values) < 2:
+            return False
+        if np.all(values[1:] > values[:-1]) or np.all(values[1:] < values[:-1]):
+            return True
+        return int(values.max()) - int(values.min()) + 1 == len(values)
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        sample = series.iloc[:KEY_SAMPLE_ROWS].dropna()
+        if sample.empty or not sample.map(lambda value: isinstance(value, str)).all():
+            return False
+        lengths = sample.str.len()
+        return lengths.min() == lengths.max() and not sample.str.contains(r"\s").any()
+    return False
+
+
+def detect_id_columns(df: pd.DataFrame, detect_keys: bool = False) -> List[str]:
+    """
+    Columns that identify rows and should be ignored when comparing them.
+
+    Only columns named like IDs count, and only when their values are
+    unique. With ``detect_keys`` other unique columns with the shape of a
+    key (see ``_looks_like_key``) count too; that's opt-in because dates,
+    years or quantities can have that shape, and ignoring them would merge
+    rows that differ in them.
+    """
+    id_columns = []
+    for col in df.columns:
+        col_lower = str(col).lower()
+        named = col_lower in ID_NAMES or col_lower.endswith("_id")
+        if not named and not (detect_keys and _looks_like_key(df[col])):
+            continue
+        if is_unique_column(df[col]):
+            id_columns.append(col)
+    return id_columns
+
+
+def row_fingerprints(
+    df: pd.DataFrame,
+    columns: List[str],
+    key_codes: Optional[Dict[str, np.ndarray]] = None,
+    bits: int = 64,
+) -> np.ndarray:
+    """
+    Hash every row of ``df[columns]`` into a 64-bit (shape ``(n,)``) or
+    128-bit (shape ``(n, 2)``) fingerprint in one vectorized pass.
+
+    Columns present in ``key_codes`` are hashed through their integer codes.
+    Equal rows always get equal fingerprints (``-0.0`` is hashed as ``0.0``),
+    but equal fingerprints don't prove equal rows: object columns are hashed
+    through their string form, so ``1`` and ``"1"`` collide. Callers confirm
+    candidate groups with ``exact_duplicates``.
+    """
+    frame = pd.DataFrame(
+        {
+            position: key_codes[col] if key_codes and col in key_codes else df[col].array
+            for position, col in enumerate(columns)
+        },
+        index=df.index,
+    )
+    for position in frame.columns:
+        if pd.api.types.is_float_dtype(frame[position]):
+            frame[position] = frame[position] + 0.0
+
+    first = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    if bits == 64:
+        return first
+    if bits != 128:
+        raise ValueError("bits debe ser 64 o 128")
+    second = pd.util.hash_pandas_object(frame, index=False, hash_key=SECOND_HASH_KEY).to_numpy()
+    return np.column_stack([first, second])
+
+
+def exact_duplicates(frame: pd.DataFrame, groups: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Confirm fingerprint matches by comparing values, with the semantics of
+    ``DataFrame.duplicated``. ``groups`` holds the fingerprint group of each
+    row of ``frame``; only rows with the same group and equal values match.
+
+    Returns:
+        Tuple of (repeats of an earlier row, rows in a group of two or more)
+    """
+    keyed = frame.reset_index(drop=True)
+    keyed.columns = range(1, keyed.shape[1] + 1)
+    keyed.insert(0, 0, groups)
+    return keyed.duplicated(keep="first").to_numpy(), keyed.duplicated(keep=False).to_numpy()
+
+
+def _group_codes(fingerprints: np.ndarray) -> np.ndarray:
+    """Group id per row, numbered in order of first appearance"""
+    if fingerprints.ndim == 1:
+        codes, _ = pd.factorize(fingerprints)
+        return codes
+
+    # 128-bit: view both words as one opaque 16-byte key
+    keys = np.ascontiguousarray(fingerprints).view(np.dtype((np.void, 16))).ravel()
+    _, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    # Renumber groups by first appearance, as factorize does
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()]
+
+
+def find_duplicates(
+    df: pd.DataFrame,
+    columns: List[str],
+    key_codes: Optional[Dict[str, np.ndarray]] = None,
+    bits: int = 64,
+) -> Dict[str, Any]:
+    """
+    Find duplicate rows with a single hash pass.
+
+    Returns:
+        Dict with ``keep_mask`` (keep-first), the row ``fingerprints``,
+        ``duplicate_rows`` (rows in a group of two or more, i.e.
+        ``keep=False``), ``duplicates_to_remove`` and ``groups``
+    """
+    n_rows = len(df)
+    if n_rows == 0:
+        return {
+            "keep_mask": np.ones(0, dtype=bool),
+            "fingerprints": np.empty(0, dtype=np.uint64),
+            "duplicate_rows": 0,
+            "duplicates_to_remove": 0,
+            "groups": 0,
+        }
+
+    fingerprints = row_fingerprints(df, columns, key_codes, bits)
+    codes = _group_codes(fingerprints)
+    counts = np.bincount(codes)
+
+    # Only rows sharing a fingerprint can be duplicates: compare their values
+    candidates = np.flatnonzero(counts[codes] > 1)
+    repeats, members = exact_duplicates(df.iloc[candidates][columns], codes[candidates])
+    keep_mask = np.ones(n_rows, dtype=bool)
+    keep_mask[candidates[repeats]] = False
+    duplicates_to_remove = int(repeats.sum())
+
+    return {
+        "keep_mask": keep_mask,
+        "fingerprints": fingerprints,
+        "duplicate_rows": int(members.sum()),
+        "duplicates_to_remove": duplicates_to_remove,
+        "groups": n_rows - duplicates_to_remove,
+    }
+
+
+class PartitionedDuplicateFinder:
+    """
+    Out-of-core duplicate detection for data that doesn't fit in memory.
+
+    Chunks are fingerprinted as they arrive and ``(hash, row)`` records are
+    appended to one spill file per hash partition. Each partition is then
+    deduplicated on its own, so only one partition is in memory at a time.
+    Rows are numbered globally in arrival order, so "first" matches the
+    in-memory keep-first semantics.
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        n_partitions: int = DEFAULT_PARTITIONS,
+        spill_dir: Optional[str] = None,
+        bits: int = 64,
+    ):
+        self.columns = columns
+        self.n_partitions = n_partitions
+        self.bits = bits
+        self.rows_seen = 0
+        self._owns_dir = spill_dir is None
+        self.spill_dir = Path(spill_dir or tempfile.mkdtemp(prefix="dedup_"))
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def _partition_path(self, partition: int) -> Path:
+        return self.spill_dir / f"partition_{partition:04d}.bin"
+
+    def add_chunk(
+        self, chunk: pd.DataFrame, key_codes: Optional[Dict[str, np.ndarray]] = None
+    ) -> None:
+        """Fingerprint a chunk and spill its records to the hash partitions"""
+        fingerprints = row_fingerprints(chunk, self.columns, key_codes, self.bits)
+        records = np.empty(len(chunk), dtype=PARTITION_RECORD)
+        if fingerprints.ndim == 1:
+            records["hash"] = fingerprints
+            records["hash2"] = 0
+        else:
+            records["hash"] = fingerprints[:, 0]
+            records["hash2"] = fingerprints[:, 1]
+        records["row"] = np.arange(self.rows_seen, self.rows_seen + len(chunk))
+        self.rows_seen += len(chunk)
+
+        partitions = (records["hash"] % np.uint64(self.n_partitions)).astype(np.int64)
+        order = np.argsort(partitions, kind="stable")
+        records, partitions = records[order], partitions[order]
+        bounds = np.searchsorted(partitions, np.arange(self.n_partitions + 1))
+        for partition in range(self.n_partitions):
+            start, end = bounds[partition], bounds[partition + 1]
+            if start < end:
+                with open(self._partition_path(partition), "ab") as handle:
+                    records[start:end].tofile(handle)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Deduplicate partition by partition.
+
+        Returns:
+            Dict with ``drop_rows`` (sorted global row numbers to remove,
+            keeping the first of each group), the same counts as
+            ``find_duplicates`` and ``candidate_rows``/``candidate_groups``
+            (rows sharing a fingerprint, and its group) for a check of the
+            values (fingerprints alone can collide, see ``row_fingerprints``)
+        """
+        drop_rows = []
+        candidate_rows = []
+        candidate_groups = []
+        duplicate_rows = 0
+        groups = 0
+        for partition in range(self.n_partitions):
+            path = self._partition_path(partition)
+            if not path.exists():
+                continue
+            records = np.fromfile(path, dtype=PARTITION_RECORD)
+            # Sort by key then row: the first record of each key run is kept
+            records.sort(order=["hash", "hash2", "row"])
+            new_key = np.ones(len(records), dtype=bool)
+            new_key[1:] = (records["hash"][1:] != records["hash"][:-1]) | (
+                records["hash2"][1:] != records["hash2"][:-1]
+            )
+            run_ids = np.cumsum(new_key) - 1
+            counts = np.bincount(run_ids)
+            shared = counts[run_ids] > 1
+            candidate_rows.append(records["row"][shared])
+            candidate_groups.append(groups + run_ids[shared])
+            groups += len(counts)
+            duplicate_rows += int(counts[counts > 1].sum())
+            drop_rows.append(records["row"][~new_key])
+
+        empty = np.empty(0, dtype=np.int64)
+        drop = np.sort(np.concatenate(drop_rows)) if drop_rows else empty
+        return {
+            "drop_rows": drop,
+            "candidate_rows": np.concatenate(candidate_rows) if candidate_rows else empty,
+            "candidate_groups": np.concatenate(candidate_groups) if candidate_groups else empty,
+            "duplicate_rows": duplicate_rows,
+            "duplicates_to_remove": int(len(drop)),
+            "groups": groups,
+        }
+
+    def cleanup(self) -> None:
+        """Delete the spill files"""
+        if self._owns_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+        else:
+            for partition in range(self.n_partitions):
+                self._partition_path(partition).unlink(missing_ok=True)
+
+
+def chunk_keep_mask(drop_rows: np.ndarray, start: int, length: int) -> np.ndarray:
+    """Keep-first mask for the chunk of rows ``[start, start + length)``"""
+    mask = np.ones(length, dtype=bool)
+    lo, hi = np.searchsorted(drop_rows, [start, start + length])
+    mask[drop_rows[lo:hi] - start] = False
+    return mask
+
+
+def find_duplicates_in_chunks(
+    chunks: Callable[[], Iterable[pd.DataFrame]],
+    columns: List[str],
+    n_partitions: int = DEFAULT_PARTITIONS,
+    bits: int = 64,
+    spill_dir: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Partitioned duplicate detection over a source read in chunks (e.g. a
+    CSV file on disk), for data that doesn't fit in memory.
+
+    ``chunks`` returns a fresh iterator over the consecutive row blocks on
+    every call. The first pass fingerprints and spills them; the second
+    keeps only the rows sharing a fingerprint to compare their values, so
+    one chunk, one partition and those candidate rows are in memory at a
+    time. Every chunk must read ``columns`` with the same dtypes.
+
+    Returns:
+        Dict with ``drop_rows`` (sorted row numbers to remove, keeping the
+        first of each group), ``rows`` and the counts of ``find_duplicates``
+    """
+    finder = PartitionedDuplicateFinder(columns, n_partitions=n_partitions, spill_dir=spill_dir, bits=bits)
+    try:
+        for chunk in chunks():
+            finder.add_chunk(chunk)
+        result = finder.finish()
+    finally:
+        finder.cleanup()
+
+    # Second pass: gather the rows sharing a fingerprint, in row order
+    rows = result.pop("candidate_rows")
+    groups = result.pop("candidate_groups")
+    order = np.argsort(rows, kind="stable")
+    rows, groups = rows[order], groups[order]
+    candidates = []
+    start = 0
+    for chunk in chunks():
+        lo, hi = np.searchsorted(rows, [start, start + len(chunk)])
+        if hi > lo:
+            candidates.append(chunk.iloc[rows[lo:hi] - start][columns])
+        start += len(chunk)
+
+    if candidates:
+        repeats, members = exact_duplicates(pd.concat(candidates), groups)
+    else:
+        repeats = members = np.zeros(0, dtype=bool)
+    return {
+        "drop_rows": rows[repeats],
+        "rows": finder.rows_seen,
+        "duplicate_rows": int(members.sum()),
+        "duplicates_to_remove": int(repeats.sum()),
+        "groups": finder.rows_seen - int(repeats.sum()),
+    }
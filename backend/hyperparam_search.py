@@ -0,0 +1,431 @@
+"""
+Hyperparameter Search
+Budgeted searches over continuous hyperparameter ranges: successive
+halving, Hyperband and a TPE-style Bayesian search
+"""
+
+import math
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.stats import loguniform, randint, rv_discrete, uniform
+from sklearn.base import clone, is_classifier
+from sklearn.model_selection import check_cv
+from threadpoolctl import threadpool_limits
+
+SEARCH_METHODS = ("halving", "hyperband", "bayesian")
+
+# Seconds a search may run before it settles for the best candidate so far
+TIME_BUDGET = float(os.getenv("HYPERPARAM_TIME_BUDGET", "300"))
+
+# Candidates are scored on at most this many training rows (the final fit uses all)
+MAX_SEARCH_SAMPLES = int(os.getenv("HYPERPARAM_MAX_SAMPLES", "100000"))
+
+CV_FOLDS = 3
+
+# Halving keeps 1/ETA of the candidates per round and gives them ETA times the resource
+ETA = 3
+
+# At most ETA**MAX_ROUNDS candidates start a halving run
+MAX_ROUNDS = 4
+
+# Ranges searched per model type: scipy distributions, or lists of choices.
+# SVC stops at C=100: past it libsvm takes many times longer to converge
+SEARCH_SPACES = {
+    "logistic": {"C": loguniform(1e-3, 1e2)},
+    "rf": {
+        "n_estimators": randint(50, 501),
+        "max_depth": randint(3, 51),
+        "min_samples_split": randint(2, 21),
+        "min_samples_leaf": randint(1, 11),
+        "max_features": uniform(0.1, 0.9),
+    },
+    "gb": {
+        "n_estimators": randint(50, 501),
+        "learning_rate": loguniform(0.01, 0.3),
+        "max_depth": randint(2, 9),
+        "subsample": uniform(0.5, 0.5),
+    },
+    "svm": {
+        "C": loguniform(1e-2, 1e2),
+        "gamma": loguniform(1e-4, 1e0),
+        "kernel": ["rbf", "linear"],
+    },
+    "knn": {
+        "n_neighbors": randint(1, 51),
+        "weights": ["uniform", "distance"],
+        "p": [1, 2],
+    },
+}
+
+# Halving/Hyperband grow the number of trees of ensembles, and the training rows of the rest
+ESTIMATOR_RESOURCES = {"rf": ("n_estimators", 20, 500), "gb": ("n_estimators", 20, 500)}
+
+# Lower row caps for models whose fit time grows faster than the rows (kernel SVC)
+MODEL_MAX_SAMPLES = {"svm": 20000}
+
+# Bayesian search: random trials before the model kicks in, total trials,
+# share of trials taken as "good", and candidates compared per suggestion
+BAYES_STARTUP = 10
+BAYES_ITERATIONS = 40
+BAYES_GAMMA = 0.25
+BAYES_CANDIDATES = 24
+
+
+def _is_discrete(dist) -> bool:
+    return isinstance(dist.dist, rv_discrete)
+
+
+def _bounds(dist):
+    """Search interval of a distribution (in log space for log-uniform ones)"""
+    low, high = dist.support()
+    if dist.dist.name == "loguniform":
+        return math.log(low), math.log(high), True
+    return float(low), float(high), False
+
+
+def _from_unit(dist, value: float):
+    """Inverse of ``_bounds``' transform, rounded for integer ranges"""
+    low, high, log = _bounds(dist)
+    value = min(max(value, low), high)
+    if log:
+        value = math.exp(value)
+    return int(round(value)) if _is_discrete(dist) else float(value)
+
+
+def _to_unit(dist, value) -> float:
+    return math.log(value) if _bounds(dist)[2] else float(value)
+
+
+def sample_params(space: Dict[str, Any], rng: np.random.Generator) -> Dict[str, Any]:
+    """Random candidate from ``space``"""
+    params = {}
+    for name, dist in space.items():
+        if isinstance(dist, list):
+            params[name] = dist[rng.integers(len(dist))]
+        else:
+            value = dist.rvs(random_state=rng)
+            params[name] = int(value) if _is_discrete(dist) else float(value)
+    return params
+
+
+def _with_threads(estimator, threads: int):
+    """Copy of ``estimator`` whose own parallelism (``n_jobs``) is ``threads``"""
+    if "n_jobs" in estimator.get_params():
+        return clone(estimator).set_params(n_jobs=threads)
+    return estimator
+
+
+def _evaluate(
+    estimator, params, X, y, splits, deadline: float, threads: int
+) -> Optional[Tuple[float, float]]:
+    """
+    Mean validation score of one candidate and its slowest fit in seconds
+    (runs in a joblib worker); None if the deadline passes before a fold.
+    """
+    scores, fit_seconds = [], 0.0
+    with threadpool_limits(limits=threads):
+        for train_idx, test_idx in splits:
+            if time.time() > deadline:
+                return None
+            started = time.perf_counter()
+            try:
+                model = clone(estimator).set_params(**params).fit(X[train_idx], y[train_idx])
+            except ValueError:
+                # Invalid combination for this data (e.g. more neighbors than rows)
+                return -np.inf, fit_seconds
+            fit_seconds = max(fit_seconds, time.perf_counter() - started)
+            scores.append(model.score(X[test_idx], y[test_idx]))
+    return float(np.mean(scores)), fit_seconds
+
+
+class HyperparameterSearch:
+    """
+    Searches ``space`` for the parameters of ``estimator`` with the best
+    cross-validated ``score`` within ``time_budget`` seconds.
+
+    - ``halving``: many random candidates on a small resource (training
+      rows, or trees for ensembles); each round keeps the best third and
+      triples the resource, so weak candidates are dropped early
+    - ``hyperband``: several halving runs trading number of candidates
+      against starting resource
+    - ``bayesian``: TPE-style search that proposes candidates likely under
+      the best trials and unlikely under the rest; a trial stops after a
+      fold whose running score is below the median of earlier trials
+
+    Candidates are scored on at most ``max_samples`` rows. The fit times
+    measured so far (seconds per training row, times trees for ensembles)
+    give the cost of the next round, fold or trial, which doesn't start if
+    it would end past the budget. The same estimate for ``final_fits`` fits
+    on every row (the final model and its cross-validation) is kept out of
+    the budget. When the budget runs out the best candidate evaluated so
+    far wins. ``n_jobs`` cores (-1: all) are split between candidates
+    scored in parallel and the threads each of them may use.
+    """
+
+    def __init__(
+        self,
+        estimator,
+        space: Dict[str, Any],
+        resource: str = "n_samples",
+        min_resource: Optional[int] = None,
+        max_resource: Optional[int] = None,
+        time_budget: float = TIME_BUDGET,
+        max_samples: int = MAX_SEARCH_SAMPLES,
+        cv: int = CV_FOLDS,
+        eta: int = ETA,
+        n_jobs: int = -1,
+        random_state: int = 42,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        final_fits: int = 0,
+    ):
+        self.estimator = estimator
+        self.space = space
+        self.resource = resource
+        self.min_resource = min_resource
+        self.max_resource = max_resource
+        self.time_budget = time_budget
+        self.max_samples = max_samples
+        self.cv = cv
+        self.eta = eta
+        self.n_jobs = n_jobs if n_jobs > 0 else os.cpu_count() or 1
+        self.random_state = random_state
+        self.report = progress_callback or (lambda info: None)
+        self.final_fits = final_fits
+        self.history_: List[Dict[str, Any]] = []
+        self.best_params_: Optional[Dict[str, Any]] = None
+        self.best_score_: Optional[float] = None
+
+    def fit(self, X, y, method: str = "halving") -> "HyperparameterSearch":
+        if method not in SEARCH_METHODS:
+            raise ValueError(f"Método de búsqueda desconocido: {method}")
+
+        self._rng = np.random.default_rng(self.random_state)
+        self._deadline = time.time() + self.time_budget
+        X, y = np.asarray(X), np.asarray(y)
+        # Seconds per unit of work (training row, times trees), 0 until measured
+        self._unit_cost = 0.0
+        trees = self.max_resource if self.resource != "n_samples" and method != "bayesian" else 1
+        self._final_units = self.final_fits * len(y) * (trees or 1)
+        if len(y) > self.max_samples:
+            rows = np.sort(self._rng.choice(len(y), self.max_samples, replace=False))
+            X, y = X[rows], y[rows]
+        self._X, self._y = X, y
+        self._order = self._rng.permutation(len(y))
+        self.history_ = []
+
+        if method == "bayesian":
+            self._bayesian()
+        else:
+            low, high = self._resource_range()
+            rounds = min(MAX_ROUNDS, int(math.log(high / low, self.eta))) if high > low else 0
+            if method == "halving":
+                self._successive_halving(self.eta**rounds, high / self.eta**rounds)
+            else:
+                for s in range(rounds, -1, -1):
+                    if time.time() > self._deadline:
+                        break
+                    n = math.ceil((rounds + 1) / (s + 1) * self.eta**s)
+                    self._successive_halving(n, high / self.eta**s)
+
+        # Scores on more data (or trees) are the ones to trust
+        finished = [trial for trial in self.history_ if not trial["pruned"]]
+        if finished:
+            best = max(finished, key=lambda trial: (trial["resource"], trial["score"]))
+            self.best_params_, self.best_score_ = best["params"], best["score"]
+        return self
+
+    @property
+    def best_estimator_(self):
+        """Unfitted copy of the estimator with the best parameters (the original if none finished)"""
+        if self.best_params_ is None:
+            return self.estimator
+        return clone(self.estimator).set_params(**self.best_params_)
+
+    def _resource_range(self):
+        if self.resource == "n_samples":
+            classes = len(np.unique(self._y)) if is_classifier(self.estimator) else 1
+            low = self.min_resource or max(2 * self.cv * classes, 100)
+            high = self.max_resource or len(self._y)
+        else:
+            low, high = self.min_resource, self.max_resource
+        return min(low, high), high
+
+    def _record(self, params, resource, score, pruned=False, unit_cost=0.0) -> None:
+        self.history_.append(
+            {
+                "params": params,
+                "resource": resource,
+                "score": score,
+                "pruned": pruned,
+                "unit_cost": unit_cost,
+            }
+        )
+        scores = [trial["score"] for trial in self.history_ if not trial["pruned"]]
+        self.report(
+            {
+                "stage": "optimize",
+                "step": len(self.history_),
+                "best_score": max(scores) if scores else None,
+            }
+        )
+
+    def _splits(self, X, y):
+        return list(check_cv(self.cv, y, classifier=is_classifier(self.estimator)).split(X, y))
+
+    def _fits_in_budget(self, units: float, unit_cost: Optional[float] = None) -> bool:
+        """
+        Whether ``units`` of work (at ``unit_cost``, default the latest
+        measured one), then the final fits, would end before the deadline
+        """
+        # The final fits use the parameters of the current best trial
+        finished = [trial for trial in self.history_ if not trial["pruned"] and trial["unit_cost"]]
+        final_cost = self._unit_cost
+        if finished:
+            final_cost = max(finished, key=lambda trial: (trial["resource"], trial["score"]))["unit_cost"]
+        remaining = self._deadline - time.time()
+        cost = self._unit_cost if unit_cost is None else unit_cost
+        return remaining > 0 and cost * units + final_cost * self._final_units <= remaining
+
+    def _measured(self, costs: List[float]) -> None:
+        """Cost per unit from the latest fits (median, as outliers get pruned anyway)"""
+        if costs:
+            self._unit_cost = float(np.median(costs))
+
+    def _successive_halving(self, n_candidates: int, min_resource: float) -> None:
+        _, high = self._resource_range()
+        space = {name: dist for name, dist in self.space.items() if name != self.resource}
+        candidates = [sample_params(space, self._rng) for _ in range(n_candidates)]
+        resource = min_resource
+
+        while candidates:
+            amount = int(min(round(resource), high))
+            if self.resource == "n_samples":
+                rows = self._order[:amount]
+                X, y, extra = self._X[rows], self._y[rows], {}
+            else:
+                X, y, extra = self._X, self._y, {self.resource: amount}
+            splits = self._splits(X, y)
+
+            workers = min(len(candidates), self.n_jobs)
+            threads = max(1, self.n_jobs // workers)
+            # Units of one fit; parallel candidates run in waves of ``workers``
+            fit_rows = max(len(train_idx) for train_idx, _ in splits)
+            fit_units = fit_rows * (extra.get(self.resource) or 1)
+            waves = math.ceil(len(candidates) / workers)
+            if not self._fits_in_budget(waves * len(splits) * fit_units):
+                return
+            estimator = _with_threads(self.estimator, threads)
+            results = Parallel(n_jobs=workers, return_as="generator")(
+                delayed(_evaluate)(estimator, {**params, **extra}, X, y, splits, self._deadline, threads)
+                for params in candidates
+            )
+            scored, costs = [], []
+            for params, result in zip(candidates, results):
+                if result is not None:
+                    score, fit_seconds = result
+                    costs.append(fit_seconds / fit_units)
+                    self._record({**params, **extra}, amount, score, unit_cost=costs[-1])
+                    scored.append((score, params))
+            self._measured(costs)
+            if len(scored) < len(candidates) or len(scored) == 1 or amount >= high:
+                return
+
+            scored.sort(key=lambda pair: pair[0], reverse=True)
+            candidates = [params for _, params in scored[: max(1, len(scored) // self.eta)]]
+            resource *= self.eta
+
+    def _bayesian(self) -> None:
+        # Trials run one after another, each with every core of the budget
+        with threadpool_limits(limits=self.n_jobs):
+            self._bayesian_trials(_with_threads(self.estimator, self.n_jobs))
+
+    def _bayesian_trials(self, estimator) -> None:
+        X, y = self._X, self._y
+        splits = self._splits(X, y)
+        # Running mean score of every finished trial after each fold
+        running: List[List[float]] = [[] for _ in splits]
+        costs: List[float] = []
+
+        for _ in range(BAYES_ITERATIONS):
+            # Pruned trials count too: their partial scores mark poor regions
+            if len(self.history_) < BAYES_STARTUP:
+                params = sample_params(self.space, self._rng)
+            else:
+                params = self._suggest(self.history_)
+
+            scores, pruned, trial_cost = [], False, None
+            for fold, (train_idx, test_idx) in enumerate(splits):
+                # After its first fold a trial's own cost is the better estimate
+                if not self._fits_in_budget(len(train_idx), trial_cost):
+                    return
+                started = time.perf_counter()
+                try:
+                    model = clone(estimator).set_params(**params)
+                    model.fit(X[train_idx], y[train_idx])
+                    trial_cost = (time.perf_counter() - started) / len(train_idx)
+                    costs.append(trial_cost)
+                    self._measured(costs)
+                    scores.append(model.score(X[test_idx], y[test_idx]))
+                except ValueError:
+                    scores.append(-np.inf)
+                mean = float(np.mean(scores))
+                if fold < len(splits) - 1 and running[fold] and mean < np.median(running[fold]):
+                    pruned = True
+                    break
+            if not pruned:
+                for fold in range(len(splits)):
+                    running[fold].append(float(np.mean(scores[: fold + 1])))
+            self._record(params, len(scores), float(np.mean(scores)), pruned, trial_cost or 0.0)
+
+    def _suggest(self, trials: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Candidate maximizing l(x)/g(x): its density under the best trials over the rest"""
+        ordered = sorted(trials, key=lambda trial: trial["score"], reverse=True)
+        n_good = max(1, math.ceil(BAYES_GAMMA * len(ordered)))
+        good = [trial["params"] for trial in ordered[:n_good]]
+        bad = [trial["params"] for trial in ordered[n_good:]]
+
+        candidates = [self._sample_near(good) for _ in range(BAYES_CANDIDATES)]
+        return max(
+            candidates,
+            key=lambda params: self._log_density(params, good) - self._log_density(params, bad),
+        )
+
+    def _sample_near(self, observed: List[Dict[str, Any]]) -> Dict[str, Any]:
+        params = {}
+        for name, dist in self.space.items():
+            values = [trial[name] for trial in observed]
+            if isinstance(dist, list):
+                weights = np.array([1 + values.count(choice) for choice in dist], dtype=float)
+                params[name] = dist[self._rng.choice(len(dist), p=weights / weights.sum())]
+                continue
+            low, high, _ = _bounds(dist)
+            if self._rng.random() < 1 / (len(values) + 1):
+                # Prior component: keep exploring the whole range
+                params[name] = sample_params({name: dist}, self._rng)[name]
+                continue
+            center = _to_unit(dist, values[self._rng.integers(len(values))])
+            width = (high - low) / (2 + len(values))
+            params[name] = _from_unit(dist, self._rng.normal(center, width))
+        return params
+
+    def _log_density(self, params: Dict[str, Any], observed: List[Dict[str, Any]]) -> float:
+        """Log of a Parzen estimate (a Gaussian per observation plus a uniform prior) per parameter"""
+        total = 0.0
+        for name, dist in self.space.items():
+            values = [trial[name] for trial in observed]
+            if isinstance(dist, list):
+                count = values.count(params[name])
+                total += math.log((1 + count) / (len(dist) + len(values)))
+                continue
+            low, high, _ = _bounds(dist)
+            span = max(high - low, 1e-12)
+            width = span / (2 + len(values))
+            x = _to_unit(dist, params[name])
+            centers = np.array([_to_unit(dist, value) for value in values])
+            kernels = np.exp(-0.5 * ((x - centers) / width) ** 2) / (width * math.sqrt(2 * math.pi))
+            total += math.log((1 / span + kernels.sum()) / (len(values) + 1))
+        return total
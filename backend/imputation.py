@@ -0,0 +1,173 @@
+"""
+Imputation Service
+Column-parallel, vectorized strategies for filling missing values
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+DEFAULT_NEIGHBORS = 5
+
+# Incomplete rows queried against the ball tree at once
+DEFAULT_BLOCK_ROWS = 20_000
+
+# Complete rows indexed as KNN donors (sampled beyond this)
+MAX_DONORS = 200_000
+
+DEFAULT_MAX_ITER = 10
+
+SEED = 0
+
+
+def _map_columns(func, columns: List[str], workers: int) -> List[Any]:
+    """Run ``func`` over columns in a thread pool (pandas/numpy kernels release the GIL)"""
+    if len(columns) <= 1 or workers <= 1:
+        return [func(col) for col in columns]
+    with ThreadPoolExecutor(max_workers=min(workers, len(columns))) as pool:
+        return list(pool.map(func, columns))
+
+
+def column_modes(
+    df: pd.DataFrame, columns: List[str], workers: int = DEFAULT_WORKERS
+) -> Dict[str, Any]:
+    """Most frequent value of each column from one value_counts pass ("" when all null)"""
+
+    def mode(col: str) -> Any:
+        counts = df[col].value_counts(sort=False)
+        if counts.empty:
+            return ""
+        # Ties resolve to the smallest value, as Series.mode() does
+        top = counts[counts == counts.max()].index
+        try:
+            return top.min()
+        except TypeError:
+            return top[0]
+
+    return dict(zip(columns, _map_columns(mode, columns, workers)))
+
+
+def fill_columns(
+    df: pd.DataFrame, fills: Dict[str, Any], workers: int = DEFAULT_WORKERS
+) -> pd.DataFrame:
+    """Fill the nulls of each column with its value, in parallel across columns"""
+    columns = [col for col in fills if col in df.columns and df[col].hasnans]
+
+    def fill(col: str) -> pd.Series:
+        return df[col].fillna(fills[col])
+
+    for col, filled in zip(columns, _map_columns(fill, columns, workers)):
+        df[col] = filled
+    return df
+
+
+def group_fill(
+    df: pd.DataFrame,
+    columns: List[str],
+    key: str,
+    statistic: str = "mean",
+    workers: int = DEFAULT_WORKERS,
+) -> pd.DataFrame:
+    """
+    Fill numeric nulls with the mean or median of the row's group (one
+    ``groupby().transform`` over all columns); groups with no values fall
+    back to the column-wide statistic.
+    """
+    if key not in df.columns:
+        raise ValueError(f"Columna de agrupación '{key}' no encontrada")
+    columns = [col for col in columns if col != key and df[col].hasnans]
+    if not columns:
+        return df
+
+    group_stats = df[columns].groupby(df[key], sort=False, dropna=False).transform(statistic)
+    overall = df[columns].mean() if statistic == "mean" else df[columns].median()
+
+    def fill(col: str) -> pd.Series:
+        return df[col].fillna(group_stats[col]).fillna(overall[col])
+
+    for col, filled in zip(columns, _map_columns(fill, columns, workers)):
+        df[col] = filled
+    return df
+
+
+def knn_impute(
+    df: pd.DataFrame,
+    columns: List[str],
+    n_neighbors: int = DEFAULT_NEIGHBORS,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+) -> pd.DataFrame:
+    """
+    Fill numeric nulls with the mean of the ``n_neighbors`` nearest complete
+    rows, measured on the standardized columns the row does have.
+
+    Incomplete rows are grouped by missing pattern; each pattern gets one
+    ball tree over the donors (complete rows) projected onto its observed
+    columns and is queried block by block, so memory stays bounded on
+    large tables.
+    """
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    missing = np.isnan(values)
+    incomplete = np.flatnonzero(missing.any(axis=1))
+    if len(incomplete) == 0:
+        return df
+
+    donors = np.flatnonzero(~missing.any(axis=1))
+    if len(donors) == 0:
+        # Nothing to learn from: fall back to the column means
+        return fill_columns(df, df[columns].mean().to_dict())
+    if len(donors) > MAX_DONORS:
+        donors = np.sort(np.random.default_rng(SEED).choice(donors, MAX_DONORS, replace=False))
+    k = min(n_neighbors, len(donors))
+
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0)
+    std[~(std > 0)] = 1.0
+    scaled = (values - mean) / std
+    donor_values = values[donors]
+
+    patterns, pattern_ids = np.unique(missing[incomplete], axis=0, return_inverse=True)
+    pattern_ids = pattern_ids.ravel()
+    for pattern_id, pattern in enumerate(patterns):
+        rows = incomplete[pattern_ids == pattern_id]
+        observed = ~pattern
+        if not observed.any():
+            values[np.ix_(rows, pattern)] = donor_values[:, pattern].mean(axis=0)
+            continue
+        tree = BallTree(scaled[np.ix_(donors, observed)])
+        for start in range(0, len(rows), block_rows):
+            block = rows[start:start + block_rows]
+            _, neighbors = tree.query(scaled[np.ix_(block, observed)], k=k)
+            # (block, k, missing columns) -> mean over the neighbors
+            values[np.ix_(block, pattern)] = donor_values[neighbors][:, :, pattern].mean(axis=1)
+
+    for position, col in enumerate(columns):
+        if missing[:, position].any():
+            df[col] = pd.Series(values[:, position], index=df.index).astype(
+                df[col].dtype if df[col].dtype.kind == "f" else np.float64
+            )
+    return df
+
+
+def iterative_impute(
+    df: pd.DataFrame, columns: List[str], max_iter: int = DEFAULT_MAX_ITER
+) -> pd.DataFrame:
+    """Model each numeric column with nulls from the others, in rounds (sklearn IterativeImputer)"""
+    from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+    from sklearn.impute import IterativeImputer
+
+    columns = [col for col in columns if df[col].notna().any()]
+    if not any(df[col].hasnans for col in columns):
+        return df
+
+    imputer = IterativeImputer(max_iter=max_iter, random_state=SEED)
+    filled = imputer.fit_transform(df[columns].to_numpy(dtype=np.float64, na_value=np.nan))
+    for position, col in enumerate(columns):
+        if df[col].hasnans:
+            df[col] = pd.Series(filled[:, position], index=df.index)
+    return df
@@ -0,0 +1,312 @@
+"""
+Incremental Cleaning Service
+Re-applies a cleaning operation only to the rows appended or edited since
+its last run on a stored dataset
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from cleaning_service import (
+    FILL_METHODS,
+    apply_operation,
+    clean_duplicates,
+    clean_inconsistencies,
+    clean_missing_values,
+)
+from dataset_registry import dataset_registry
+from duplicate_engine import exact_duplicates, row_fingerprints
+
+INCREMENTAL_OPERATIONS = ("missing", "normalize", "transform")
+
+
+def _assign_rows(df: pd.DataFrame, rows: pd.DataFrame) -> None:
+    """
+    Write the cleaned ``rows`` back into ``df`` by label. ``df`` may share
+    its columns with the stored version, so each written column is copied
+    first.
+    """
+    for col in rows.columns:
+        values = rows[col]
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            new_categories = pd.Index(values.dropna().unique()).difference(df[col].cat.categories)
+            df[col] = df[col].cat.add_categories(new_categories)
+        else:
+            df[col] = df[col].copy()
+        df.loc[rows.index, col] = values
+
+
+def _text_changes(before: Dict[str, pd.Series], after: pd.DataFrame) -> np.ndarray:
+    """Mask of rows whose text cells differ between ``before`` and ``after``"""
+    changed = np.zeros(len(after), dtype=bool)
+    for col, values in before.items():
+        if after[col] is not values:
+            # Null cells are never modified by the text transforms
+            differs = after[col].astype(object) != values.astype(object)
+            changed |= differs.to_numpy() & values.notna().to_numpy()
+    return changed
+
+
+def _null_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """Null mask of the columns that have nulls (what an imputation may fill)"""
+    nulls = df.isnull()
+    return nulls.loc[:, nulls.any().to_numpy()]
+
+
+def _filled_rows(nulls: pd.DataFrame, after: pd.DataFrame) -> pd.Index:
+    """Labels of rows of ``after`` where a cell null in ``nulls`` now has a value"""
+    columns = [col for col in nulls.columns if col in after.columns]
+    if not columns:
+        return after.index[:0]
+    filled = nulls.loc[after.index, columns].to_numpy() & after[columns].notna().to_numpy()
+    return after.index[filled.any(axis=1)]
+
+
+def _load_labels(path: str) -> np.ndarray:
+    """Memory-map the row labels of a hash index (object labels, e.g. strings, can't be mapped)"""
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        return np.load(path, allow_pickle=True)
+
+
+class IncrementalCleaner:
+    """
+    Remembers, per dataset and (operation, params), the version produced by
+    the last run and what that run computed: fill values for imputation and
+    a hash index of row fingerprints for duplicate detection. The index is
+    kept on disk under ``index_dir``.
+
+    A later run on a descendant version whose change sets are all known
+    (see ``DatasetRegistry.changes_since``) only processes the dirty rows;
+    anything else falls back to a full run.
+    """
+
+    def __init__(self, index_dir: str = "cache/indexes"):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def state_key(operation: str, params: dict) -> str:
+        payload = json.dumps([operation, params], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def supports(operation: str, params: dict) -> bool:
+        """Forward/backward fill depend on neighbouring rows and always run in full"""
+        if operation == "missing":
+            return params.get("method", "mean") in FILL_METHODS
+        return operation in INCREMENTAL_OPERATIONS
+
+    def clean(
+        self,
+        dataset_id: str,
+        parent_version: int,
+        df: pd.DataFrame,
+        operation: str,
+        params: dict,
+        incremental: bool = True,
+    ) -> Tuple[pd.DataFrame, str, Dict[str, Any]]:
+        """
+        Run ``operation`` on ``df`` (a copy of ``parent_version``).
+
+        Returns:
+            Tuple of (DataFrame, message, run). ``run`` carries the ``mode``
+            ("full" or "incremental"), ``rows_processed``, the row-level
+            ``changes`` of the result (None when unknown) and the state to
+            store with ``commit`` once the new version exists.
+        """
+        key = self.state_key(operation, params)
+        with self._lock:
+            state = self._states.get((dataset_id, key))
+
+        changes = None
+        if incremental and state is not None and self.supports(operation, params):
+            changes = dataset_registry.changes_since(dataset_id, state["version"], parent_version)
+
+        if changes is None:
+            rows_processed = len(df)
+            df, message, new_state, result_changes = self._full_run(df, operation, params)
+            run = {"mode": "full", "rows_processed": rows_processed, "changes": result_changes}
+        else:
+            df, message, new_state, result_changes = self._incremental_run(
+                df, operation, params, state, changes
+            )
+            run = {
+                "mode": "incremental",
+                "rows_processed": len(changes["dirty"]),
+                "changes": result_changes,
+            }
+        run.update({"key": key, "operation": operation, "state": new_state})
+        return df, message, run
+
+    def commit(self, dataset_id: str, version: int, run: Dict[str, Any]) -> None:
+        """Remember the run's state as the base for later incremental runs"""
+        state = run["state"]
+        if state is None:
+            return
+        state = {**state, "version": version}
+        if "fingerprints" in state:
+            # Persist the hash index sorted by fingerprint, for binary-search probes
+            fingerprints = state.pop("fingerprints")
+            order = np.argsort(fingerprints, kind="stable")
+            fingerprints = fingerprints[order]
+            labels = np.asarray(state.pop("labels"))[order]
+            base = self.index_dir / f"{dataset_id}_{run['key']}"
+            np.save(f"{base}_fingerprints.npy", fingerprints)
+            np.save(f"{base}_labels.npy", labels, allow_pickle=labels.dtype == object)
+            state["index_path"] = str(base)
+        with self._lock:
+            self._states[(dataset_id, run["key"])] = state
+
+    def remove(self, dataset_id: str) -> None:
+        """Forget a dataset's states and delete its hash indexes"""
+        with self._lock:
+            for key in [key for key in self._states if key[0] == dataset_id]:
+                del self._states[key]
+        for path in self.index_dir.glob(f"{dataset_id}_*.npy"):
+            path.unlink(missing_ok=True)
+
+    def _full_run(
+        self, df: pd.DataFrame, operation: str, params: dict
+    ) -> Tuple[pd.DataFrame, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Run the operation on every row.
+
+        Returns:
+            Tuple of (DataFrame, message, state, row-level changes). The
+            changes let later incremental runs of *other* operations treat
+            the rows this run modified as dirty.
+        """
+        input_index = df.index
+        if operation == "missing" and self.supports(operation, params):
+            nulls = _null_cells(df)
+            stats: Dict[str, Any] = {}
+            df, message = clean_missing_values(df, params, stats_out=stats)
+            removed = input_index.difference(df.index, sort=False)
+            changes = {
+                "appended": [],
+                # Only rows with a cell actually filled (e.g. not text nulls under "mean")
+                "updated": _filled_rows(nulls, df).tolist(),
+                "removed": removed.tolist(),
+            }
+            return df, message, {"fill_values": stats}, changes
+        if operation == "normalize":
+            index: Dict[str, Any] = {}
+            df, message = clean_duplicates(df, params, index_out=index)
+            removed = input_index.difference(df.index, sort=False).tolist()
+            return df, message, index, {"appended": [], "updated": [], "removed": removed}
+        if operation == "transform":
+            before = {col: df[col] for col in df.select_dtypes(include=["object", "category"])}
+            df, message = clean_inconsistencies(df, params)
+            changed = _text_changes(before, df)
+            changes = {"appended": [], "updated": input_index[changed].tolist(), "removed": []}
+            return df, message, {}, changes
+        df, message = apply_operation(df, operation, params)
+        return df, message, None, None
+
+    def _incremental_run(
+        self,
+        df: pd.DataFrame,
+        operation: str,
+        params: dict,
+        state: Dict[str, Any],
+        changes: Dict[str, pd.Index],
+    ) -> Tuple[pd.DataFrame, str, Dict[str, Any], Dict[str, Any]]:
+        dirty = changes["dirty"].intersection(df.index, sort=False)
+        suffix = f" (incremental: {len(dirty)} filas nuevas o modificadas)"
+
+        if operation == "missing":
+            rows = df.loc[dirty].copy()
+            nulls = _null_cells(rows)
+            rows, message = clean_missing_values(rows, params, fill_values=state["fill_values"])
+            dropped = dirty.difference(rows.index, sort=False)
+            df = df.drop(index=dropped)
+            _assign_rows(df, rows)
+            result_changes = {
+                "appended": [],
+                "updated": _filled_rows(nulls, rows).tolist(),
+                "removed": dropped.tolist(),
+            }
+            return df, message + suffix, state, result_changes
+
+        if operation == "transform":
+            rows = df.loc[dirty].copy()
+            before = {col: rows[col] for col in rows.select_dtypes(include=["object", "category"])}
+            rows, message = clean_inconsistencies(rows, params)
+            changed = _text_changes(before, rows)
+            _assign_rows(df, rows.loc[changed, list(before)])
+            result_changes = {"appended": [], "updated": dirty[changed].tolist(), "removed": []}
+            return df, message + suffix, state, result_changes
+
+        return self._incremental_duplicates(df, params, state, changes, dirty, suffix)
+
+    def _incremental_duplicates(
+        self,
+        df: pd.DataFrame,
+        params: dict,
+        state: Dict[str, Any],
+        changes: Dict[str, pd.Index],
+        dirty: pd.Index,
+        suffix: str,
+    ) -> Tuple[pd.DataFrame, str, Dict[str, Any], Dict[str, Any]]:
+        """Probe the fingerprints of dirty rows against the persisted hash index"""
+        columns = state["columns"]
+        base = state["index_path"]
+        fingerprints = np.load(f"{base}_fingerprints.npy", mmap_mode="r")
+        labels = _load_labels(f"{base}_labels.npy")
+
+        # Drop index entries of rows that were edited or removed since the base run
+        stale = changes["updated"].union(changes["removed"])
+        if len(stale):
+            current = ~np.isin(labels, stale.to_numpy())
+            fingerprints, labels = fingerprints[current], labels[current]
+
+        new_fingerprints = row_fingerprints(df.loc[dirty], columns)
+        positions = np.searchsorted(fingerprints, new_fingerprints)
+        in_index = np.zeros(len(dirty), dtype=bool)
+        if len(fingerprints):
+            positions = np.minimum(positions, len(fingerprints) - 1)
+            in_index = fingerprints[positions] == new_fingerprints
+        if in_index.any():
+            # A matching fingerprint is only a candidate: compare with the indexed row
+            matched = df.loc[labels[positions[in_index]], columns]
+            probes = df.loc[dirty[in_index], columns]
+            pairs = np.tile(np.arange(len(probes)), 2)
+            _, equal = exact_duplicates(pd.concat([matched, probes]), pairs)
+            in_index[in_index] = equal[len(probes):]
+        is_duplicate = in_index | df.loc[dirty, columns].duplicated().to_numpy()
+
+        remove_duplicates = params.get("removeDuplicates", False)
+        removed = dirty[is_duplicate] if remove_duplicates else dirty[:0]
+        keep = ~is_duplicate if remove_duplicates else np.ones(len(dirty), dtype=bool)
+        if len(removed):
+            df = df.drop(index=removed)
+
+        state = {
+            "columns": columns,
+            "fingerprints": np.concatenate([fingerprints, new_fingerprints[keep]]),
+            "labels": np.concatenate([labels, dirty.to_numpy()[keep]]),
+        }
+
+        message = f"Duplicados encontrados: {int(is_duplicate.sum())}"
+        if remove_duplicates:
+            message += (
+                f". {len(removed)} filas duplicadas eliminadas, "
+                "manteniendo solo la primera ocurrencia de cada grupo"
+            )
+        else:
+            message += ". Activa 'Eliminar filas duplicadas' para limpiarlos"
+        result_changes = {"appended": [], "updated": [], "removed": removed.tolist()}
+        return df, message + suffix, state, result_changes
+
+
+# Shared cleaner instance used by the API
+incremental_cleaner = IncrementalCleaner()
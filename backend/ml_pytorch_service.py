@@ -11,10 +11,11 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Callable
 import json
 from pathlib import Path
 import time
+from dataset_cache import dataset_cache
 
 class NeuralNetworkDataset(Dataset):
     """Custom dataset for neural networks"""
@@ -84,8 +85,29 @@ class PyTorchModelTrainer:
         self.models_dir.mkdir(exist_ok=True)
     
     def prepare_data(self, df: pd.DataFrame, target_column: str, test_size: float = 0.2, 
-                    batch_size: int = 32):
+                    batch_size: int = 32, cache_key: Optional[str] = None):
         """Prepare data for training"""
+        # Reuse the scaled split of this dataset version if it was cached
+        features_key = None
+        if cache_key:
+            features_key = dataset_cache.features_key(
+                cache_key,
+                {"framework": "pytorch", "target_column": target_column, "test_size": test_size}
+            )
+            cached = dataset_cache.load_features(features_key)
+            if cached is not None:
+                arrays, state = cached
+                self.scaler = state["scaler"]
+                self.label_encoder = state["label_encoder"]
+                self.feature_names = state["feature_names"]
+                self.is_classification = state["is_classification"]
+                self.n_classes = state.get("n_classes")
+                self.target_name = target_column
+                return self._build_loaders(
+                    arrays["X_train"], arrays["X_val"], arrays["X_test"],
+                    arrays["y_train"], arrays["y_val"], arrays["y_test"], batch_size
+                )
+        
         # Separate features and target
         X = df.drop(columns=[target_column])
         y = df[target_column]
@@ -127,6 +149,29 @@ class PyTorchModelTrainer:
         y_val = y_val.values if isinstance(y_val, pd.Series) else y_val
         y_test = y_test.values if isinstance(y_test, pd.Series) else y_test
         
+        if features_key:
+            dataset_cache.save_features(
+                features_key,
+                {
+                    "X_train": X_train_scaled, "X_val": X_val_scaled, "X_test": X_test_scaled,
+                    "y_train": y_train, "y_val": y_val, "y_test": y_test
+                },
+                {
+                    "scaler": self.scaler,
+                    "label_encoder": self.label_encoder,
+                    "feature_names": self.feature_names,
+                    "is_classification": self.is_classification,
+                    "n_classes": getattr(self, "n_classes", None)
+                }
+            )
+        
+        return self._build_loaders(
+            X_train_scaled, X_val_scaled, X_test_scaled, y_train, y_val, y_test, batch_size
+        )
+    
+    def _build_loaders(self, X_train_scaled, X_val_scaled, X_test_scaled,
+                       y_train, y_val, y_test, batch_size: int):
+        """Wrap prepared arrays in DataLoaders and keep the test split for predictions"""
         # Create datasets
         train_dataset = NeuralNetworkDataset(X_train_scaled, y_train)
         val_dataset = NeuralNetworkDataset(X_val_scaled, y_val)
@@ -181,13 +226,15 @@ class PyTorchModelTrainer:
         epochs: int = 50,
         batch_size: int = 32,
         loss_function: str = "cross_entropy",
-        test_size: float = 0.2
+        test_size: float = 0.2,
+        cache_key: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
-        """Train a PyTorch model"""
+        """Train a PyTorch model (``progress_callback`` gets a dict after every epoch)"""
         
         # Prepare data
         train_loader, val_loader, test_loader = self.prepare_data(
-            df, target_column, test_size, batch_size
+            df, target_column, test_size, batch_size, cache_key
         )
         
         # Create model
@@ -243,6 +290,12 @@ class PyTorchModelTrainer:
             self.training_history["val_acc"].append(float(val_acc))
             self.training_history["epochs"].append(epoch + 1)
             
+            if progress_callback:
+                progress_callback({
+                    "stage": "epoch", "step": epoch + 1, "total": epochs,
+                    "train_loss": float(train_loss), "val_loss": float(val_loss)
+                })
+            
             # Print progress every 10 epochs
             if (epoch + 1) % 10 == 0:
                 print(f"Epoch [{epoch+1}/{epochs}] - "
@@ -463,6 +516,32 @@ class PyTorchModelTrainer:
         print(f"DEBUG PyTorch: Generadas {len(results)} predicciones")
         return {"predictions": results, "task_type": "regression" if not self.is_classification else "classification"}
     
+    def test_predictions(self, batch_size: int = 4096) -> pd.DataFrame:
+        """Predictions for the whole stored test set, one row per sample (forward pass in batches)"""
+        if self.model is None or getattr(self, 'X_test', None) is None:
+            raise ValueError("Model not trained yet")
+        
+        self.model.eval()
+        predictions, confidence = [], []
+        with torch.no_grad():
+            for start in range(0, len(self.X_test), batch_size):
+                outputs = self.model(torch.FloatTensor(self.X_test[start:start + batch_size]).to(self.device))
+                if self.is_classification:
+                    probs = torch.softmax(outputs, dim=1)
+                    best, labels = probs.max(dim=1)
+                    predictions.append(labels.cpu().numpy())
+                    confidence.append(best.cpu().numpy())
+                else:
+                    predictions.append(outputs.reshape(-1).cpu().numpy())
+        
+        predictions = np.concatenate(predictions) if predictions else np.array([])
+        return pd.DataFrame({
+            "sample_id": np.arange(1, len(predictions) + 1),
+            "true_value": np.asarray(self.y_test, dtype=np.float64),
+            "predicted_value": predictions.astype(np.float64),
+            "confidence": np.concatenate(confidence) if confidence else np.full(len(predictions), np.nan),
+        })
+    
     def save_model(self, model_name: str) -> str:
         """Save trained model"""
         if self.model is None:
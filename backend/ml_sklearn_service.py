@@ -7,10 +7,11 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import (
     train_test_split,
-    cross_val_score,
+    check_cv,
     GridSearchCV,
     RandomizedSearchCV,
 )
+from sklearn.base import clone
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.linear_model import LinearRegression, LogisticRegression
 from sklearn.ensemble import (
@@ -35,9 +36,63 @@ from sklearn.metrics import (
     mean_absolute_error,
 )
 import joblib
-from typing import Dict, Any, Tuple, Optional
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_limits
+from typing import Dict, Any, Tuple, Optional, Callable, List
 import json
+import os
+import time
 from pathlib import Path
+from dataset_cache import dataset_cache
+from hyperparam_search import (
+    ESTIMATOR_RESOURCES,
+    MAX_SEARCH_SAMPLES,
+    MODEL_MAX_SAMPLES,
+    SEARCH_METHODS,
+    SEARCH_SPACES,
+    HyperparameterSearch,
+)
+
+# Cores a leaderboard run may use in total (parallel models x threads per model);
+# jobs of the training queue are further limited to their share of the machine
+CPU_BUDGET = int(os.getenv("TRAINING_CPU_BUDGET", str(os.cpu_count() or 1)))
+
+# Metrics a leaderboard can rank by; True when higher is better
+LEADERBOARD_METRICS = {
+    "classification": {"accuracy": True, "f1": True},
+    "regression": {"r2": True, "rmse": False, "mae": False},
+}
+
+
+def _score(metric: str, y_true, y_pred) -> float:
+    if metric == "accuracy":
+        return float(accuracy_score(y_true, y_pred))
+    if metric == "f1":
+        return float(f1_score(y_true, y_pred, average="weighted", zero_division=0))
+    if metric == "r2":
+        return float(r2_score(y_true, y_pred))
+    if metric == "rmse":
+        return float(np.sqrt(mean_squared_error(y_true, y_pred)))
+    return float(mean_absolute_error(y_true, y_pred))
+
+
+def _fit_candidate(model_type, model, X_train, y_train, X_test, y_test, metrics, threads):
+    """Fit and score one leaderboard model (runs in a joblib worker)"""
+    # Nested parallelism stays inside this model's share of the CPU budget
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=threads)
+    with threadpool_limits(limits=threads):
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = model.predict(X_test)
+        predict_time = time.perf_counter() - start
+
+    row = {"model_type": model_type, "fit_time": fit_time, "predict_time": predict_time}
+    row.update({metric: _score(metric, y_test, y_pred) for metric in metrics})
+    return row, model
 
 
 class SklearnModelTrainer:
@@ -76,9 +131,38 @@ class SklearnModelTrainer:
         return models[task_type].get(model_type)
 
     def prepare_data(
-        self, df: pd.DataFrame, target_column: str, test_size: float = 0.2
+        self,
+        df: pd.DataFrame,
+        target_column: str,
+        test_size: float = 0.2,
+        cache_key: Optional[str] = None,
     ):
-        """Prepare data for training"""
+        """
+        Prepare data for training.
+
+        When ``cache_key`` identifies a dataset version, the scaled split is
+        memory-mapped from the dataset cache if present, and stored otherwise.
+        """
+        features_key = None
+        if cache_key:
+            features_key = dataset_cache.features_key(
+                cache_key,
+                {
+                    "framework": "sklearn",
+                    "target_column": target_column,
+                    "test_size": test_size,
+                    "is_classification": self.is_classification,
+                },
+            )
+            cached = dataset_cache.load_features(features_key)
+            if cached is not None:
+                arrays, state = cached
+                self.scaler = state["scaler"]
+                self.label_encoder = state["label_encoder"]
+                self.feature_names = state["feature_names"]
+                self.target_name = target_column
+                return arrays["X_train"], arrays["X_test"], arrays["y_train"], arrays["y_test"]
+
         # Separate features and target
         X = df.drop(columns=[target_column])
         y = df[target_column]
@@ -112,6 +196,22 @@ class SklearnModelTrainer:
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
 
+        if features_key:
+            dataset_cache.save_features(
+                features_key,
+                {
+                    "X_train": X_train_scaled,
+                    "X_test": X_test_scaled,
+                    "y_train": y_train,
+                    "y_test": y_test,
+                },
+                {
+                    "scaler": self.scaler,
+                    "label_encoder": self.label_encoder,
+                    "feature_names": self.feature_names,
+                },
+            )
+
         return X_train_scaled, X_test_scaled, y_train, y_test
 
     def train(
@@ -123,12 +223,27 @@ class SklearnModelTrainer:
         test_size: float = 0.2,
         cv_folds: int = 5,
         optimize_hyperparams: Optional[str] = None,
+        cache_key: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        optimize_time_budget: Optional[float] = None,
+        cpu_budget: int = CPU_BUDGET,
     ) -> Dict[str, Any]:
-        """Train a scikit-learn model"""
+        """
+        Train a scikit-learn model.
+
+        ``progress_callback`` receives a dict (``stage``, and ``step``/``total``
+        for the cross-validation folds) as training advances. The
+        hyperparameter search uses at most ``cpu_budget`` cores.
+        """
+        report = progress_callback or (lambda info: None)
+
+        # Task type must be known before preparing data (stratified split)
+        self.is_classification = task_type == "classification"
 
         # Prepare data
+        report({"stage": "prepare"})
         X_train, X_test, y_train, y_test = self.prepare_data(
-            df, target_column, test_size
+            df, target_column, test_size, cache_key
         )
 
         # Get model
@@ -136,11 +251,22 @@ class SklearnModelTrainer:
 
         # Hyperparameter optimization
         if optimize_hyperparams and optimize_hyperparams != "none":
+            report({"stage": "optimize"})
             self.model = self._optimize_hyperparameters(
-                self.model, X_train, y_train, optimize_hyperparams, model_type
+                self.model,
+                X_train,
+                y_train,
+                optimize_hyperparams,
+                model_type,
+                time_budget=optimize_time_budget,
+                cpu_budget=cpu_budget,
+                report=report,
+                # The final fit and the cross-validation folds share the budget
+                final_fits=1 + (cv_folds if cv_folds and cv_folds > 1 else 0),
             )
 
         # Train model
+        report({"stage": "fit"})
         self.model.fit(X_train, y_train)
 
         # Cross-validation with safeguards for small class sizes or small training sets
@@ -159,14 +285,14 @@ class SklearnModelTrainer:
                         min_count = int(nonzero.min()) if len(nonzero) > 0 else 0
 
                     if min_count >= cv_folds:
-                        cv_scores = cross_val_score(
-                            self.model, X_train, y_train, cv=cv_folds
+                        cv_scores = self._cross_val_scores(
+                            X_train, y_train, cv_folds, report
                         )
                     elif min_count >= 2:
                         # use the largest valid number of splits (at most min_count)
                         effective_cv = min(int(min_count), cv_folds)
-                        cv_scores = cross_val_score(
-                            self.model, X_train, y_train, cv=effective_cv
+                        cv_scores = self._cross_val_scores(
+                            X_train, y_train, effective_cv, report
                         )
                     else:
                         # Not enough samples per class for cross-validation; skip CV
@@ -177,8 +303,8 @@ class SklearnModelTrainer:
                 else:
                     # Regression: require at least cv_folds samples in training set
                     if len(y_train) >= cv_folds:
-                        cv_scores = cross_val_score(
-                            self.model, X_train, y_train, cv=cv_folds
+                        cv_scores = self._cross_val_scores(
+                            X_train, y_train, cv_folds, report
                         )
                     else:
                         cv_scores = []
@@ -191,6 +317,7 @@ class SklearnModelTrainer:
             cv_scores = []
 
         # Predictions
+        report({"stage": "evaluate"})
         y_pred_train = self.model.predict(X_train)
         y_pred_test = self.model.predict(X_test)
 
@@ -264,10 +391,140 @@ class SklearnModelTrainer:
 
         return metrics
 
+    def train_leaderboard(
+        self,
+        df: pd.DataFrame,
+        target_column: str,
+        model_types: Optional[List[str]] = None,
+        task_type: str = "classification",
+        test_size: float = 0.2,
+        metric: Optional[str] = None,
+        cpu_budget: int = CPU_BUDGET,
+        cache_key: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Train several model types on one shared split and rank them.
+
+        The data is prepared and scaled once; the models are fitted in
+        parallel joblib workers, which memory-map the read-only feature
+        matrices instead of copying them. ``cpu_budget`` cores are split
+        between parallel models and the threads each model may use. The
+        best model stays as the trainer's model.
+        """
+        report = progress_callback or (lambda info: None)
+        self.is_classification = task_type == "classification"
+        available = LEADERBOARD_METRICS[task_type]
+        metric = metric if metric in available else next(iter(available))
+        model_types = model_types or [
+            name for name in ("logistic", "linear", "rf", "gb", "svm", "knn")
+            if self.get_model(name, task_type) is not None
+        ]
+        unknown = [name for name in model_types if self.get_model(name, task_type) is None]
+        if unknown:
+            raise ValueError(f"Modelos no disponibles para {task_type}: {', '.join(unknown)}")
+
+        report({"stage": "prepare"})
+        start = time.perf_counter()
+        X_train, X_test, y_train, y_test = self.prepare_data(
+            df, target_column, test_size, cache_key
+        )
+
+        workers = max(1, min(len(model_types), cpu_budget))
+        threads = max(1, cpu_budget // workers)
+        results = Parallel(n_jobs=workers, return_as="generator")(
+            delayed(_fit_candidate)(
+                name, self.get_model(name, task_type), X_train, y_train,
+                X_test, y_test, list(available), threads,
+            )
+            for name in model_types
+        )
+
+        rows, models = [], {}
+        for done, (row, model) in enumerate(results, start=1):
+            rows.append(row)
+            models[row["model_type"]] = model
+            report({"stage": "models", "step": done, "total": len(model_types)})
+
+        rows.sort(key=lambda row: row[metric], reverse=available[metric])
+        for rank, row in enumerate(rows, start=1):
+            row["rank"] = rank
+
+        # Keep the winner for predictions, like a single-model run
+        best = rows[0]["model_type"]
+        self.model = models[best]
+        self.X_test = X_test
+        self.y_test = y_test
+
+        report({"stage": "evaluate"})
+        y_pred_test = self.model.predict(X_test)
+        if self.is_classification:
+            metrics = self._calculate_classification_metrics(
+                y_train, self.model.predict(X_train), y_test, y_pred_test, X_test
+            )
+        else:
+            metrics = self._calculate_regression_metrics(
+                y_train, self.model.predict(X_train), y_test, y_pred_test
+            )
+
+        return {
+            "leaderboard": rows,
+            "metric": metric,
+            "best_model": best,
+            "metrics": metrics,
+            "n_train": len(y_train),
+            "n_test": len(y_test),
+            "workers": workers,
+            "threads_per_model": threads,
+            "total_time": time.perf_counter() - start,
+        }
+
+    def _cross_val_scores(
+        self, X_train, y_train, cv: int, report: Callable[[Dict[str, Any]], None]
+    ) -> np.ndarray:
+        """Same folds and scores as ``cross_val_score``, reporting after each fold"""
+        splitter = check_cv(cv, y_train, classifier=self.is_classification)
+        X = np.asarray(X_train)
+        y = np.asarray(y_train)
+        scores = []
+        for fold, (train_idx, test_idx) in enumerate(splitter.split(X, y)):
+            model = clone(self.model).fit(X[train_idx], y[train_idx])
+            scores.append(model.score(X[test_idx], y[test_idx]))
+            report({"stage": "cv", "step": fold + 1, "total": cv})
+        return np.array(scores)
+
     def _optimize_hyperparameters(
-        self, model, X_train, y_train, method: str, model_type: str
+        self,
+        model,
+        X_train,
+        y_train,
+        method: str,
+        model_type: str,
+        time_budget: Optional[float] = None,
+        cpu_budget: int = CPU_BUDGET,
+        report: Optional[Callable[[Dict[str, Any]], None]] = None,
+        final_fits: int = 0,
     ):
         """Optimize model hyperparameters"""
+        if method in SEARCH_METHODS:
+            if model_type not in SEARCH_SPACES:
+                return model
+            resource, low, high = ESTIMATOR_RESOURCES.get(model_type, ("n_samples", None, None))
+            max_samples = min(MAX_SEARCH_SAMPLES, MODEL_MAX_SAMPLES.get(model_type, MAX_SEARCH_SAMPLES))
+            search = HyperparameterSearch(
+                model,
+                SEARCH_SPACES[model_type],
+                resource=resource,
+                min_resource=low,
+                max_resource=high,
+                max_samples=max_samples,
+                n_jobs=cpu_budget,
+                progress_callback=report,
+                final_fits=final_fits,
+                **({"time_budget": time_budget} if time_budget else {}),
+            )
+            return search.fit(X_train, y_train, method).best_estimator_
+
         param_grids = {
             "rf": {
                 "n_estimators": [50, 100, 200],
@@ -293,10 +550,10 @@ class SklearnModelTrainer:
             return model
 
         if method == "grid":
-            search = GridSearchCV(model, param_grid, cv=3, n_jobs=-1)
+            search = GridSearchCV(model, param_grid, cv=3, n_jobs=cpu_budget)
         elif method == "random":
             search = RandomizedSearchCV(
-                model, param_grid, n_iter=10, cv=3, n_jobs=-1, random_state=42
+                model, param_grid, n_iter=10, cv=3, n_jobs=cpu_budget, random_state=42
             )
         else:
             return model
@@ -440,6 +697,25 @@ class SklearnModelTrainer:
         print(f"DEBUG: Generadas {len(results)} predicciones")
         return {"predictions": results, "task_type": "regression" if not self.is_classification else "classification"}
 
+    def test_predictions(self) -> pd.DataFrame:
+        """Predictions for the whole stored test set, one row per sample"""
+        if self.model is None or getattr(self, "X_test", None) is None:
+            raise ValueError("Model not trained yet")
+
+        predictions = self.model.predict(self.X_test)
+        confidence = np.full(len(predictions), np.nan)
+        if self.is_classification and hasattr(self.model, "predict_proba"):
+            confidence = self.model.predict_proba(self.X_test).max(axis=1)
+
+        return pd.DataFrame(
+            {
+                "sample_id": np.arange(1, len(predictions) + 1),
+                "true_value": np.asarray(self.y_test, dtype=np.float64),
+                "predicted_value": np.asarray(predictions, dtype=np.float64),
+                "confidence": confidence,
+            }
+        )
+
     def save_model(self, model_name: str) -> str:
         """Save trained model"""
         if self.model is None:
@@ -0,0 +1,246 @@
+"""
+Near-Duplicate Detection Service
+MinHash signatures with LSH banding over the text columns of a DataFrame
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 3
+
+# Permutations hashed at once; bounds the (shingles x permutations) work array
+PERMUTATION_BLOCK = 16
+
+# Shingles of consecutive rows signed together (whole rows, so a block may exceed it)
+SIGNATURE_BLOCK = 1 << 20
+
+SEED = 1234
+
+# Codepoints fit in 21 bits, so a shingle of up to 3 characters packs exactly
+CODEPOINT_BITS = 21
+
+UINT32_MAX = np.uint32(0xFFFFFFFF)
+
+
+def row_texts(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """One normalized string per row: non-null values joined, lowercased, single-spaced"""
+    parts = [
+        df[col].astype("string").str.lower().fillna("").to_numpy(dtype=object)
+        for col in columns
+    ]
+    joined = parts[0]
+    for values in parts[1:]:
+        joined = joined + " " + values
+    return pd.Series(joined, dtype="string").str.split().str.join(" ").fillna("").to_numpy(dtype=object)
+
+
+def shingle_hashes(texts: np.ndarray, k: int = DEFAULT_SHINGLE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Character k-shingles of every text, computed over one flat codepoint buffer.
+
+    Returns:
+        Tuple of (64-bit shingle values, owning row of each shingle, in row
+        order). Texts shorter than ``k`` contribute a single shingle of the
+        whole text; empty texts contribute none.
+    """
+    # Pad short, non-empty texts so they yield one shingle of the whole text
+    texts = [text.ljust(k, "\0") if 0 < len(text) < k else text for text in texts]
+    lengths = np.fromiter((len(text) for text in texts), np.int64, len(texts))
+    buffer = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    # Pack k consecutive codepoints into one integer (rolled for k > 3)
+    values = np.zeros(max(len(buffer) - k + 1, 0), dtype=np.uint64)
+    for offset in range(k):
+        window = buffer[offset:offset + len(values)]
+        if offset and offset % 3 == 0:
+            values = values * np.uint64(0x9E3779B97F4A7C15)
+        values = (values << np.uint64(CODEPOINT_BITS)) ^ window
+
+    counts = np.maximum(lengths - k + 1, 0)
+    rows = np.repeat(np.arange(len(texts)), counts)
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts) + starts[rows]
+    return values[positions], rows
+
+
+def minhash_signatures(
+    hashes: np.ndarray, rows: np.ndarray, n_rows: int, num_perm: int = DEFAULT_NUM_PERM
+) -> np.ndarray:
+    """
+    MinHash signature matrix of shape ``(n_rows, num_perm)`` (uint32).
+
+    Each permutation is a multiply-shift hash ``(a * x + b) >> 32``; the
+    per-row minimum is taken with ``np.minimum.reduceat`` over the shingles,
+    which are grouped by row. Rows without shingles keep the max value.
+    Rows are signed in blocks of about ``SIGNATURE_BLOCK`` shingles.
+    """
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((num_perm, n_rows), UINT32_MAX, dtype=np.uint32)
+    if len(hashes) == 0:
+        return signatures.T.copy()
+
+    # Cut the shingles into blocks at row boundaries
+    row_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    cuts = np.unique(
+        row_starts[np.searchsorted(row_starts, np.arange(0, len(hashes), SIGNATURE_BLOCK), side="right") - 1]
+    )
+    cuts = np.append(cuts, len(hashes))
+
+    for low, high in zip(cuts[:-1], cuts[1:]):
+        block_rows = rows[low:high]
+        owners = row_starts[(row_starts >= low) & (row_starts < high)] - low
+        # Permute each distinct shingle of the block once, then gather per occurrence
+        uniques, inverse = np.unique(hashes[low:high], return_inverse=True)
+        for start in range(0, num_perm, PERMUTATION_BLOCK):
+            block = slice(start, start + PERMUTATION_BLOCK)
+            permuted = (
+                (a[block, None] * uniques[None, :] + b[block, None]) >> np.uint64(32)
+            ).astype(np.uint32)
+            signatures[block, block_rows[owners]] = np.minimum.reduceat(
+                permuted[:, inverse], owners, axis=1
+            )
+    return signatures.T.copy()
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows per band) with ``bands * rows <= num_perm`` whose
+    S-curve midpoint ``(1 / bands) ** (1 / rows)`` is closest to ``threshold``.
+    """
+    best = (num_perm, 1)
+    best_error = math.inf
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int, rows: int, active: np.ndarray) -> np.ndarray:
+    """
+    Rows sharing a bucket in any band, as an ``(m, 2)`` array of pairs.
+
+    Each bucket contributes its members paired with the bucket's first row,
+    so a bucket of size s yields s - 1 pairs instead of s².
+    """
+    rng = np.random.default_rng(SEED + 1)
+    mixers = rng.integers(1, 2**63, size=rows, dtype=np.uint64) | np.uint64(1)
+    members = np.flatnonzero(active)
+    if len(members) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = []
+    for band in range(bands):
+        band_values = signatures[members, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (band_values * mixers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_bucket = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        leaders = order[np.flatnonzero(new_bucket)]
+        bucket_ids = np.cumsum(new_bucket) - 1
+        followers = ~new_bucket
+        if followers.any():
+            pairs.append(
+                np.column_stack(
+                    [members[leaders[bucket_ids[followers]]], members[order[followers]]]
+                )
+            )
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.concatenate(pairs)
+    keys = np.unique(pairs[:, 0] * len(active) + pairs[:, 1])
+    return np.column_stack([keys // len(active), keys % len(active)])
+
+
+def connected_components(n_rows: int, edges: np.ndarray) -> np.ndarray:
+    """Union-find over the edges: label of each row is the smallest row in its component"""
+    labels = np.arange(n_rows)
+    if len(edges) == 0:
+        return labels
+    left, right = edges[:, 0], edges[:, 1]
+    while True:
+        previous = labels.copy()
+        smaller = np.minimum(labels[left], labels[right])
+        np.minimum.at(labels, left, smaller)
+        np.minimum.at(labels, right, smaller)
+        # Pointer jumping: follow labels to their roots
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def find_near_duplicates(
+    df: pd.DataFrame,
+    columns: List[str],
+    threshold: float = DEFAULT_THRESHOLD,
+    num_perm: int = DEFAULT_NUM_PERM,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+) -> Dict[str, Any]:
+    """
+    Group rows whose text is similar (estimated Jaccard similarity of their
+    character shingles at least ``threshold``).
+
+    Returns:
+        Dict with ``cluster_ids`` (dense id per row for rows in a cluster of
+        two or more, -1 otherwise), ``keep_mask`` (first row of each cluster
+        and every unclustered row), ``clusters``, ``clustered_rows`` and
+        ``candidate_pairs``
+    """
+    n_rows = len(df)
+    texts = row_texts(df, columns) if n_rows else np.empty(0, dtype=object)
+    hashes, owners = shingle_hashes(texts, shingle_size)
+    signatures = minhash_signatures(hashes, owners, n_rows, num_perm)
+
+    bands, rows_per_band = lsh_parameters(threshold, num_perm)
+    active = np.zeros(n_rows, dtype=bool)
+    active[owners] = True
+    if active.sum() < 2:
+        # Nothing to compare: every row is its own cluster
+        return {
+            "cluster_ids": np.full(n_rows, -1, dtype=np.int64),
+            "keep_mask": np.ones(n_rows, dtype=bool),
+            "clusters": 0,
+            "clustered_rows": 0,
+            "candidate_pairs": 0,
+        }
+    pairs = candidate_pairs(signatures, bands, rows_per_band, active)
+
+    # Verify candidates against the full signatures before linking them
+    if len(pairs):
+        similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        edges = pairs[similarity >= threshold]
+    else:
+        edges = pairs
+    labels = connected_components(n_rows, edges)
+
+    sizes = np.bincount(labels, minlength=n_rows)
+    clustered = sizes[labels] > 1
+    cluster_ids = np.full(n_rows, -1, dtype=np.int64)
+    if clustered.any():
+        cluster_ids[clustered] = pd.factorize(labels[clustered])[0]
+
+    return {
+        "cluster_ids": cluster_ids,
+        "keep_mask": labels == np.arange(n_rows),
+        "clusters": int(cluster_ids.max() + 1) if clustered.any() else 0,
+        "clustered_rows": int(clustered.sum()),
+        "candidate_pairs": int(len(pairs)),
+    }
+
+
+def text_columns(df: pd.DataFrame, columns: Optional[List[str]] = None) -> List[str]:
+    """Requested columns, or every text/categorical column"""
+    if columns:
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columnas no encontradas: {', '.join(missing)}")
+        return list(columns)
+    return df.select_dtypes(include=["object", "string", "category"]).columns.tolist()
@@ -0,0 +1,402 @@
+"""
+Profiling Service
+Single-pass column statistics built from streaming, mergeable accumulators
+"""
+
+import copy
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dataset_registry import buffer_key
+
+# Rows folded into the accumulators per block
+DEFAULT_BLOCK_ROWS = 100_000
+
+# HyperLogLog precision: 2**12 registers, ~1.6% standard error
+HLL_PRECISION = 12
+
+# t-digest compression: larger keeps more centroids and tighter quantiles
+TDIGEST_COMPRESSION = 100
+
+# Text columns with at most this ratio of distinct values are reported as categorical
+CATEGORICAL_RATIO = 0.5
+
+PROFILE_QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """64-bit hashes of the non-null values of a Series (vectorized)"""
+    return pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Exact bit length of each uint64 value, by binary search over shifts"""
+    x = values.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = x >= (np.uint64(1) << np.uint64(shift))
+        length[mask] += shift
+        x[mask] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+class Moments:
+    """Count, mean, variance (Welford/Chan), min and max of a numeric stream"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray) -> None:
+        """Fold a block of (non-null) values in with one vectorized pass"""
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "Moments") -> None:
+        """Combine with another accumulator (Chan et al. parallel update)"""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> Optional[float]:
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"mean": None, "std": None, "min": None, "max": None}
+        variance = self.variance
+        return {
+            "mean": self.mean,
+            "std": math.sqrt(variance) if variance is not None else None,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit hashes"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # Position of the leftmost 1-bit within the remaining bits
+        rank = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles.
+
+    Compression is vectorized: points sorted by value are assigned to
+    clusters by the floor of the arcsine scale function k(q), which bounds
+    each cluster's weight near the tails.
+    """
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self._compress(
+            np.concatenate([self.means, values.astype(np.float64)]),
+            np.concatenate([self.weights, np.ones(len(values))]),
+        )
+
+    def merge(self, other: "TDigest") -> None:
+        if len(other.means) == 0:
+            return
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+        )
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        clusters = np.floor(k - k.min()).astype(np.int64)
+
+        starts = np.flatnonzero(np.r_[True, clusters[1:] != clusters[:-1]])
+        cluster_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / cluster_weights
+        self.weights = cluster_weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.means) == 0:
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        positions = (np.cumsum(self.weights) - self.weights / 2) / self.weights.sum()
+        return float(np.interp(q, positions, self.means))
+
+
+class ColumnProfile:
+    """Mergeable summary of one column"""
+
+    def __init__(self, name: str, dtype: str):
+        self.name = name
+        self.dtype = dtype
+        self.count = 0
+        self.null_count = 0
+        self.distinct = HyperLogLog()
+        self.moments: Optional[Moments] = None
+        self.digest: Optional[TDigest] = None
+        self.lengths: Optional[Moments] = None
+
+    def update(self, series: pd.Series) -> None:
+        """Fold a block of the column in"""
+        non_null = series.dropna()
+        self.count += len(series)
+        self.null_count += len(series) - len(non_null)
+        self.distinct.update(hash_values(non_null))
+
+        if pd.api.types.is_bool_dtype(series):
+            return
+        if pd.api.types.is_numeric_dtype(series):
+            values = non_null.to_numpy(dtype=np.float64)
+            if self.moments is None:
+                self.moments, self.digest = Moments(), TDigest()
+            self.moments.update(values)
+            self.digest.update(values)
+        elif series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+            if self.lengths is None:
+                self.lengths = Moments()
+            self.lengths.update(non_null.astype(str).str.len().to_numpy(dtype=np.float64))
+
+    def merge(self, other: "ColumnProfile") -> None:
+        self.count += other.count
+        self.null_count += other.null_count
+        self.distinct.merge(other.distinct)
+        for attr in ("moments", "digest", "lengths"):
+            theirs = getattr(other, attr)
+            if theirs is None:
+                continue
+            if getattr(self, attr) is None:
+                setattr(self, attr, type(theirs)())
+            getattr(self, attr).merge(theirs)
+
+    def type_guess(self) -> str:
+        if self.dtype == "bool":
+            return "boolean"
+        if self.dtype.startswith("datetime"):
+            return "datetime"
+        if self.moments is not None:
+            return "integer" if "int" in self.dtype else "float"
+        non_null = self.count - self.null_count
+        if non_null and min(self.distinct.estimate(), non_null) / non_null <= CATEGORICAL_RATIO:
+            return "categorical"
+        return "text"
+
+    def to_dict(self) -> Dict[str, Any]:
+        non_null = self.count - self.null_count
+        summary = {
+            "name": self.name,
+            "dtype": self.dtype,
+            "type": self.type_guess(),
+            "count": self.count,
+            "null_count": self.null_count,
+            "null_ratio": self.null_count / self.count if self.count else 0.0,
+            # The estimate can overshoot slightly; it can never exceed the values seen
+            "distinct": min(self.distinct.estimate(), non_null),
+        }
+        if self.moments is not None:
+            summary.update(self.moments.to_dict())
+            summary["quantiles"] = {
+                str(q): self.digest.quantile(q) for q in PROFILE_QUANTILES
+            }
+        if self.lengths is not None:
+            summary["length"] = self.lengths.to_dict()
+        return summary
+
+
+class DatasetProfile:
+    """Column profiles of a whole dataset"""
+
+    def __init__(self):
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.rows = 0
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        columns: Optional[List[str]] = None,
+        block_rows: int = DEFAULT_BLOCK_ROWS,
+    ) -> "DatasetProfile":
+        """Profile ``df`` (or only ``columns``) block by block in a single pass"""
+        profile = cls()
+        columns = df.columns.tolist() if columns is None else columns
+        for col in columns:
+            profile.columns[col] = ColumnProfile(col, str(df[col].dtype))
+        for start in range(0, len(df), block_rows):
+            profile.update(df.iloc[start:start + block_rows])
+        return profile
+
+    def update(self, block: pd.DataFrame) -> None:
+        """Fold a block of rows into every profiled column"""
+        self.rows += len(block)
+        for col, column_profile in self.columns.items():
+            column_profile.update(block[col])
+
+    def merge(self, other: "DatasetProfile") -> None:
+        self.rows += other.rows
+        for col, theirs in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(theirs)
+            else:
+                self.columns[col] = theirs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "null_count": sum(col.null_count for col in self.columns.values()),
+            "columns": [col.to_dict() for col in self.columns.values()],
+        }
+
+
+def changed_columns(parent: pd.DataFrame, child: pd.DataFrame) -> List[str]:
+    """
+    Columns of ``child`` that may differ from ``parent``: those that don't
+    share the parent column's buffer (see ``dataset_registry.buffer_key``),
+    so no values are compared. All columns count as changed when rows
+    were added, removed or reordered.
+    """
+    if len(parent) != len(child) or not parent.index.equals(child.index):
+        return child.columns.tolist()
+    return [
+        col
+        for col in child.columns
+        if col not in parent.columns
+        or parent[col].dtype != child[col].dtype
+        or buffer_key(parent[col]) != buffer_key(child[col])
+    ]
+
+
+def _is_append(parent: pd.DataFrame, child: pd.DataFrame, changes: Optional[Dict[str, pd.Index]]) -> bool:
+    """Whether ``child`` is ``parent`` with rows added at the end and nothing else"""
+    return (
+        changes is not None
+        and len(changes["updated"]) == 0
+        and len(changes["removed"]) == 0
+        and len(child) == len(parent) + len(changes["dirty"])
+        and child.columns.equals(parent.columns)
+        and child.index[:len(parent)].equals(parent.index)
+    )
+
+
+class ProfileStore:
+    """Keeps the profile of every dataset version, updated after each cleaning step"""
+
+    def __init__(self):
+        self._profiles: Dict[Tuple[str, int], DatasetProfile] = {}
+        self._lock = threading.Lock()
+
+    def compute(self, dataset_id: str, version: int, df: pd.DataFrame) -> DatasetProfile:
+        profile = DatasetProfile.from_frame(df)
+        with self._lock:
+            self._profiles[(dataset_id, version)] = profile
+        return profile
+
+    def get(self, dataset_id: str, version: int) -> Optional[DatasetProfile]:
+        with self._lock:
+            return self._profiles.get((dataset_id, version))
+
+    def derive(
+        self,
+        dataset_id: str,
+        parent_version: int,
+        version: int,
+        parent_df: pd.DataFrame,
+        df: pd.DataFrame,
+        changes: Optional[Dict[str, pd.Index]] = None,
+    ) -> DatasetProfile:
+        """
+        Profile a new version from its parent. When ``changes`` (as returned
+        by ``DatasetRegistry.changes_since``) says rows were only appended, a profile
+        of the new rows is merged into the parent's; otherwise columns the
+        step didn't touch keep their summaries and only the changed columns
+        are re-profiled.
+        """
+        parent_profile = self.get(dataset_id, parent_version)
+        if parent_profile is None:
+            return self.compute(dataset_id, version, df)
+
+        if _is_append(parent_df, df, changes):
+            # A column whose dtype widened (e.g. ints with a new null) is profiled again
+            changed = {col for col in df.columns if df[col].dtype != parent_df[col].dtype}
+            profile = DatasetProfile()
+            profile.rows = len(parent_df)
+            for col in df.columns:
+                if col not in changed:
+                    profile.columns[col] = copy.deepcopy(parent_profile.columns[col])
+            profile.merge(DatasetProfile.from_frame(df.iloc[len(parent_df):], columns=list(profile.columns)))
+        else:
+            changed = set(changed_columns(parent_df, df))
+            profile = DatasetProfile()
+            profile.rows = len(df)
+            for col in df.columns:
+                if col not in changed:
+                    profile.columns[col] = parent_profile.columns[col]
+
+        fresh = DatasetProfile.from_frame(df, columns=[col for col in df.columns if col in changed])
+        profile.columns.update(fresh.columns)
+        profile.columns = {col: profile.columns[col] for col in df.columns}
+        with self._lock:
+            self._profiles[(dataset_id, version)] = profile
+        return profile
+
+    def remove(self, dataset_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._profiles if key[0] == dataset_id]:
+                del self._profiles[key]
+
+
+# Shared store instance used by the API
+profile_store = ProfileStore()
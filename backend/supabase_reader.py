@@ -0,0 +1,298 @@
+"""
+Supabase Table Reader
+Downloads Supabase tables with parallel paginated requests and keeps a
+local copy that later syncs refresh incrementally
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dataset_registry import dataset_registry
+from supabase_writer import WriterMetrics, supabase_writer
+
+# Rows per request (PostgREST's default max-rows on Supabase)
+DEFAULT_PAGE_SIZE = 1000
+
+# Pages requested at once
+DEFAULT_MAX_IN_FLIGHT = 8
+
+TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _total_rows(content_range: Optional[str]) -> Optional[int]:
+    """Row count from a ``Content-Range: 0-999/12345`` header (None if unknown)"""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+class SupabaseTableReader:
+    """
+    Reads whole tables through the PostgREST API of the bulk writer's
+    pooled client: the first page reports the row count and the rest are
+    fetched concurrently by offset, ordered by primary key. Offset pages
+    aren't a snapshot, so when rows were inserted or deleted meanwhile (the
+    rows read or a second count don't match the first count) the table is
+    read again page by page after the last key seen.
+
+    Each table is cached under ``cache_dir`` with the high-water mark of
+    its ``updated_at`` column. A later sync only pulls rows modified since
+    then (plus the list of keys, to drop deleted rows), merges them into
+    the cached frame and stores the result as a new version of the
+    table's dataset, with the row-level change set.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "cache/supabase_tables",
+        rest=supabase_writer,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.rest = rest
+        self.page_size = page_size
+        self.max_in_flight = max_in_flight
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    async def fetch(
+        self,
+        table: str,
+        order: str,
+        params: Optional[Dict[str, str]] = None,
+        metrics: Optional[WriterMetrics] = None,
+    ) -> pd.DataFrame:
+        """
+        Download every row matching ``params`` (PostgREST filters/select),
+        in parallel pages. ``order`` must be a unique, non-null column
+        among the selected ones (the primary key).
+        """
+        metrics = metrics or WriterMetrics()
+        params = {**(params or {}), "order": f"{order}.asc"}
+
+        async def page(
+            extra: Dict[str, str], limit: int = self.page_size, prefer: str = ""
+        ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+            response = await self.rest.request(
+                "GET", table, metrics, params={**params, **extra, "limit": str(limit)}, prefer=prefer
+            )
+            metrics.bytes += len(response.content)
+            return response.json(), _total_rows(response.headers.get("content-range"))
+
+        first, total = await page({"offset": "0"}, prefer="count=exact")
+        if total is not None:
+            pages = [first]
+            if total > len(first):
+                slots = asyncio.Semaphore(self.max_in_flight)
+
+                async def bounded(offset: int) -> List[Dict[str, Any]]:
+                    async with slots:
+                        return (await page({"offset": str(offset)}))[0]
+
+                offsets = range(self.page_size, total, self.page_size)
+                pages.extend(await asyncio.gather(*(bounded(offset) for offset in offsets)))
+            records = [record for rows in pages for record in rows]
+            metrics.rows += len(records)
+            frame = pd.DataFrame.from_records(records)
+            unique_rows = frame[order].nunique() if len(frame) else 0
+            if len(first) == total or (
+                unique_rows == total
+                and (await page({}, limit=0, prefer="count=exact"))[1] == total
+            ):
+                return frame
+
+        # No count, or the table changed while paging: walk it by key, which
+        # reads once every row present from start to end
+        records, last = [], None
+        while True:
+            rows = (await page({order: f"gt.{last}"} if last is not None else {}))[0]
+            records.extend(rows)
+            if len(rows) < self.page_size:
+                break
+            last = rows[-1][order]
+        metrics.rows += len(records)
+        return pd.DataFrame.from_records(records)
+
+    def _paths(self, table: str) -> Tuple[Path, Path]:
+        return self.cache_dir / f"{table}.pkl", self.cache_dir / f"{table}.json"
+
+    def _load_cache(self, table: str) -> Tuple[Optional[pd.DataFrame], Optional[Dict[str, Any]]]:
+        frame_path, meta_path = self._paths(table)
+        if not frame_path.exists() or not meta_path.exists():
+            return None, None
+        return pd.read_pickle(frame_path), json.loads(meta_path.read_text())
+
+    def _save_cache(self, table: str, df: pd.DataFrame, meta: Dict[str, Any]) -> None:
+        frame_path, meta_path = self._paths(table)
+        for path, write in (
+            (frame_path, lambda tmp: df.to_pickle(tmp)),
+            (meta_path, lambda tmp: tmp.write_text(json.dumps(meta, default=str))),
+        ):
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            write(tmp_path)
+            os.replace(tmp_path, path)
+
+    def _table_lock(self, table: str) -> asyncio.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(table, asyncio.Lock())
+
+    async def sync(
+        self,
+        table: str,
+        primary_key: str = "id",
+        updated_column: str = "updated_at",
+        full_refresh: bool = False,
+        detect_deletes: bool = True,
+    ) -> Tuple[str, int, Dict[str, Any]]:
+        """
+        Bring the local copy of ``table`` up to date and store it in the
+        dataset registry.
+
+        Returns:
+            Tuple of (dataset_id, version, report)
+        """
+        if not TABLE_NAME.match(table):
+            raise ValueError(f"Nombre de tabla no válido: '{table}'")
+
+        async with self._table_lock(table):
+            start = time.time()
+            metrics = WriterMetrics()
+            cached, meta = self._load_cache(table)
+            incremental = (
+                not full_refresh
+                and cached is not None
+                and meta.get("primary_key") == primary_key
+                and meta.get("updated_column") == updated_column
+                and meta.get("watermark") is not None
+            )
+
+            changes = None
+            if incremental:
+                fresh = await self.fetch(
+                    table, primary_key, {updated_column: f"gte.{meta['watermark']}"}, metrics
+                )
+                keys = None
+                if detect_deletes:
+                    keys = await self.fetch(table, primary_key, {"select": primary_key}, metrics)
+                if len(fresh) and set(fresh.columns) != set(cached.columns):
+                    # Schema changed: reload the whole table
+                    incremental = False
+                else:
+                    df, changes = self._merge(cached, fresh, keys, primary_key)
+            if not incremental:
+                df = await self.fetch(table, primary_key, metrics=metrics)
+
+            watermark = None
+            if updated_column in df.columns and df[updated_column].notna().any():
+                watermark = df[updated_column].dropna().astype(str).max()
+
+            dataset_id, version = self._register(table, df, meta, changes)
+            new_meta = {
+                "table": table,
+                "primary_key": primary_key,
+                "updated_column": updated_column,
+                "watermark": watermark,
+                "dataset_id": dataset_id,
+                "version": version,
+                "rows": len(df),
+                "synced_at": time.time(),
+            }
+            self._save_cache(table, df, new_meta)
+
+            metrics.elapsed = time.time() - start
+            report = {
+                "mode": "incremental" if incremental else "full",
+                "rows": len(df),
+                **({key: len(labels) for key, labels in changes.items()} if changes else {}),
+                "fetched": metrics.to_dict(),
+            }
+            return dataset_id, version, report
+
+    @staticmethod
+    def _merge(
+        cached: pd.DataFrame,
+        fresh: pd.DataFrame,
+        keys: Optional[pd.DataFrame],
+        primary_key: str,
+    ) -> Tuple[pd.DataFrame, Dict[str, List[Any]]]:
+        """Apply fetched rows (and deletions) to the cached frame, keeping its row labels"""
+        cached_keys = pd.Index(cached[primary_key])
+        removed = cached.index[:0]
+        if keys is not None:
+            present = pd.Index(keys[primary_key]) if len(keys) else pd.Index([])
+            removed = cached.index[~cached_keys.isin(present)]
+
+        if len(fresh):
+            fresh = fresh[list(cached.columns)]
+            # JSON doesn't keep dtypes (e.g. 1.0 comes back as 1): compare and
+            # store the fetched rows with the cached ones
+            for col in cached.columns:
+                if fresh[col].dtype != cached[col].dtype:
+                    try:
+                        fresh[col] = fresh[col].astype(cached[col].dtype)
+                    except (TypeError, ValueError):
+                        pass
+            positions = cached_keys.get_indexer(fresh[primary_key])
+            existing = positions >= 0
+            # Rows at the watermark come back every time: keep only real changes
+            same = np.zeros(len(fresh), dtype=bool)
+            if existing.any():
+                before = pd.util.hash_pandas_object(cached.iloc[positions[existing]], index=False)
+                after = pd.util.hash_pandas_object(fresh[existing], index=False)
+                same[existing] = before.to_numpy() == after.to_numpy()
+            fresh, positions, existing = fresh[~same], positions[~same], existing[~same]
+            updated = cached.index[positions[existing]]
+            start = int(cached.index.max()) + 1 if len(cached) else 0
+            appended = pd.RangeIndex(start, start + int((~existing).sum()))
+            labels = np.empty(len(fresh), dtype=np.int64)
+            labels[existing] = updated
+            labels[~existing] = appended
+            fresh.index = pd.Index(labels)
+        else:
+            updated = appended = cached.index[:0]
+
+        merged = pd.concat([cached.drop(index=updated.union(removed)), fresh]).sort_index()
+        changes = {
+            "appended": appended.tolist(),
+            "updated": updated.difference(removed).tolist(),
+            "removed": removed.tolist(),
+        }
+        return merged, changes
+
+    @staticmethod
+    def _register(
+        table: str,
+        df: pd.DataFrame,
+        meta: Optional[Dict[str, Any]],
+        changes: Optional[Dict[str, List[Any]]],
+    ) -> Tuple[str, int]:
+        """New version of the table's dataset (derived from the last synced one), or a new dataset"""
+        if meta is not None:
+            try:
+                dataset_registry.get(meta["dataset_id"], meta["version"])
+            except KeyError:
+                meta = None
+        if meta is None:
+            dataset_id = dataset_registry.register(df, name=table)
+            return dataset_id, dataset_registry.latest_version(dataset_id)
+
+        version = dataset_registry.add_version(
+            meta["dataset_id"], df, operation="supabase_sync", parent=meta["version"], changes=changes
+        )
+        return meta["dataset_id"], version
+
+
+# Shared reader instance used by the API
+supabase_reader = SupabaseTableReader()
@@ -0,0 +1,263 @@
+"""
+Supabase Sync Service
+Writes a cleaned DataFrame back to its Supabase table
+"""
+
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+from supabase_writer import SupabaseWriteError, frame_records
+
+# "replace": delete every row and reinsert; "diff": write only the changed rows;
+# "swap": load a staging table and replace the rows in one transaction
+SYNC_MODES = ("replace", "diff", "swap")
+
+# Columns stored per prediction in model_predictions (all numeric)
+PREDICTION_COLUMNS = ("sample_id", "true_value", "predicted_value", "confidence")
+
+# JSON batches sent to the staging loader function (one INSERT each)
+STAGING_BATCH_BYTES = 8 * 1024 * 1024
+
+# Statuses PostgREST returns while a new staging table is not in its schema cache
+NOT_IN_SCHEMA = (404,)
+
+
+def _integer_keys(df: pd.DataFrame, primary_key: str) -> pd.DataFrame:
+    """Integer keys read back as floats (because of nulls) become integers again"""
+    keys = df[primary_key]
+    if pd.api.types.is_float_dtype(keys):
+        present = keys.dropna()
+        if (present == present.round()).all():
+            df = df.assign(**{primary_key: keys.astype("Int64")})
+    return df
+
+
+def content_hashes(df: pd.DataFrame, primary_key: str) -> pd.Series:
+    """64-bit hash of every row's non-key columns, indexed by primary key"""
+    columns = sorted(col for col in df.columns if col != primary_key)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return pd.Series(hashes, index=pd.Index(df[primary_key].to_numpy()))
+
+
+def compute_diff(
+    original: pd.DataFrame, cleaned: pd.DataFrame, primary_key: str = "id"
+) -> Dict[str, Any]:
+    """
+    Row-level diff between the table as it was read and the cleaned frame,
+    matching rows by primary key and comparing a content hash of the rest.
+
+    Returns:
+        Dict with ``deletes`` (keys gone from the cleaned frame), ``updates``
+        (cleaned rows whose content changed) and ``inserts`` (cleaned rows
+        whose key is new or null)
+    """
+    for name, frame in (("original", original), ("cleaned", cleaned)):
+        if primary_key not in frame.columns:
+            raise ValueError(f"La clave primaria '{primary_key}' no está en los datos ({name})")
+
+    original = _integer_keys(original, primary_key)
+    cleaned = _integer_keys(cleaned, primary_key)
+    has_key = cleaned[primary_key].notna().to_numpy()
+    keyed = cleaned[has_key]
+    before = content_hashes(original[original[primary_key].notna()], primary_key)
+    after = content_hashes(keyed, primary_key)
+
+    if before.index.has_duplicates or after.index.has_duplicates:
+        raise ValueError(f"La clave primaria '{primary_key}' tiene valores repetidos")
+
+    # Position of each cleaned key in the original hashes (-1 if new)
+    positions = before.index.get_indexer(after.index)
+    existing = positions >= 0
+    changed = existing.copy()
+    changed[existing] = before.to_numpy()[positions[existing]] != after.to_numpy()[existing]
+    # Columns added or removed by the cleaning change every row
+    if sorted(original.columns) != sorted(cleaned.columns):
+        changed = existing
+
+    return {
+        "primary_key": primary_key,
+        "deletes": before.index.difference(after.index).tolist(),
+        "updates": keyed[changed],
+        "inserts": pd.concat([keyed[~existing], cleaned[~has_key]]),
+        "unchanged": int(existing.sum() - changed.sum()),
+    }
+
+
+def diff_summary(diff: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "primary_key": diff["primary_key"],
+        "deletes": len(diff["deletes"]),
+        "updates": len(diff["updates"]),
+        "inserts": len(diff["inserts"]),
+        "unchanged": diff["unchanged"],
+    }
+
+
+def split_unkeyed(diff: Dict[str, Any]) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """
+    Separate the inserts without a key (the database assigns theirs), the
+    only part of a diff that isn't safe to apply twice.
+
+    Returns:
+        Tuple of (diff with only keyed inserts, unkeyed rows without the key column)
+    """
+    primary_key = diff["primary_key"]
+    missing = diff["inserts"][primary_key].isna()
+    unkeyed = diff["inserts"][missing].drop(columns=[primary_key])
+    return {**diff, "inserts": diff["inserts"][~missing]}, unkeyed
+
+
+def merge_diffs(earlier: Dict[str, Any], later: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    One keyed diff with the effect of applying ``earlier`` then ``later``
+    (see ``split_unkeyed``). None when they can't be merged: a different
+    key, or rows with different columns, whose upserts would null the
+    columns one of them lacks.
+    """
+    primary_key = earlier["primary_key"]
+    frames = [earlier["updates"], earlier["inserts"], later["updates"], later["inserts"]]
+    columns = [sorted(map(str, frame.columns)) for frame in frames if len(frame)]
+    if later["primary_key"] != primary_key or any(cols != columns[0] for cols in columns[1:]):
+        return None
+
+    later_keys = pd.Index(pd.concat([later["updates"], later["inserts"]])[primary_key])
+    deleted = pd.Index(later["deletes"])
+
+    def still_written(frame: pd.DataFrame) -> pd.DataFrame:
+        keys = frame[primary_key]
+        return frame[~keys.isin(later_keys) & ~keys.isin(deleted)]
+
+    return {
+        "primary_key": primary_key,
+        "deletes": pd.Index(earlier["deletes"]).difference(later_keys).union(deleted).tolist(),
+        "updates": pd.concat([still_written(earlier["updates"]), later["updates"]]),
+        "inserts": pd.concat([still_written(earlier["inserts"]), later["inserts"]]),
+        "unchanged": later["unchanged"],
+    }
+
+
+async def insert_rows(writer, table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """Plain insert of rows whose key the database assigns"""
+    report = await writer.insert(table_name, frame_records(df))
+    return {"inserts": len(df), "requests": report["requests"]}
+
+
+async def apply_diff(writer, table_name: str, diff: Dict[str, Any]) -> Dict[str, Any]:
+    """Issue only the deletes and the upserts/inserts the diff needs, through the bulk writer"""
+    primary_key = diff["primary_key"]
+    requests = 0
+
+    if diff["deletes"]:
+        report = await writer.delete(table_name, primary_key, diff["deletes"])
+        requests += report["requests"]
+
+    # Updates and inserts with a key go out together as upserts on the key
+    upserts = pd.concat([diff["updates"], diff["inserts"][diff["inserts"][primary_key].notna()]])
+    if len(upserts):
+        report = await writer.insert(table_name, frame_records(upserts), on_conflict=primary_key)
+        requests += report["requests"]
+
+    # Rows without a key get one from the database
+    unkeyed = diff["inserts"][diff["inserts"][primary_key].isna()].drop(columns=[primary_key])
+    if len(unkeyed):
+        report = await writer.insert(table_name, frame_records(unkeyed))
+        requests += report["requests"]
+
+    return {**diff_summary(diff), "requests": requests}
+
+
+async def swap_table(writer, table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Replace the rows of ``table_name`` with ``df`` without exposing an empty
+    or half-written table (functions in ``supabase_tables.sql``).
+
+    The frame is bulk-loaded as CSV into a staging table created for this
+    call, or in large JSON batches through ``load_staging_rows`` when the
+    staging table is not exposed yet, and ``swap_staging_table`` then moves
+    it into the table in a single transaction and drops it.
+    """
+    staging = await writer.rpc("begin_table_swap", {"target": table_name})
+    try:
+        try:
+            report = await writer.insert_csv(staging, df)
+            load = "csv"
+        except SupabaseWriteError as e:
+            if e.status not in NOT_IN_SCHEMA:
+                raise
+            # Start over from an empty staging table
+            await writer.rpc("drop_staging_table", {"staging": staging})
+            staging = await writer.rpc("begin_table_swap", {"target": table_name})
+            report = await writer.rpc_batches(
+                "load_staging_rows", frame_records(df), max_bytes=STAGING_BATCH_BYTES, staging=staging
+            )
+            load = "json"
+            report["requests"] += 2
+        rows = await writer.rpc(
+            "swap_staging_table",
+            {"target": table_name, "staging": staging, "columns": [str(col) for col in df.columns]},
+        )
+    except BaseException:
+        try:
+            await writer.rpc("drop_staging_table", {"staging": staging})
+        except SupabaseWriteError:
+            pass
+        raise
+    return {
+        "mode": "swap",
+        "load": load,
+        "rows": rows,
+        "requests": report["requests"] + 2,
+        "elapsed": report["elapsed"],
+    }
+
+
+async def replace_table(writer, table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """Delete every row of ``table_name`` and insert ``df`` (non-atomic, see ``swap_table``)"""
+    try:
+        await writer.delete_where(table_name, {"id": "neq.0"})
+    except SupabaseWriteError as e:
+        print(f"⚠️ No se pudieron eliminar registros antiguos: {e}")
+    report = await writer.insert(table_name, frame_records(df)) if len(df) else {"requests": 0}
+    return {"mode": "replace", "rows": len(df), **report}
+
+
+def predictions_table(predictions: Union[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+    """Predictions (records, or a trainer's test-set frame) as typed ``model_predictions`` columns"""
+    frame = predictions if isinstance(predictions, pd.DataFrame) else pd.DataFrame.from_records(predictions)
+    frame = frame.reindex(columns=list(PREDICTION_COLUMNS))
+    for col in PREDICTION_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    frame["sample_id"] = frame["sample_id"].astype("Int64")
+    return frame
+
+
+async def save_model_results(
+    writer,
+    record: Dict[str, Any],
+    predictions: Optional[Union[pd.DataFrame, List[Dict[str, Any]]]] = None,
+    model_id: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Upsert a ``model_results`` row, then stream all its predictions to
+    ``model_predictions`` in concurrent size-bounded batches.
+
+    The row id is generated here unless ``model_id`` is given. Passing the
+    id of an earlier attempt makes the write safe to repeat: the row is
+    upserted on it and its previous predictions are deleted before the
+    new ones are inserted.
+
+    Returns:
+        The id of the ``model_results`` row
+    """
+    retry = model_id is not None
+    model_id = model_id or str(uuid.uuid4())
+    await writer.insert("model_results", [{**record, "id": model_id}], on_conflict="id")
+
+    if predictions is not None and len(predictions):
+        if retry:
+            await writer.delete("model_predictions", "model_result_id", [model_id])
+        frame = predictions_table(predictions)
+        frame.insert(0, "model_result_id", model_id)
+        await writer.insert("model_predictions", frame_records(frame))
+    return model_id
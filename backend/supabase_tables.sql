@@ -16,9 +16,10 @@ CREATE TABLE IF NOT EXISTS model_predictions (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     model_result_id UUID REFERENCES model_results(id) ON DELETE CASCADE,
     sample_id INTEGER,
-    true_value TEXT,
-    predicted_value TEXT,
-    confidence FLOAT,
+    -- Las etiquetas de clasificación se guardan codificadas (enteros)
+    true_value DOUBLE PRECISION,
+    predicted_value DOUBLE PRECISION,
+    confidence DOUBLE PRECISION,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -27,6 +28,12 @@ CREATE INDEX IF NOT EXISTS idx_model_results_framework ON model_results(framewor
 CREATE INDEX IF NOT EXISTS idx_model_results_created_at ON model_results(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_model_predictions_model_id ON model_predictions(model_result_id);
 
+-- Migración de instalaciones anteriores (valores guardados como TEXT)
+ALTER TABLE model_predictions
+    ALTER COLUMN true_value TYPE DOUBLE PRECISION USING NULLIF(true_value::TEXT, '')::DOUBLE PRECISION,
+    ALTER COLUMN predicted_value TYPE DOUBLE PRECISION USING NULLIF(predicted_value::TEXT, '')::DOUBLE PRECISION,
+    ALTER COLUMN confidence TYPE DOUBLE PRECISION;
+
 -- Función para actualizar updated_at automáticamente
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -42,6 +49,89 @@ CREATE TRIGGER update_model_results_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Reemplazo atómico de tablas desde /clean-data (sync_mode "swap").
+-- Los datos limpios se cargan en una tabla staging propia de cada reemplazo
+-- (<tabla>_staging_<sufijo>, así dos reemplazos simultáneos no mezclan sus
+-- filas) y luego una sola transacción reemplaza el contenido de la tabla:
+-- los lectores ven los datos anteriores hasta el commit y un fallo a mitad
+-- de carga no toca la tabla.
+CREATE OR REPLACE FUNCTION begin_table_swap(target TEXT)
+RETURNS TEXT AS $$
+DECLARE
+    staging TEXT := left(target, 46) || '_staging_'
+        || substr(md5(random()::TEXT || clock_timestamp()::TEXT), 1, 8);
+BEGIN
+    -- INCLUDING ALL copia también las columnas identity, además de los
+    -- valores por defecto, restricciones e índices
+    EXECUTE format(
+        'CREATE UNLOGGED TABLE public.%I (LIKE public.%I INCLUDING ALL)',
+        staging, target
+    );
+    -- Publicar la tabla nueva en la API REST para la carga CSV
+    NOTIFY pgrst, 'reload schema';
+    RETURN staging;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Evita que las funciones siguientes escriban o borren otras tablas
+CREATE OR REPLACE FUNCTION check_staging_table(staging TEXT)
+RETURNS VOID AS $$
+BEGIN
+    IF staging !~ '_staging_[0-9a-f]{8}$' THEN
+        RAISE EXCEPTION '% no es una tabla staging', staging;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga por lotes JSON, para cuando la tabla staging aún no está en la API REST
+CREATE OR REPLACE FUNCTION load_staging_rows(staging TEXT, rows JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    loaded INTEGER;
+BEGIN
+    PERFORM check_staging_table(staging);
+    EXECUTE format(
+        'INSERT INTO public.%I SELECT * FROM jsonb_populate_recordset(NULL::public.%I, $1)',
+        staging, staging
+    ) USING rows;
+    GET DIAGNOSTICS loaded = ROW_COUNT;
+    RETURN loaded;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Descarta una tabla staging (reemplazo fallido o ya aplicado)
+CREATE OR REPLACE FUNCTION drop_staging_table(staging TEXT)
+RETURNS VOID AS $$
+BEGIN
+    PERFORM check_staging_table(staging);
+    EXECUTE format('DROP TABLE IF EXISTS public.%I', staging);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Sustituye las filas de la tabla por las de staging en una transacción y
+-- descarta la tabla staging. Solo se copian las columnas cargadas; el resto
+-- (p. ej. un id generado) toma su valor por defecto. El bloqueo de la tabla
+-- serializa los reemplazos simultáneos: gana el último en llegar
+CREATE OR REPLACE FUNCTION swap_staging_table(target TEXT, staging TEXT, columns TEXT[])
+RETURNS INTEGER AS $$
+DECLARE
+    column_list TEXT;
+    swapped INTEGER;
+BEGIN
+    PERFORM check_staging_table(staging);
+    SELECT string_agg(quote_ident(col), ', ') INTO column_list FROM unnest(columns) AS col;
+    EXECUTE format('LOCK TABLE public.%I IN SHARE ROW EXCLUSIVE MODE', target);
+    EXECUTE format('DELETE FROM public.%I', target);
+    EXECUTE format(
+        'INSERT INTO public.%I (%s) OVERRIDING SYSTEM VALUE SELECT %s FROM public.%I',
+        target, column_list, column_list, staging
+    );
+    GET DIAGNOSTICS swapped = ROW_COUNT;
+    EXECUTE format('DROP TABLE public.%I', staging);
+    RETURN swapped;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Comentarios para documentación
 COMMENT ON TABLE model_results IS 'Almacena los resultados de modelos de ML entrenados';
 COMMENT ON TABLE model_predictions IS 'Almacena las predicciones individuales de cada modelo';
@@ -0,0 +1,435 @@
+"""
+Supabase Bulk Writer
+Async, pooled writes to the Supabase REST API (PostgREST) with bounded
+concurrency, size-based batching and retries
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from os import getenv
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+import pandas as pd
+from dataset_query import rows_to_records
+from supabase_client import SUPABASE_KEY, SUPABASE_URL
+
+# Requests in flight at once; further batches wait for a free slot
+DEFAULT_MAX_IN_FLIGHT = int(getenv("SUPABASE_MAX_IN_FLIGHT", "4"))
+
+# Batches are cut by serialized size rather than by a fixed row count
+DEFAULT_MAX_BATCH_BYTES = int(getenv("SUPABASE_MAX_BATCH_BYTES", str(1024 * 1024)))
+DEFAULT_MAX_BATCH_ROWS = 5000
+
+# Rows converted to JSON-safe records at a time
+RECORD_CHUNK_ROWS = 10_000
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+DEFAULT_TIMEOUT_SECONDS = 60.0
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+# Statuses that mean the request was refused before reaching the database,
+# the only ones retried for non-idempotent calls (plain inserts, RPCs)
+REJECTED_STATUSES = (429, 503)
+
+# Transport errors raised before the request was sent
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def rest_url() -> str:
+    """PostgREST base URL; SUPABASE_REST_URL points the writer at a local stand-in"""
+    url = getenv("SUPABASE_REST_URL")
+    if url:
+        return url.rstrip("/")
+    return getenv("SUPABASE_URL", SUPABASE_URL).rstrip("/") + "/rest/v1"
+
+
+def frame_records(df: pd.DataFrame, chunk_rows: int = RECORD_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """Stream a frame's rows as JSON-safe records without converting it all at once"""
+    for start in range(0, len(df), chunk_rows):
+        yield from rows_to_records(df.iloc[start:start + chunk_rows])
+
+
+def batches_by_size(
+    records: Iterable[Dict[str, Any]],
+    max_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+    max_rows: int = DEFAULT_MAX_BATCH_ROWS,
+) -> Iterator[Tuple[bytes, int]]:
+    """
+    Serialize records once and group them into JSON array payloads of at
+    most ``max_bytes`` (a single larger record still goes out alone).
+
+    Yields:
+        Tuples of (payload, number of rows)
+    """
+    parts: List[bytes] = []
+    size = 2
+    for record in records:
+        encoded = json.dumps(record, default=str, allow_nan=False).encode()
+        if parts and (size + len(encoded) + 1 > max_bytes or len(parts) >= max_rows):
+            yield b"[" + b",".join(parts) + b"]", len(parts)
+            parts, size = [], 2
+        parts.append(encoded)
+        size += len(encoded) + 1
+    if parts:
+        yield b"[" + b",".join(parts) + b"]", len(parts)
+
+
+def csv_batches(
+    df: pd.DataFrame, max_bytes: int = DEFAULT_MAX_BATCH_BYTES, chunk_rows: int = RECORD_CHUNK_ROWS
+) -> Iterator[Tuple[bytes, int]]:
+    """
+    CSV payloads (header included) of roughly ``max_bytes``: rows per batch
+    come from the average row size of each converted chunk.
+    """
+    header = df.iloc[:0].to_csv(index=False).encode()
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        lines = chunk.to_csv(index=False, header=False, na_rep="NULL").encode()
+        per_batch = max(1, int(len(chunk) * max_bytes / max(len(lines), 1)))
+        if per_batch >= len(chunk):
+            yield header + lines, len(chunk)
+            continue
+        for offset in range(0, len(chunk), per_batch):
+            rows = chunk.iloc[offset:offset + per_batch]
+            yield header + rows.to_csv(index=False, header=False, na_rep="NULL").encode(), len(rows)
+
+
+class WriterMetrics:
+    """Counters of one bulk operation, or cumulative for the writer"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.elapsed = 0.0
+
+    def merge(self, other: "WriterMetrics") -> None:
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.requests += other.requests
+        self.retries += other.retries
+        self.failures += other.failures
+        self.elapsed += other.elapsed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "elapsed": self.elapsed,
+            "rows_per_s": self.rows / self.elapsed if self.elapsed else None,
+            "mb_per_s": self.bytes / 1024 / 1024 / self.elapsed if self.elapsed else None,
+        }
+
+
+class SupabaseWriteError(Exception):
+    """A request was rejected, or still failed after all retries"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class SupabaseBulkWriter:
+    """
+    Writes rows to PostgREST tables over one pooled ``httpx.AsyncClient``.
+
+    Batches are sent concurrently with at most ``max_in_flight`` requests
+    outstanding; the producer waits for a free slot before serializing the
+    next batch, so memory stays bounded on large uploads. Failed requests
+    are retried with exponential backoff and jitter, honouring
+    ``Retry-After``.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = (base_url or rest_url()).rstrip("/")
+        self.api_key = api_key or getenv("SUPABASE_KEY", SUPABASE_KEY)
+        self.max_in_flight = max_in_flight
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_rows = max_batch_rows
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.transport = transport
+        self.totals = WriterMetrics()
+        self._totals_lock = threading.Lock()
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+
+    def _client(self) -> httpx.AsyncClient:
+        """One pooled client per event loop (the worker threads run their own loops)"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(id(loop))
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"apikey": self.api_key, "Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_in_flight,
+                    max_keepalive_connections=self.max_in_flight,
+                ),
+                transport=self.transport,
+            )
+            self._clients[id(loop)] = client
+        return client
+
+    async def close(self) -> None:
+        """Close the pooled client of the running event loop"""
+        client = self._clients.pop(id(asyncio.get_running_loop()), None)
+        if client is not None:
+            await client.aclose()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        metrics: WriterMetrics,
+        content: Optional[bytes] = None,
+        params: Optional[Dict[str, str]] = None,
+        prefer: str = "return=minimal",
+        content_type: str = "application/json",
+        idempotent: bool = True,
+    ) -> httpx.Response:
+        """
+        Send one request, retrying transient failures with exponential backoff.
+
+        A timeout or 5xx may arrive after the server committed the request,
+        so non-``idempotent`` calls are only retried when it was refused
+        (connection errors, 429, 503).
+        """
+        client = self._client()
+        headers = {"Prefer": prefer, "Content-Type": content_type}
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.request(
+                    method, f"/{path}", content=content, params=params, headers=headers
+                )
+                if response.status_code not in retry_statuses:
+                    if response.is_error:
+                        metrics.failures += 1
+                        raise SupabaseWriteError(
+                            f"{method} {path}: {response.status_code} {response.text[:500]}",
+                            response.status_code,
+                        )
+                    metrics.requests += 1
+                    return response
+                retry_after = response.headers.get("retry-after")
+                error = f"{response.status_code} {response.text[:200]}"
+            except httpx.TransportError as e:
+                if not idempotent and not isinstance(e, NOT_SENT_ERRORS):
+                    metrics.failures += 1
+                    raise SupabaseWriteError(
+                        f"{method} {path}: sin reintento, la petición pudo aplicarse ({e})"
+                    ) from e
+                retry_after = None
+                error = str(e)
+
+            if attempt == self.max_retries:
+                metrics.failures += 1
+                raise SupabaseWriteError(
+                    f"{method} {path}: falló tras {self.max_retries + 1} intentos ({error})"
+                )
+            metrics.retries += 1
+            delay = min(self.backoff_seconds * 2 ** attempt, MAX_BACKOFF_SECONDS)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def insert(
+        self,
+        table: str,
+        records: Iterable[Dict[str, Any]],
+        on_conflict: Optional[str] = None,
+        returning: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Insert (or upsert on ``on_conflict``) rows in concurrent size-bounded batches.
+
+        Returns:
+            Metrics of the operation, plus the inserted ``rows_returned``
+            when ``returning`` is set
+        """
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        prefer = "return=representation" if returning else "return=minimal"
+        if on_conflict:
+            prefer += ",resolution=merge-duplicates"
+        batches = batches_by_size(records, self.max_batch_bytes, self.max_batch_rows)
+        return await self._post_batches(
+            table, batches, prefer, params=params, returning=returning, idempotent=bool(on_conflict)
+        )
+
+    async def insert_csv(
+        self, table: str, df: pd.DataFrame, max_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Bulk-insert a frame as CSV bodies (PostgREST parses them server-side,
+        which is cheaper than JSON on wide tables). Nulls go out as ``NULL``.
+        """
+        return await self._post_batches(
+            table, csv_batches(df, max_bytes or self.max_batch_bytes), "return=minimal",
+            content_type="text/csv", idempotent=False,
+        )
+
+    async def rpc(self, function: str, args: Dict[str, Any], idempotent: bool = False) -> Any:
+        """
+        Call a database function (``POST /rpc/<function>``) and return its JSON
+        result. Pass ``idempotent`` only for functions safe to run twice.
+        """
+        metrics = WriterMetrics()
+        start = time.time()
+        payload = json.dumps(args, default=str, allow_nan=False).encode()
+        try:
+            response = await self.request(
+                "POST", f"rpc/{function}", metrics, content=payload,
+                prefer="return=representation", idempotent=idempotent,
+            )
+            metrics.bytes += len(payload)
+        finally:
+            metrics.elapsed = time.time() - start
+            self._record(metrics)
+        return response.json() if response.content else None
+
+    async def rpc_batches(
+        self,
+        function: str,
+        records: Iterable[Dict[str, Any]],
+        rows_arg: str = "rows",
+        max_bytes: Optional[int] = None,
+        **args: Any,
+    ) -> Dict[str, Any]:
+        """Call a function once per size-bounded batch, passing the batch as ``rows_arg``"""
+        prefix = json.dumps(args, default=str)[:-1].encode()
+        prefix += (b", " if args else b"") + json.dumps(rows_arg).encode() + b": "
+        batches = (
+            (prefix + payload + b"}", n_rows)
+            for payload, n_rows in batches_by_size(
+                records, max_bytes or self.max_batch_bytes, self.max_batch_rows
+            )
+        )
+        return await self._post_batches(f"rpc/{function}", batches, "return=minimal", idempotent=False)
+
+    async def _post_batches(
+        self,
+        path: str,
+        batches: Iterable[Tuple[bytes, int]],
+        prefer: str,
+        params: Optional[Dict[str, str]] = None,
+        content_type: str = "application/json",
+        returning: bool = False,
+        idempotent: bool = False,
+    ) -> Dict[str, Any]:
+        """POST payloads concurrently, at most ``max_in_flight`` at a time"""
+        metrics = WriterMetrics()
+        start = time.time()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        returned: List[Dict[str, Any]] = []
+
+        async def send(payload: bytes, n_rows: int) -> None:
+            try:
+                response = await self.request(
+                    "POST", path, metrics, content=payload, params=params,
+                    prefer=prefer, content_type=content_type, idempotent=idempotent,
+                )
+                metrics.rows += n_rows
+                metrics.bytes += len(payload)
+                if returning:
+                    returned.extend(response.json())
+            finally:
+                slots.release()
+
+        tasks = []
+        try:
+            for payload, n_rows in batches:
+                # Backpressure: wait for a free slot before building the next batch
+                await slots.acquire()
+                tasks.append(asyncio.create_task(send(payload, n_rows)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            metrics.elapsed = time.time() - start
+            self._record(metrics)
+
+        result = metrics.to_dict()
+        if returning:
+            result["rows_returned"] = returned
+        return result
+
+    async def delete(
+        self, table: str, column: str, values: List[Any], batch_size: int = 500
+    ) -> Dict[str, Any]:
+        """Delete rows whose ``column`` is in ``values`` (``in.(...)`` filters, concurrently)"""
+        metrics = WriterMetrics()
+        start = time.time()
+        slots = asyncio.Semaphore(self.max_in_flight)
+
+        async def send(chunk: List[Any]) -> None:
+            async with slots:
+                listed = ",".join(json.dumps(value) if isinstance(value, str) else str(value) for value in chunk)
+                await self.request("DELETE", table, metrics, params={column: f"in.({listed})"})
+                metrics.rows += len(chunk)
+
+        try:
+            await asyncio.gather(
+                *(send(values[i:i + batch_size]) for i in range(0, len(values), batch_size))
+            )
+        finally:
+            metrics.elapsed = time.time() - start
+            self._record(metrics)
+        return metrics.to_dict()
+
+    async def delete_where(self, table: str, filters: Dict[str, str]) -> Dict[str, Any]:
+        """Delete the rows matching PostgREST filters (e.g. ``{"id": "neq.0"}``)"""
+        metrics = WriterMetrics()
+        start = time.time()
+        try:
+            await self.request("DELETE", table, metrics, params=filters)
+        finally:
+            metrics.elapsed = time.time() - start
+            self._record(metrics)
+        return metrics.to_dict()
+
+    def _record(self, metrics: WriterMetrics) -> None:
+        with self._totals_lock:
+            self.totals.merge(metrics)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative throughput metrics of this writer"""
+        with self._totals_lock:
+            return {
+                "base_url": self.base_url,
+                "max_in_flight": self.max_in_flight,
+                "max_batch_bytes": self.max_batch_bytes,
+                **self.totals.to_dict(),
+            }
+
+
+# Shared writer instance used by the API
+supabase_writer = SupabaseBulkWriter()
@@ -0,0 +1,140 @@
+"""
+Text Normalization Service
+Fused, vectorized text cleanup that normalizes each distinct value once
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Whitespace as understood by str.split(): ASCII and Unicode separators
+WHITESPACE_RUN = r"[\s\pZ\x1c-\x1f\x85]+"
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def normalize_strings(
+    values: pa.Array, strip: bool, lowercase: bool, collapse_spaces: bool
+) -> pa.Array:
+    """Apply all requested transforms to an Arrow string array with Arrow kernels"""
+    if lowercase:
+        values = pc.utf8_lower(values)
+    if collapse_spaces:
+        # ' '.join(x.split()): collapse runs of whitespace, then trim the ends
+        values = pc.replace_substring_regex(values, pattern=WHITESPACE_RUN, replacement=" ")
+        strip = True
+    if strip:
+        values = pc.utf8_trim_whitespace(values)
+    return values
+
+
+def _normalize_uniques(
+    uniques: np.ndarray, strip: bool, lowercase: bool, collapse_spaces: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalize an array of distinct values. Non-string values are left as is.
+
+    Returns:
+        Tuple of (normalized values, mask of values that changed)
+    """
+    is_string = np.fromiter((isinstance(value, str) for value in uniques), bool, len(uniques))
+    normalized = uniques.copy()
+    if is_string.any():
+        strings = pa.array(uniques[is_string], type=pa.string())
+        normalized[is_string] = normalize_strings(
+            strings, strip, lowercase, collapse_spaces
+        ).to_numpy(zero_copy_only=False)
+    changed = np.zeros(len(uniques), dtype=bool)
+    changed[is_string] = normalized[is_string] != uniques[is_string]
+    return normalized, changed
+
+
+def normalize_series(
+    series: pd.Series, strip: bool = True, lowercase: bool = False, collapse_spaces: bool = True
+) -> Tuple[pd.Series, int, np.ndarray]:
+    """
+    Normalize a text column in a single fused pass.
+
+    The column is factorized once, every transform runs over the distinct
+    values only, and the codes are mapped back. Categorical columns reuse
+    their existing codes.
+
+    Returns:
+        Tuple of (normalized Series, number of cells that changed, integer
+        codes of the normalized values with -1 for nulls). Equal codes mean
+        equal normalized values, so later steps can hash the codes instead of
+        the strings.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = np.asarray(series.cat.categories, dtype=object)
+        normalized, changed = _normalize_uniques(categories, strip, lowercase, collapse_spaces)
+        if not changed.any():
+            return series, 0, series.cat.codes.to_numpy(dtype=np.int64)
+        codes = series.cat.codes.to_numpy()
+        n_changed = int(changed[codes[codes >= 0]].sum())
+        mapping = dict(zip(categories, normalized))
+        result = series.map(mapping).astype("category")
+        return result, n_changed, result.cat.codes.to_numpy(dtype=np.int64)
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = np.asarray(uniques, dtype=object)
+    normalized, changed = _normalize_uniques(uniques, strip, lowercase, collapse_spaces)
+    valid = codes >= 0
+
+    # Distinct values can collapse into one after normalization: recode them
+    normalized_codes = np.full(len(codes), -1, dtype=np.int64)
+    unique_codes, _ = pd.factorize(normalized)
+    normalized_codes[valid] = unique_codes[codes[valid]]
+
+    if not changed.any():
+        return series, 0, normalized_codes
+
+    values = series.to_numpy(dtype=object, copy=True)
+    values[valid] = normalized[codes[valid]]
+    n_changed = int(changed[codes[valid]].sum())
+    return pd.Series(values, index=series.index, name=series.name), n_changed, normalized_codes
+
+
+def normalize_text_columns(
+    df: pd.DataFrame,
+    columns: List[str],
+    strip: bool = True,
+    lowercase: bool = False,
+    collapse_spaces: bool = True,
+    workers: int = DEFAULT_WORKERS,
+    codes_out: Optional[Dict[str, np.ndarray]] = None,
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Normalize several text columns in parallel (Arrow kernels release the GIL).
+
+    When ``codes_out`` is given it is filled with the normalized value codes
+    of every column (see ``normalize_series``).
+
+    Returns:
+        Tuple of (DataFrame, cells changed per column)
+    """
+    if not columns or not (strip or lowercase or collapse_spaces):
+        if codes_out is not None:
+            for col in columns:
+                codes_out[col] = pd.factorize(df[col], use_na_sentinel=True)[0].astype(np.int64)
+        return df, {col: 0 for col in columns}
+
+    def run(col: str) -> Tuple[str, pd.Series, int, np.ndarray]:
+        return (col, *normalize_series(df[col], strip, lowercase, collapse_spaces))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(columns)))) as pool:
+        results = list(pool.map(run, columns))
+
+    changes = {}
+    for col, normalized, n_changed, codes in results:
+        changes[col] = n_changed
+        if n_changed:
+            df[col] = normalized
+        if codes_out is not None:
+            codes_out[col] = codes
+    return df, changes
@@ -0,0 +1,384 @@
+"""
+Training Jobs
+Runs model training in a bounded process pool, with priorities,
+cancellation and progress polling
+"""
+
+import asyncio
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from dataset_cache import dataset_cache
+
+# Trainings running at once; the rest wait in the priority queue
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# "spawn" keeps torch/BLAS thread state of the API process out of the workers
+START_METHOD = os.getenv("TRAINING_START_METHOD", "spawn")
+
+# Finished jobs (with their results and plots) kept for polling: at most
+# TRAINING_JOBS_KEEP of them, none older than TRAINING_JOBS_TTL seconds
+KEEP_FINISHED_JOBS = int(os.getenv("TRAINING_JOBS_KEEP", "50"))
+FINISHED_JOB_TTL = float(os.getenv("TRAINING_JOBS_TTL", str(3600)))
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+
+# Fields of a job returned by the API (the rest is internal)
+PUBLIC_FIELDS = (
+    "job_id", "status", "priority", "framework", "model_type", "created_at",
+    "started_at", "finished_at", "error", "cancel_requested",
+)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a worker when its job was cancelled (a BaseException, so
+    the trainers' broad ``except Exception`` fallbacks don't swallow it)
+    """
+
+
+def run_training(
+    spec: Dict[str, Any],
+    df: pd.DataFrame,
+    cache_key: Optional[str] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    cpu_budget: Optional[int] = None,
+) -> Tuple[Dict[str, Any], Any]:
+    """
+    Train the model described by ``spec`` (the fields of a train request),
+    using at most ``cpu_budget`` cores where the trainer can be limited.
+
+    Returns:
+        Tuple of (response payload, trained trainer)
+    """
+    from ml_pytorch_service import PyTorchModelTrainer
+    from ml_sklearn_service import CPU_BUDGET, SklearnModelTrainer
+    from visualization_service import VisualizationService
+
+    viz_service = VisualizationService()
+    cpu_budget = min(cpu_budget, CPU_BUDGET) if cpu_budget else CPU_BUDGET
+
+    if spec["framework"] == "sklearn" and spec["model_type"] == "leaderboard":
+        trainer = SklearnModelTrainer()
+        leaderboard = trainer.train_leaderboard(
+            df=df,
+            target_column=spec["target_column"],
+            model_types=spec.get("model_types"),
+            task_type=spec["task_type"],
+            test_size=spec["test_size"],
+            metric=spec.get("metric"),
+            cpu_budget=cpu_budget,
+            cache_key=cache_key,
+            progress_callback=progress_callback,
+        )
+        results = {
+            "success": True,
+            "framework": "sklearn",
+            "metrics": leaderboard.pop("metrics"),
+            "leaderboard": leaderboard,
+            "message": f"Mejor modelo: {leaderboard['best_model']} ({len(leaderboard['leaderboard'])} comparados)",
+        }
+        results["plots"] = viz_service.generate_all_plots(results["metrics"], framework="sklearn")
+        return results, trainer
+
+    if spec["framework"] == "sklearn":
+        trainer = SklearnModelTrainer()
+        metrics = trainer.train(
+            df=df,
+            target_column=spec["target_column"],
+            model_type=spec["model_type"],
+            task_type=spec["task_type"],
+            test_size=spec["test_size"],
+            cv_folds=spec["cv_folds"],
+            optimize_hyperparams=spec["optimize_hyperparams"],
+            cache_key=cache_key,
+            progress_callback=progress_callback,
+            optimize_time_budget=spec.get("optimize_time_budget"),
+            cpu_budget=cpu_budget,
+        )
+        results = {
+            "success": True,
+            "framework": "sklearn",
+            "metrics": metrics,
+            "message": f"Modelo {spec['model_type']} entrenado exitosamente",
+        }
+        results["plots"] = viz_service.generate_all_plots(metrics, framework="sklearn")
+        return results, trainer
+
+    if spec["framework"] == "pytorch":
+        trainer = PyTorchModelTrainer()
+        training_results = trainer.train(
+            df=df,
+            target_column=spec["target_column"],
+            architecture=spec["architecture"],
+            hidden_layers=spec["hidden_layers"],
+            neurons_per_layer=spec["neurons_per_layer"],
+            activation=spec["activation"],
+            optimizer_name=spec["optimizer"],
+            learning_rate=spec["learning_rate"],
+            epochs=spec["epochs"],
+            batch_size=spec["batch_size"],
+            loss_function=spec["loss_function"],
+            test_size=spec["test_size"],
+            cache_key=cache_key,
+            progress_callback=progress_callback,
+        )
+        results = {
+            "success": True,
+            "framework": "pytorch",
+            "metrics": training_results["test_metrics"],
+            "training_history": training_results["training_history"],
+            "training_time": training_results["training_time"],
+            "model_parameters": training_results["model_parameters"],
+            "message": f"Red neuronal {spec['architecture']} entrenada exitosamente",
+        }
+        results["plots"] = viz_service.generate_all_plots(training_results, framework="pytorch")
+        return results, trainer
+
+    raise ValueError(f"Framework '{spec['framework']}' no soportado")
+
+
+def _train_in_worker(
+    job_id: str,
+    spec: Dict[str, Any],
+    df: Optional[pd.DataFrame],
+    cache_key: Optional[str],
+    progress,
+    cancelled,
+    cpu_budget: int,
+) -> Tuple[Dict[str, Any], Any]:
+    """Process-pool entry point: reports progress through shared dicts and stops when cancelled"""
+    if df is None:
+        # The cleaned version is on disk: map it instead of pickling it across
+        df = dataset_cache.load_frame(cache_key)
+
+    def report(info: Dict[str, Any]) -> None:
+        if cancelled.get(job_id):
+            raise JobCancelled(job_id)
+        progress[job_id] = {**info, "updated_at": time.time()}
+
+    report({"stage": "start"})
+    return run_training(spec, df, cache_key, report, cpu_budget)
+
+
+class TrainingJobManager:
+    """
+    Queue of training jobs run by a ``ProcessPoolExecutor`` of
+    ``max_workers`` processes, so training never blocks the event loop.
+
+    Jobs wait in a priority queue (higher ``priority`` first, then FIFO)
+    and are only handed to the pool when a worker is free, which keeps
+    them cancellable until they start. A running job is cancelled at its
+    next progress report (an epoch or a cross-validation fold).
+
+    Finished jobs are dropped once more than ``keep_finished`` have piled
+    up or after ``finished_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = TRAINING_WORKERS,
+        start_method: str = START_METHOD,
+        keep_finished: int = KEEP_FINISHED_JOBS,
+        finished_ttl: float = FINISHED_JOB_TTL,
+    ):
+        self.max_workers = max_workers
+        self.start_method = start_method
+        # Each running job gets its share of the cores
+        self.cpu_budget = max(1, (os.cpu_count() or 1) // max_workers)
+        self.keep_finished = keep_finished
+        self.finished_ttl = finished_ttl
+        # Called with (framework, trainer) when a job completes
+        self.on_complete: Optional[Callable[[str, Any], None]] = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: List[Tuple[int, int, str]] = []
+        self._seq = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+
+    def _ensure_pool(self) -> None:
+        """Start the manager process and the pool on first use (blocking: run in a thread)"""
+        with self._pool_lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self._manager is None:
+                    self._manager = context.Manager()
+                    self._progress = self._manager.dict()
+                    self._cancelled = self._manager.dict()
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def submit(
+        self,
+        spec: Dict[str, Any],
+        df: pd.DataFrame,
+        cache_key: Optional[str] = None,
+        priority: int = 0,
+    ) -> Dict[str, Any]:
+        """Queue a training job and return its status"""
+        job_id = uuid.uuid4().hex[:12]
+        if cache_key and dataset_cache.frame_path(cache_key).exists():
+            df = None
+        with self._lock:
+            self._prune()
+            self._seq += 1
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "priority": priority,
+                "framework": spec.get("framework"),
+                "model_type": spec.get("model_type"),
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "cancel_requested": False,
+                "result": None,
+                "_args": (spec, df, cache_key),
+                "_key": (-priority, self._seq),
+                "_done": asyncio.get_running_loop().create_future(),
+            }
+            heapq.heappush(self._queue, (*self._jobs[job_id]["_key"], job_id))
+        self._dispatch()
+        return self.get(job_id)
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return self._view(job, include_result)
+
+    def _view(self, job: Dict[str, Any], include_result: bool = False) -> Dict[str, Any]:
+        """Public fields of a job (call with the lock held)"""
+        job_id = job["job_id"]
+        view = {field: job[field] for field in PUBLIC_FIELDS}
+        if job["status"] == QUEUED:
+            view["queue_position"] = 1 + sum(
+                1
+                for other in self._jobs.values()
+                if other["status"] == QUEUED and other["_key"] < job["_key"]
+            )
+        if job["status"] == RUNNING and self._progress is not None:
+            view["progress"] = dict(self._progress.get(job_id, {}))
+        if include_result:
+            view["result"] = job["result"]
+        return view
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job["created_at"])
+            return [self._view(job) for job in jobs]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job now, or ask a running one to stop at its next progress report"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == QUEUED:
+                self._finish(job, CANCELLED)
+            elif job["status"] == RUNNING:
+                job["cancel_requested"] = True
+                if self._cancelled is not None:
+                    self._cancelled[job_id] = True
+        return self.get(job_id)
+
+    async def wait(self, job_id: str) -> Dict[str, Any]:
+        """Wait for a job to finish and return it with its result"""
+        # Hold the job itself: it may be pruned once finished
+        job = self._jobs[job_id]
+        await asyncio.shield(job["_done"])
+        with self._lock:
+            return self._view(job, include_result=True)
+
+    def _finish(self, job: Dict[str, Any], status: str, **fields: Any) -> None:
+        job.update(status=status, finished_at=time.time(), _args=None, **fields)
+        if not job["_done"].done():
+            job["_done"].set_result(status)
+        self._prune()
+
+    def _prune(self) -> None:
+        """Forget expired finished jobs and the oldest beyond ``keep_finished`` (lock held)"""
+        finished = sorted(
+            (job for job in self._jobs.values() if job["finished_at"] is not None),
+            key=lambda job: job["finished_at"],
+        )
+        expire_before = time.time() - self.finished_ttl
+        excess = len(finished) - self.keep_finished
+        for i, job in enumerate(finished):
+            if i < excess or job["finished_at"] < expire_before:
+                del self._jobs[job["job_id"]]
+
+    def _dispatch(self) -> None:
+        """Hand queued jobs to the pool while workers are free"""
+        with self._lock:
+            while self._queue and self._running < self.max_workers:
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self._jobs[job_id]
+                if job["status"] != QUEUED:
+                    continue
+                self._running += 1
+                job.update(status=RUNNING, started_at=time.time())
+                asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        try:
+            await asyncio.to_thread(self._ensure_pool)
+            if job["cancel_requested"]:
+                raise JobCancelled(job_id)
+            spec, df, cache_key = job["_args"]
+            future = self._pool.submit(
+                _train_in_worker, job_id, spec, df, cache_key, self._progress, self._cancelled,
+                self.cpu_budget,
+            )
+            results, trainer = await asyncio.wrap_future(future)
+        except JobCancelled:
+            with self._lock:
+                self._finish(job, CANCELLED)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory): start a fresh pool for the next jobs
+            with self._pool_lock:
+                self._pool = None
+            with self._lock:
+                self._finish(job, FAILED, error=f"El proceso de entrenamiento terminó inesperadamente: {e}")
+        except Exception as e:
+            with self._lock:
+                self._finish(job, FAILED, error=str(e))
+        else:
+            if self.on_complete is not None:
+                self.on_complete(job["framework"], trainer)
+            with self._lock:
+                self._finish(job, COMPLETED, result=results)
+        finally:
+            if self._progress is not None:
+                self._progress.pop(job_id, None)
+                self._cancelled.pop(job_id, None)
+            with self._lock:
+                self._running -= 1
+            self._dispatch()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# Shared job manager used by the API
+training_jobs = TrainingJobManager()
@@ -0,0 +1,143 @@
+"""
+Wire Format Service
+Encodes and decodes dataset payloads as Arrow IPC, Parquet or columnar JSON
+"""
+
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.responses import JSONResponse, Response
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+JSON_MEDIA_TYPE = "application/json"
+
+# Formats a client can ask for, either explicitly or through the Accept header
+MEDIA_TYPES = {
+    "arrow": ARROW_STREAM_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+    "columnar": JSON_MEDIA_TYPE,
+    "records": JSON_MEDIA_TYPE,
+}
+
+BINARY_FORMATS = ("arrow", "parquet")
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Pick the response format for a dataset payload.
+
+    An explicit ``requested`` format wins; otherwise the Accept header is
+    checked for Arrow or Parquet media types. Defaults to "records", the row
+    dict JSON the frontend already understands.
+    """
+    if requested:
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"Formato no soportado: {requested}")
+        return requested
+
+    accept = (accept or "").lower()
+    if ARROW_STREAM_MEDIA_TYPE in accept:
+        return "arrow"
+    if PARQUET_MEDIA_TYPE in accept:
+        return "parquet"
+    return "records"
+
+
+def format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Map a request Content-Type to a binary dataset format (None if not binary)"""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type == ARROW_STREAM_MEDIA_TYPE:
+        return "arrow"
+    if content_type == PARQUET_MEDIA_TYPE:
+        return "parquet"
+    return None
+
+
+def frame_to_arrow(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame as an Arrow IPC stream"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_to_parquet(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame as a Parquet file"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_to_columnar(df: pd.DataFrame) -> Dict[str, list]:
+    """Convert a DataFrame to ``{column: [values]}`` with nulls as None"""
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if series.hasnans:
+            series = series.astype(object).where(series.notna(), None)
+        columns[str(col)] = series.tolist()
+    return columns
+
+
+def decode_frame(body: bytes, fmt: str) -> pd.DataFrame:
+    """Build a DataFrame from an Arrow IPC stream or Parquet payload"""
+    buffer = pa.py_buffer(body)
+    if fmt == "arrow":
+        table = pa.ipc.open_stream(buffer).read_all()
+    elif fmt == "parquet":
+        table = pq.read_table(pa.BufferReader(buffer))
+    else:
+        raise ValueError(f"Formato binario no soportado: {fmt}")
+    return table.to_pandas()
+
+
+def columnar_to_frame(data: Dict[str, list], columns: Optional[list] = None) -> pd.DataFrame:
+    """Build a DataFrame from columnar JSON"""
+    return pd.DataFrame(data, columns=columns)
+
+
+def binary_response(df: pd.DataFrame, fmt: str, metadata: Dict[str, Any]) -> Response:
+    """
+    Return a DataFrame as an Arrow or Parquet response.
+
+    ``metadata`` (message, dataset id, row counts...) travels in ``X-*``
+    headers since the body is the raw table.
+    """
+    if fmt == "arrow":
+        content = frame_to_arrow(df)
+    elif fmt == "parquet":
+        content = frame_to_parquet(df)
+    else:
+        raise ValueError(f"Formato binario no soportado: {fmt}")
+
+    headers = {
+        f"X-{key.replace('_', '-').title()}": quote(str(value))
+        for key, value in metadata.items()
+        if value is not None
+    }
+    return Response(content=content, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+def columnar_response(df: pd.DataFrame, metadata: Dict[str, Any]) -> JSONResponse:
+    """Return a DataFrame as columnar JSON alongside its metadata"""
+    content = {
+        "success": True,
+        "format": "columnar",
+        "columns": [str(col) for col in df.columns],
+        "totalRows": len(df),
+        "data": frame_to_columnar(df),
+    }
+    content.update(metadata)
+    return JSONResponse(content=content)
+
+
+def predictions_frame(predictions: np.ndarray) -> pd.DataFrame:
+    """Wrap a predictions array in a single-column DataFrame"""
+    return pd.DataFrame({"prediction": np.asarray(predictions).reshape(-1)})
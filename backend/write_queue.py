@@ -0,0 +1,301 @@
+"""
+Write-Behind Queue
+Persists Supabase writes in the background from an on-disk journal, so
+endpoints can answer before the network round trips finish
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import joblib
+from supabase_sync import (
+    apply_diff,
+    insert_rows,
+    merge_diffs,
+    replace_table,
+    save_model_results,
+    split_unkeyed,
+    swap_table,
+)
+from supabase_writer import supabase_writer
+
+JOB_KINDS = ("replace", "swap", "diff", "insert", "model_results")
+
+# Rows without a key get theirs from the database, so a retry after some
+# batches were committed would insert those rows twice
+NOT_RETRIED_KINDS = ("insert",)
+
+# A full replacement makes earlier pending writes to the same table redundant
+REPLACING_KINDS = ("replace", "swap")
+
+PENDING, RUNNING, DONE, FAILED, SUPERSEDED = "pending", "running", "done", "failed", "superseded"
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_SECONDS = 5.0
+
+# Finished jobs are forgotten after this long (on the next start)
+KEEP_FINISHED_SECONDS = 7 * 24 * 3600
+
+
+class WriteQueue:
+    """
+    Journal of Supabase writes under ``queue_dir``: one ``<job>.json``
+    status file per job plus a ``<job>.pkl`` payload (frames, diffs,
+    records) written before the job becomes visible. A single worker task
+    runs the jobs table by table in submission order; jobs left running
+    by a crash go back to pending when the queue starts again.
+
+    Enqueuing a full replacement of a table supersedes the writes to that
+    table still waiting in the queue, and a diff is merged into the table's
+    last pending diff when nothing but inserts was queued after it. The
+    unkeyed inserts of a diff go in their own ``insert`` job, which is never
+    retried.
+    """
+
+    def __init__(
+        self,
+        queue_dir: str = "cache/write_queue",
+        writer=supabase_writer,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_seconds: float = DEFAULT_RETRY_SECONDS,
+    ):
+        self.queue_dir = Path(queue_dir)
+        self.queue_dir.mkdir(parents=True, exist_ok=True)
+        self.writer = writer
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._load()
+
+    def _load(self) -> None:
+        for path in self.queue_dir.glob("*.json"):
+            try:
+                job = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if job["finished_at"] and time.time() - job["finished_at"] > KEEP_FINISHED_SECONDS:
+                path.unlink(missing_ok=True)
+                continue
+            if job["status"] == RUNNING and job["kind"] in NOT_RETRIED_KINDS:
+                job.update(status=FAILED, error="Interrumpida por un reinicio", finished_at=time.time())
+                self._save(job)
+            elif job["status"] == RUNNING:
+                job["status"] = PENDING
+            self._jobs[job["job_id"]] = job
+        self._seq = max((job["seq"] for job in self._jobs.values()), default=0)
+
+    def _payload_path(self, job_id: str) -> Path:
+        return self.queue_dir / f"{job_id}.pkl"
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        path = self.queue_dir / f"{job['job_id']}.json"
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps(job, default=str))
+        os.replace(tmp_path, path)
+
+    def _dump_payload(self, job_id: str, payload: Dict[str, Any]) -> None:
+        path = self._payload_path(job_id)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _drop_payload(self, job_id: str) -> None:
+        self._payload_path(job_id).unlink(missing_ok=True)
+
+    def enqueue(self, kind: str, table: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Journal a write and return its job status"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Tipo de escritura desconocido: {kind}")
+        if kind == "diff":
+            return self._enqueue_diff(table, payload["diff"])
+        if kind == "model_results":
+            # Fixed row id, so a retry after a partial write updates that row
+            payload = {**payload, "model_id": str(uuid.uuid4())}
+        return self._add_job(kind, table, payload)
+
+    def _enqueue_diff(self, table: str, diff: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue the keyed part of a diff (safe to retry: deletes and upserts on
+        the key) and its unkeyed inserts as a separate ``insert`` job.
+        """
+        keyed, unkeyed = split_unkeyed(diff)
+        job = None
+        with self._lock:
+            target = self._diff_target(table)
+            if target is not None:
+                earlier = joblib.load(self._payload_path(target["job_id"]))["diff"]
+                merged = merge_diffs(earlier, keyed)
+                if merged is not None:
+                    self._dump_payload(target["job_id"], {"diff": merged})
+                    target["coalesced"] = target.get("coalesced", 0) + 1
+                    self._save(target)
+                    job = dict(target)
+
+        empty = not (len(keyed["deletes"]) or len(keyed["updates"]) or len(keyed["inserts"]))
+        if job is None and not (empty and len(unkeyed)):
+            job = self._add_job("diff", table, {"diff": keyed})
+        if len(unkeyed):
+            insert_job = self._add_job("insert", table, {"frame": unkeyed})
+            job = {**job, "insert_job_id": insert_job["job_id"]} if job else insert_job
+        return job
+
+    def _diff_target(self, table: str) -> Optional[Dict[str, Any]]:
+        """
+        The table's last pending diff, when only inserts were queued after it.
+        Those inserts add rows the later diff can't refer to, so the merged
+        diff may run before them.
+        """
+        unfinished = [
+            job
+            for job in self._jobs.values()
+            if job["table"] == table
+            and job["status"] in (PENDING, RUNNING)
+            and job["kind"] not in NOT_RETRIED_KINDS
+        ]
+        if not unfinished:
+            return None
+        last = max(unfinished, key=lambda job: job["seq"])
+        return last if last["kind"] == "diff" and last["status"] == PENDING else None
+
+    def _add_job(self, kind: str, table: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex[:12]
+        self._dump_payload(job_id, payload)
+
+        with self._lock:
+            self._seq += 1
+            job = {
+                "job_id": job_id,
+                "seq": self._seq,
+                "kind": kind,
+                "table": table,
+                "status": PENDING,
+                "attempts": 0,
+                "created_at": time.time(),
+                "next_attempt_at": 0.0,
+                "finished_at": None,
+                "error": None,
+                "result": None,
+            }
+            self._save(job)
+            self._jobs[job_id] = job
+
+            if kind in REPLACING_KINDS:
+                for other in self._jobs.values():
+                    if (
+                        other["table"] == table
+                        and other["status"] == PENDING
+                        and other["seq"] < job["seq"]
+                    ):
+                        other.update(status=SUPERSEDED, superseded_by=job_id, finished_at=time.time())
+                        self._save(other)
+                        self._drop_payload(other["job_id"])
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if status in (None, job["status"])]
+        return sorted(jobs, key=lambda job: job["seq"])
+
+    def _next_job(self) -> Optional[Dict[str, Any]]:
+        """Oldest due job whose table has no earlier unfinished write"""
+        now = time.time()
+        blocked = set()
+        with self._lock:
+            for job in sorted(self._jobs.values(), key=lambda job: job["seq"]):
+                if job["status"] not in (PENDING, RUNNING) or job["table"] in blocked:
+                    continue
+                blocked.add(job["table"])
+                if job["status"] == PENDING and job["next_attempt_at"] <= now:
+                    job["status"] = RUNNING
+                    job["attempts"] += 1
+                    self._save(job)
+                    return job
+        return None
+
+    async def _execute(self, job: Dict[str, Any]) -> Any:
+        payload = joblib.load(self._payload_path(job["job_id"]))
+        kind, table = job["kind"], job["table"]
+        if kind == "replace":
+            return await replace_table(self.writer, table, payload["frame"])
+        if kind == "swap":
+            return await swap_table(self.writer, table, payload["frame"])
+        if kind == "diff":
+            return await apply_diff(self.writer, table, payload["diff"])
+        if kind == "insert":
+            return await insert_rows(self.writer, table, payload["frame"])
+        record_id = await save_model_results(
+            self.writer, payload["record"], payload["predictions"], model_id=payload.get("model_id")
+        )
+        return {"record_id": record_id}
+
+    async def run(self) -> None:
+        """Worker loop: run due jobs, sleep until the next one or a new enqueue"""
+        self._wakeup = asyncio.Event()
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.retry_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                result = await self._execute(job)
+            except asyncio.CancelledError:
+                with self._lock:
+                    job["status"] = PENDING
+                    self._save(job)
+                raise
+            except Exception as e:
+                print(f"⚠️ Escritura en Supabase {job['job_id']} falló: {e}")
+                with self._lock:
+                    job["error"] = str(e)
+                    if job["attempts"] >= self.max_attempts or job["kind"] in NOT_RETRIED_KINDS:
+                        job.update(status=FAILED, finished_at=time.time())
+                    else:
+                        delay = self.retry_seconds * 2 ** (job["attempts"] - 1)
+                        job.update(status=PENDING, next_attempt_at=time.time() + delay)
+                    self._save(job)
+                continue
+
+            with self._lock:
+                job.update(status=DONE, result=result, error=None, finished_at=time.time())
+                self._save(job)
+            self._drop_payload(job["job_id"])
+
+    def start(self) -> None:
+        """Start the worker on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Shared queue instance used by the API
+write_queue = WriteQueue()